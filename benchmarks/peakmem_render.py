@@ -0,0 +1,42 @@
+import os
+
+from conda_build import api
+
+# god-awful hack to get data from the test recipes
+import sys
+_thisdir = os.path.dirname(__file__)
+sys.path.append(os.path.dirname(_thisdir))
+
+
+from tests.utils import metadata_dir
+variant_dir = os.path.join(metadata_dir, '..', 'variants')
+
+# a python x numpy matrix big enough that per-variant copies of metadata dominate
+MATRIX = {'python': ['2.7', '3.5', '3.6', '3.7', '3.8', '3.9'],
+          'numpy': ['1.11', '1.14', '1.16', '1.17', '1.18', '1.19']}
+
+
+def peakmem_top_level_variant_render():
+    api.render(os.path.join(variant_dir, '02_python_version'), finalize=False,
+               bypass_env_check=True)
+
+
+def peakmem_numpy_matrix_render():
+    api.render(os.path.join(variant_dir, '03_numpy_matrix'), finalize=False,
+               bypass_env_check=True, variants=MATRIX)
+
+
+def time_numpy_matrix_render():
+    api.render(os.path.join(variant_dir, '03_numpy_matrix'), finalize=False,
+               bypass_env_check=True, variants=MATRIX)
+
+
+class TimeMetadataCopy:
+    def setup(self):
+        self.metadata = api.render(os.path.join(variant_dir, '03_numpy_matrix'),
+                                   finalize=False, bypass_env_check=True,
+                                   variants=MATRIX)[0][0]
+
+    def time_copy(self):
+        for _ in range(100):
+            self.metadata.copy()
@@ -0,0 +1,19 @@
+# timeraw_ benchmarks run in a fresh interpreter, so these measure what importing each entry
+#    point costs from scratch rather than what earlier benchmarks left in sys.modules.
+#    tests/test_cli.py checks that the slow optional imports stay out of the CLI modules.
+
+
+def timeraw_import_main_build():
+    return "import conda_build.cli.main_build"
+
+
+def timeraw_import_main_render():
+    return "import conda_build.cli.main_render"
+
+
+def timeraw_import_api():
+    return "import conda_build.api"
+
+
+def timeraw_import_build():
+    return "import conda_build.build"
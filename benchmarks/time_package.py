@@ -0,0 +1,86 @@
+# Pack time and package size for the compression settings of each package format.  The
+#    prefixes stand in for what outputs usually hold: lots of small text files (a python
+#    library) and a few large binaries (compiled libraries).
+import os
+import random
+import shutil
+import tempfile
+
+import conda_package_handling.api
+
+from conda_build import build
+from conda_build.config import Config
+
+PREFIXES = ('python_library', 'shared_libraries')
+FORMATS = ('.tar.bz2', '.conda')
+# .tar.bz2 ignores these
+LEVELS = (1, 3, 10, 19, 22)
+THREADS = (1, 4)
+
+
+def _write_prefix(prefix, kind):
+    rng = random.Random(0)
+    words = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rng.randint(2, 12)))
+             for _ in range(2000)]
+    files = []
+    if kind == 'python_library':
+        for i in range(1500):
+            fn = os.path.join('lib', 'python3.8', 'site-packages', 'pkg', 'mod{}'.format(i // 50),
+                              'file{}.py'.format(i))
+            text = '\n'.join(' '.join(rng.choice(words) for _ in range(8)) for _ in range(60))
+            files.append((fn, text.encode('utf-8')))
+    else:
+        for i in range(4):
+            # half repetitive code-like bytes, half noise, as in typical .so files
+            data = bytearray()
+            for _ in range(64):
+                data += ' '.join(rng.choice(words) for _ in range(200)).encode('utf-8')
+                data += bytearray(rng.getrandbits(8) for _ in range(8192))
+            files.append((os.path.join('lib', 'libbench{}.so'.format(i)), bytes(data)))
+    files.append((os.path.join('info', 'index.json'), b'{"name": "bench", "version": "1.0"}'))
+    for fn, data in files:
+        path = os.path.join(prefix, fn)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+    return [fn for fn, _ in files]
+
+
+class PackSuite(object):
+    params = (PREFIXES, FORMATS, LEVELS, THREADS)
+    param_names = ('prefix', 'format', 'level', 'threads')
+    timeout = 600
+
+    def setup_cache(self):
+        # asv runs this in a folder of its own, which is also where the benchmarks run
+        root = os.path.abspath('prefixes')
+        return root, dict((kind, _write_prefix(os.path.join(root, kind), kind))
+                          for kind in PREFIXES)
+
+    def setup(self, prefixes, kind, ext, level, threads):
+        if ext == '.tar.bz2' and (level, threads) != (LEVELS[0], THREADS[0]):
+            # nothing to compare; bzip2 settings are not configurable
+            raise NotImplementedError
+        self.root, files = prefixes
+        self.prefix = os.path.join(self.root, kind)
+        self.files = files[kind]
+        self.out_folder = tempfile.mkdtemp()
+        self.fn = 'bench-1.0-0' + ext
+        config = Config(zstd_compression_level=level, zstd_compression_threads=threads)
+        self.kwargs = build._conda_compression_kwargs(config) if ext == '.conda' else {}
+
+    def teardown(self, prefixes, kind, ext, level, threads):
+        shutil.rmtree(self.out_folder, ignore_errors=True)
+
+    def _pack(self):
+        conda_package_handling.api.create(self.prefix, self.files, self.fn,
+                                          out_folder=self.out_folder, **self.kwargs)
+        return os.path.join(self.out_folder, self.fn)
+
+    def time_pack(self, *params):
+        self._pack()
+
+    def track_size(self, *params):
+        return os.path.getsize(self._pack())
+    track_size.unit = 'bytes'
@@ -0,0 +1,34 @@
+# Throughput of rewriting env values in build output (utils.StreamRewriter), which runs on every
+#    byte that build and test scripts print.  The logs are modeled on verbose CMake/ninja builds:
+#    long compiler lines full of absolute paths, plus some output that is not valid UTF-8.
+import time
+
+from conda_build.utils import REWRITE_CHUNK_SIZE, StreamRewriter
+
+ENV = {'PREFIX': '/home/user/conda-bld/pkg_1600000000000/_h_env_placehold_placehold_placehold',
+       'BUILD_PREFIX': '/home/user/conda-bld/pkg_1600000000000/_build_env',
+       'SRC_DIR': '/home/user/conda-bld/pkg_1600000000000/work'}
+LINE = ('[ 42%] Building CXX object src/CMakeFiles/foo.dir/bar.cpp.o\n'
+        '{BUILD_PREFIX}/bin/x86_64-conda-linux-gnu-c++ -DFOO -I{SRC_DIR}/include '
+        '-I{PREFIX}/include -O2 -c {SRC_DIR}/src/bar.cpp -o src/CMakeFiles/foo.dir/bar.cpp.o\n'
+        '{SRC_DIR}/src/bar.cpp:12:5: warning: unused variable \'x\' [-Wunused-variable]\n'
+        ).format(**ENV).encode('utf-8')
+# about 64 MB
+LOG = (LINE + b'binary junk: \xff\xfe\x00\x80 no paths here at all\n') * (2 ** 26 // len(LINE))
+
+
+class RewriteSuite(object):
+    params = ([REWRITE_CHUNK_SIZE, 2 ** 12, 2 ** 20],)
+    param_names = ('chunk_size',)
+
+    def time_rewrite(self, chunk_size):
+        rewriter = StreamRewriter(ENV)
+        for start in range(0, len(LOG), chunk_size):
+            rewriter.feed(LOG[start:start + chunk_size])
+        rewriter.flush()
+
+    def track_megabytes_per_second(self, chunk_size):
+        start = time.time()
+        self.time_rewrite(chunk_size)
+        return len(LOG) / (time.time() - start) / 2 ** 20
+    track_megabytes_per_second.unit = 'MB/s'
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+from conda_build import variants
+from conda_build.config import Config
+
+# roughly the size of conda-forge's global pinning file
+N_PINNED_PACKAGES = 600
+
+
+def _write_large_pinning_file(path):
+    with open(path, 'w') as f:
+        f.write('python:\n  - 3.6\n  - 3.7\n  - 3.8\n')
+        f.write('c_compiler:\n  - gcc\n  - clang  # [osx]\n')
+        f.write('cxx_compiler:\n  - gxx\n')
+        f.write('fortran_compiler:\n  - gfortran\n')
+        for i in range(N_PINNED_PACKAGES):
+            f.write('lib_{0}:\n  - {0}.1\n  - {0}.2  # [linux]\n'.format(i))
+        f.write('pin_run_as_build:\n')
+        for i in range(N_PINNED_PACKAGES):
+            f.write('  lib-{0}:\n    max_pin: x.x\n'.format(i))
+
+
+def _recipe_text():
+    lines = ['{% set version = "1.0" %}',
+             'package:',
+             '  name: big-recipe',
+             '  version: {{ version }}',
+             'requirements:',
+             '  build:',
+             "    - {{ compiler('c') }}",
+             "    - {{ compiler('cxx') }}  # [not win]",
+             '  host:',
+             '    - python',
+             ]
+    lines.extend('    - lib-{0}'.format(i) for i in range(0, N_PINNED_PACKAGES, 20))
+    lines.extend('    - lib_{0} {{{{ lib_{0} }}}}  # [py>=37]'.format(i)
+                 for i in range(1, N_PINNED_PACKAGES, 50))
+    lines.append('  run:')
+    lines.append('    - {{ pin_compatible("lib_3") }}')
+    return '\n'.join(lines) + '\n'
+
+
+class TimeVariantMatrix:
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        pinning_file = os.path.join(self.tmpdir, 'conda_build_config.yaml')
+        _write_large_pinning_file(pinning_file)
+        spec = variants.parse_config_file(pinning_file, Config())
+        # a few more looping keys, zipped and not, to get a large product
+        spec['cuda_compiler_version'] = ['None', '9.2', '10.0', '10.1', '10.2', '11.0']
+        spec['cudnn'] = ['undefined', '7.1', '7.3', '7.6', '7.6', '8.0']
+        spec['mpi'] = ['nompi', 'openmpi', 'mpich']
+        spec['numpy'] = ['1.16', '1.17', '1.18', '1.19']
+        spec['zip_keys'] = [['cuda_compiler_version', 'cudnn']]
+        self.combined_spec = spec
+        self.specs = {'internal_defaults': {},
+                      'recipe': {'python': ['3.8'], 'mpi': ['openmpi'], 'lib_7': ['7.1']}}
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def time_filter_combined_spec_to_used_keys(self):
+        variants.filter_combined_spec_to_used_keys(self.combined_spec, self.specs)
+
+
+class TimeFindUsedVariables:
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        pinning_file = os.path.join(self.tmpdir, 'conda_build_config.yaml')
+        _write_large_pinning_file(pinning_file)
+        self.specs = variants.parse_config_file(pinning_file, Config())
+        self.keys = tuple(sorted(self.specs))
+        self.recipe_text = _recipe_text()
+        self.calls = 0
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def time_find_used_variables_in_text(self):
+        # results are memoized per text, so make every call see new text
+        self.calls += 1
+        text = self.recipe_text + '# {}\n'.format(self.calls)
+        variants.find_used_variables_in_text(self.keys, text)
+        variants.find_used_variables_in_text(self.keys, text, selectors_only=True)
@@ -33,12 +33,23 @@ def render(recipe_path, config=None, variants=None, permit_unsatisfiable_variant
        templates evaluated.
 
     Returns a list of (metadata, needs_download, needs_reparse in env) tuples"""
-    from conda_build.render import render_recipe, finalize_metadata
+    from conda_build.render import (render_recipe, finalize_metadata, render_cache_key,
+                                    load_cached_render, save_cached_render)
     from conda_build.exceptions import DependencyNeedsBuildingError
     from conda_build.conda_interface import NoPackagesFoundError
     from collections import OrderedDict
     config = get_or_merge_config(config, **kwargs)
 
+    cache_key = None
+    if config.render_cache:
+        cache_key = render_cache_key(recipe_path, config, variants=variants,
+                                     env_check=finalize and not bypass_env_check,
+                                     permit_unsatisfiable_variants=permit_unsatisfiable_variants,
+                                     finalize=finalize, bypass_env_check=bypass_env_check)
+        cached = cache_key and load_cached_render(cache_key, config)
+        if cached:
+            return cached
+
     metadata_tuples = render_recipe(recipe_path, bypass_env_check=bypass_env_check,
                                     no_download_source=config.no_download_source,
                                     config=config, variants=variants,
@@ -75,6 +86,8 @@ def render(recipe_path, config=None, variants=None, permit_unsatisfiable_variant
                                         for var in om.get_used_vars())] = \
                             ((om, download, render_in_env))
 
+    if cache_key:
+        save_cached_render(cache_key, config, list(output_metas.values()))
     return list(output_metas.values())
 
 
@@ -85,16 +98,22 @@ def output_yaml(metadata, file_path=None, suppress_outputs=False):
 
 
 def get_output_file_paths(recipe_path_or_metadata, no_download_source=False, config=None,
-                         variants=None, **kwargs):
+                         variants=None, solve=True, **kwargs):
     """Get output file paths for any packages that would be created by a recipe
 
     Both split packages (recipes with more than one output) and build matrices,
     created with variants, contribute to the list of file paths here.
+
+    With solve=False, recipes are finalized using run_exports of packages that are known
+    locally rather than by solving their build and host environments (see
+    Config.render_without_solve).
     """
     from conda_build.render import bldpkg_path
     from conda_build.conda_interface import string_types
     from conda_build.utils import get_skip_message
     config = get_or_merge_config(config, **kwargs)
+    if not solve:
+        config.render_without_solve = True
 
     if hasattr(recipe_path_or_metadata, '__iter__') and not isinstance(recipe_path_or_metadata,
                                                                        string_types):
@@ -3,7 +3,9 @@ Module that does most of the heavy lifting for the ``conda build`` command.
 '''
 from __future__ import absolute_import, division, print_function
 
-from collections import deque, OrderedDict
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import contextlib
 import fnmatch
 import glob2
 import io
@@ -18,6 +20,8 @@ import stat
 import string
 import subprocess
 import sys
+import tempfile
+from threading import Lock
 import time
 
 # this is to compensate for a requests idna encoding error.  Conda is a better place to fix,
@@ -26,7 +30,6 @@ import time
 #    http://stackoverflow.com/a/13057751/1170370
 import encodings.idna  # NOQA
 
-from bs4 import UnicodeDammit
 import yaml
 
 import conda_package_handling.api
@@ -58,7 +61,8 @@ from .utils import (CONDA_PACKAGE_EXTENSION_V1, CONDA_PACKAGE_EXTENSION_V2,
                     shutil_move_more_retrying, tmp_chdir)
 from conda_build import environ, source, tarcheck, utils
 from conda_build.config import Config
-from conda_build.index import get_build_index, update_index
+from conda_build.index import (get_build_index, update_index, register_package,
+                               ensure_local_channel_indexed)
 from conda_build.render import (output_yaml, bldpkg_path, render_recipe, reparse, distribute_variants,
                                 expand_outputs, try_download, execute_download_actions,
                                 add_upstream_pins)
@@ -701,6 +705,7 @@ def copy_recipe(m):
         rendered = output_yaml(output_metadata)
 
         if original_recipe:
+            from bs4 import UnicodeDammit
             with open(original_recipe, 'rb') as f:
                 original_recipe_text = UnicodeDammit(f.read()).unicode_markup
 
@@ -1509,6 +1514,208 @@ def post_process_files(m, initial_prefix_files):
     return new_files
 
 
+# conda-package-handling 1.x changes the process's working directory while it writes a package,
+#    which the rest of the build also does, so only later versions package in the background
+_cph_major_version = int(conda_package_handling.__version__.split('.')[0])
+
+# archives queued by bundle_conda: {build id: {path they are written to: (name, verbose, future)}}
+_package_lock = Lock()
+_package_executors = {}
+_pending_packages = {}
+
+
+def _package_threads(config):
+    """Threads for each compressor: zstd_compression_threads, or else this build's cores shared
+    between the packaging jobs."""
+    if config.zstd_compression_threads > 0:
+        return config.zstd_compression_threads
+    cpu_count = int(os.environ.get('CPU_COUNT') or environ.get_cpu_count())
+    return max(1, cpu_count // max(1, config.package_jobs))
+
+
+def _conda_compression_kwargs(config):
+    """Arguments for conda_package_handling.api.create that compress the contents of .conda
+    packages with the configured zstd level and threads.  conda-package-handling 2 takes a
+    zstandard compressor; older versions take libarchive filter options.  Without
+    zstd_compression_level, the level in config.compression_tuple is kept."""
+    level = config.zstd_compression_level
+    threads = _package_threads(config)
+    ext, compression_filter, filter_opts = config.compression_tuple
+    opts = [opt for opt in (filter_opts or '').split(',') if opt]
+    if _cph_major_version >= 2:
+        import zstandard
+        if level is None:
+            levels = [opt.split('=', 1)[1] for opt in opts
+                      if opt.startswith('zstd:compression-level=')]
+            level = levels[-1] if levels else 22
+        level = int(level)
+        return {'compressor': lambda: zstandard.ZstdCompressor(level=level, threads=threads)}
+    if compression_filter == 'zstd':
+        if level is not None:
+            opts = ['zstd:compression-level={}'.format(int(level))] + [
+                opt for opt in opts if not opt.startswith('zstd:compression-level=')]
+        if threads > 1 and not any(opt.startswith('zstd:threads=') for opt in opts):
+            opts.append('zstd:threads={}'.format(threads))
+        filter_opts = ','.join(opts)
+    return {'compression_tuple': (ext, compression_filter, filter_opts)}
+
+
+def _move_host_prefix_aside(metadata):
+    """Move the host prefix out of the way of the next output.  Returns where its files are now
+    and what to delete once they are packaged (None to keep them)."""
+    prefix = metadata.config.host_prefix
+    if metadata.config.keep_old_work:
+        dest = os.path.join(os.path.dirname(prefix),
+                            '_'.join(('_h_env_moved', metadata.dist(),
+                                      metadata.config.host_subdir)))
+        shutil_move_more_retrying(prefix, dest, "host env")
+        return dest, None
+    staging = tempfile.mkdtemp(prefix='_h_env_packaging_', dir=os.path.dirname(prefix))
+    try:
+        os.rename(prefix, os.path.join(staging, 'prefix'))
+    except OSError:
+        # files in use on Windows, most likely.  Package them where they are.
+        os.rmdir(staging)
+        return prefix, prefix
+    return os.path.join(staging, 'prefix'), staging
+
+
+def _create_package(prefix, files, final_output, config, ignore_verify_codes, cleanup=None):
+    """Write the package of files in prefix to final_output, checking it on the way.  The
+    archive is created next to final_output and renamed into place, so the output folder never
+    holds a partial package."""
+    log = utils.get_logger(__name__)
+    output_folder, output_filename = os.path.split(final_output)
+    try:
+        os.makedirs(output_folder)
+    except OSError:
+        if not os.path.isdir(output_folder):
+            raise
+    tmp = tempfile.mkdtemp(prefix='.pkg-', dir=output_folder)
+    try:
+        kwargs = {}
+        if output_filename.endswith(CONDA_PACKAGE_EXTENSION_V2):
+            kwargs = _conda_compression_kwargs(config)
+        conda_package_handling.api.create(prefix, files, output_filename, out_folder=tmp,
+                                          **kwargs)
+        tmp_path = os.path.join(tmp, output_filename)
+
+        # we're done building, perform some checks
+        if tmp_path.endswith(CONDA_PACKAGE_EXTENSION_V1):
+            tarcheck.check_all(tmp_path, config)
+
+        # we do the import here because we want to respect logger level context
+        try:
+            from conda_verify.verify import Verify
+        except ImportError:
+            Verify = None
+            log.warn("Importing conda-verify failed.  Please be sure to test your packages.  "
+                "conda install conda-verify to make this message go away.")
+        if getattr(config, "verify", False) and Verify:
+            verifier = Verify()
+            checks_to_ignore = (utils.ensure_list(config.ignore_verify_codes) +
+                                ignore_verify_codes)
+            try:
+                verifier.verify_package(path_to_package=tmp_path, checks_to_ignore=checks_to_ignore,
+                                        exit_on_error=config.exit_on_verify_error)
+            except KeyError as e:
+                log.warn("Package doesn't have necessary files.  It might be too old to inspect."
+                         "Legacy noarch packages are known to fail.  Full message was {}".format(e))
+
+        if utils.on_win and os.path.isfile(final_output):
+            os.unlink(final_output)
+        os.rename(tmp_path, final_output)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if cleanup:
+            utils.rm_rf_background(cleanup)
+
+
+def _queue_package(name, jobs, *create_args):
+    with _package_lock:
+        executor = _package_executors.get(jobs)
+        if executor is None:
+            executor = _package_executors[jobs] = ThreadPoolExecutor(jobs)
+        final_output, config = create_args[2], create_args[3]
+        pending = _pending_packages.setdefault(config.build_id, OrderedDict())
+        pending[final_output] = (name, config.debug,
+                                 executor.submit(_create_package, *create_args))
+
+
+def _is_queued(build_id, path):
+    with _package_lock:
+        return path in _pending_packages.get(build_id, {})
+
+
+def wait_for_packages(build_id, names=None):
+    """Block until the packages that bundle_conda queued for build_id - all of them, or only those
+    with one of the given names - are in their output folder, and register them in its index.
+    Returns their paths.  The first packaging error is raised once all of them are done."""
+    with _package_lock:
+        pending = _pending_packages.get(build_id, {})
+        selected = [(path, entry) for path, entry in pending.items()
+                    if names is None or entry[0] in names]
+        for path, _ in selected:
+            del pending[path]
+        if not pending:
+            _pending_packages.pop(build_id, None)
+    wait([future for _, (_, _, future) in selected])
+    error = None
+    for path, (_, verbose, future) in selected:
+        try:
+            future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        register_package(path, verbose=verbose)
+    if error:
+        raise error
+    return [path for path, _ in selected]
+
+
+@contextlib.contextmanager
+def _packages_queued_by(build_id):
+    """When the build fails, let the packages it queued finish before its folders are removed,
+    so that none of them is left for a later build to wait for."""
+    log = utils.get_logger(__name__)
+    succeeded = False
+    try:
+        yield
+        succeeded = True
+    finally:
+        if not succeeded:
+            try:
+                wait_for_packages(build_id)
+            except Exception as e:
+                log.error("Packaging an earlier output of the failed build failed as well: "
+                          "{}".format(e))
+
+
+def _update_build_index(m):
+    # must rebuild index because conda has no way to incrementally add our last
+    #    package to the index.
+    subdir = ('noarch' if (m.noarch or m.noarch_python)
+              else m.config.host_subdir)
+    if m.is_cross:
+        get_build_index(subdir=subdir, bldpkgs_dir=m.config.bldpkgs_dir,
+                        output_folder=m.config.output_folder, channel_urls=m.config.channel_urls,
+                        debug=m.config.debug, verbose=m.config.verbose, locking=m.config.locking,
+                        timeout=m.config.timeout, clear_cache=True)
+    get_build_index(subdir=subdir, bldpkgs_dir=m.config.bldpkgs_dir,
+                    output_folder=m.config.output_folder, channel_urls=m.config.channel_urls,
+                    debug=m.config.debug, verbose=m.config.verbose, locking=m.config.locking,
+                    timeout=m.config.timeout, clear_cache=True)
+
+
+def _index_queued_packages(paths, new_pkgs):
+    """Refresh the build index of each subdir that one of the packages in paths went to."""
+    by_subdir = OrderedDict()
+    for path in paths:
+        by_subdir[os.path.basename(os.path.dirname(path))] = new_pkgs[path][1]
+    for m in by_subdir.values():
+        _update_build_index(m)
+
+
 def bundle_conda(output, metadata, env, stats, **kw):
     log = utils.get_logger(__name__)
     log.info('Packaging %s', metadata.dist())
@@ -1661,76 +1868,36 @@ def bundle_conda(output, metadata, env, stats, **kw):
     files = utils.filter_files(prefix_files - initial_files, prefix=metadata.config.host_prefix)
 
     basename = '-'.join([output['name'], metadata.version(), metadata.build_id()])
-    tmp_archives = []
-    final_outputs = []
     ext = (
         CONDA_PACKAGE_EXTENSION_V2
         if (output.get('type') == 'conda_v2' or metadata.config.conda_pkg_format == "2")
         else CONDA_PACKAGE_EXTENSION_V1
     )
-    with TemporaryDirectory() as tmp:
-        conda_package_handling.api.create(metadata.config.host_prefix, files,
-                                          basename + ext, out_folder=tmp)
-        tmp_archives = [os.path.join(tmp, basename + ext)]
-
-        # we're done building, perform some checks
-        for tmp_path in tmp_archives:
-            if tmp_path.endswith(CONDA_PACKAGE_EXTENSION_V1):
-                tarcheck.check_all(tmp_path, metadata.config)
-            output_filename = os.path.basename(tmp_path)
-
-            # we do the import here because we want to respect logger level context
-            try:
-                from conda_verify.verify import Verify
-            except ImportError:
-                Verify = None
-                log.warn("Importing conda-verify failed.  Please be sure to test your packages.  "
-                    "conda install conda-verify to make this message go away.")
-            if getattr(metadata.config, "verify", False) and Verify:
-                verifier = Verify()
-                checks_to_ignore = (utils.ensure_list(metadata.config.ignore_verify_codes) +
-                                    metadata.ignore_verify_codes())
-                try:
-                    verifier.verify_package(path_to_package=tmp_path, checks_to_ignore=checks_to_ignore,
-                                            exit_on_error=metadata.config.exit_on_verify_error)
-                except KeyError as e:
-                    log.warn("Package doesn't have necessary files.  It might be too old to inspect."
-                             "Legacy noarch packages are known to fail.  Full message was {}".format(e))
-            try:
-                crossed_subdir = metadata.config.target_subdir
-            except AttributeError:
-                crossed_subdir = metadata.config.host_subdir
-            subdir = ('noarch' if (metadata.noarch or metadata.noarch_python)
-                    else crossed_subdir)
-            if metadata.config.output_folder:
-                output_folder = os.path.join(metadata.config.output_folder, subdir)
-            else:
-                output_folder = os.path.join(os.path.dirname(metadata.config.bldpkgs_dir), subdir)
-            final_output = os.path.join(output_folder, output_filename)
-            if os.path.isfile(final_output):
-                utils.rm_rf(final_output)
-
-            # disable locking here.  It's just a temp folder getting locked.  Removing it proved to be
-            #    a major bottleneck.
-            utils.copy_into(tmp_path, final_output, metadata.config.timeout,
-                            locking=False)
-            final_outputs.append(final_output)
-    update_index(os.path.dirname(output_folder), verbose=metadata.config.debug, threads=1)
-
-    # clean out host prefix so that this output's files don't interfere with other outputs
-    #   We have a backup of how things were before any output scripts ran.  That's
-    #   restored elsewhere.
-
-    if metadata.config.keep_old_work:
-        prefix = metadata.config.host_prefix
-        dest = os.path.join(os.path.dirname(prefix),
-                            '_'.join(('_h_env_moved', metadata.dist(),
-                                      metadata.config.host_subdir)))
-        shutil_move_more_retrying(prefix, dest, "host env")
+    try:
+        crossed_subdir = metadata.config.target_subdir
+    except AttributeError:
+        crossed_subdir = metadata.config.host_subdir
+    subdir = ('noarch' if (metadata.noarch or metadata.noarch_python)
+            else crossed_subdir)
+    if metadata.config.output_folder:
+        output_folder = os.path.join(metadata.config.output_folder, subdir)
     else:
-        utils.rm_rf(metadata.config.host_prefix)
-
-    return final_outputs
+        output_folder = os.path.join(os.path.dirname(metadata.config.bldpkgs_dir), subdir)
+    final_output = os.path.join(output_folder, basename + ext)
+
+    # the next output starts over with a fresh host prefix, so this one's files are packaged
+    #    from wherever they were moved to.  We have a backup of how things were before any
+    #    output scripts ran.  That's restored elsewhere.
+    prefix, cleanup = _move_host_prefix_aside(metadata)
+    create_args = (prefix, files, final_output, metadata.config,
+                   metadata.ignore_verify_codes(), cleanup)
+    if (metadata.config.package_jobs > 1 and _cph_major_version >= 2 and
+            prefix != metadata.config.host_prefix):
+        _queue_package(output['name'], metadata.config.package_jobs, *create_args)
+    else:
+        _create_package(*create_args)
+        register_package(final_output, verbose=metadata.config.debug)
+    return [final_output]
 
 
 def bundle_wheel(output, metadata, env, stats):
@@ -2222,7 +2389,7 @@ def build(m, stats, post=None, need_source_download=True, need_reparse_in_env=Fa
         subdir = (m.config.host_subdir if m.config.host_subdir != 'noarch' else
                     m.config.subdir)
 
-        with TemporaryDirectory() as prefix_files_backup:
+        with TemporaryDirectory() as prefix_files_backup, _packages_queued_by(m.config.build_id):
             # back up new prefix files, because we wipe the prefix before each output build
             for f in new_prefix_files:
                 utils.copy_into(os.path.join(m.config.host_prefix, f),
@@ -2284,9 +2451,15 @@ def build(m, stats, post=None, need_source_download=True, need_reparse_in_env=Fa
                     else:
                         m.config._merge_build_host = m.build_is_host
 
-                        utils.rm_rf(m.config.host_prefix)
-                        utils.rm_rf(m.config.build_prefix)
-                        utils.rm_rf(m.config.test_prefix)
+                        # earlier outputs that this one depends on must be done packaging
+                        dep_names = set(ms.name for ms in
+                                        m.ms_depends('host') + m.ms_depends('build'))
+                        _index_queued_packages(wait_for_packages(m.config.build_id, dep_names),
+                                               new_pkgs)
+
+                        utils.rm_rf_background(m.config.host_prefix)
+                        utils.rm_rf_background(m.config.build_prefix)
+                        utils.rm_rf_background(m.config.test_prefix)
 
                         host_ms_deps = m.ms_depends('host')
                         sub_build_ms_deps = m.ms_depends('build')
@@ -2362,21 +2535,13 @@ def build(m, stats, post=None, need_source_download=True, need_reparse_in_env=Fa
                                                      prev_output_d['name']))
                     for built_package in newly_built_packages:
                         new_pkgs[built_package] = (output_d, m)
+                    # queued packages are indexed once wait_for_packages sees them finished
+                    if not all(_is_queued(m.config.build_id, built_package)
+                               for built_package in newly_built_packages):
+                        _update_build_index(m)
 
-                    # must rebuild index because conda has no way to incrementally add our last
-                    #    package to the index.
-
-                    subdir = ('noarch' if (m.noarch or m.noarch_python)
-                              else m.config.host_subdir)
-                    if m.is_cross:
-                        get_build_index(subdir=subdir, bldpkgs_dir=m.config.bldpkgs_dir,
-                                        output_folder=m.config.output_folder, channel_urls=m.config.channel_urls,
-                                        debug=m.config.debug, verbose=m.config.verbose, locking=m.config.locking,
-                                        timeout=m.config.timeout, clear_cache=True)
-                    get_build_index(subdir=subdir, bldpkgs_dir=m.config.bldpkgs_dir,
-                                    output_folder=m.config.output_folder, channel_urls=m.config.channel_urls,
-                                    debug=m.config.debug, verbose=m.config.verbose, locking=m.config.locking,
-                                    timeout=m.config.timeout, clear_cache=True)
+            # the tests need every package, including those still being written
+            _index_queued_packages(wait_for_packages(m.config.build_id), new_pkgs)
     else:
         if not provision_only:
             print("STOPPING BUILD BEFORE POST:", m.dist())
@@ -2488,12 +2653,15 @@ def _construct_metadata_for_test_from_package(package, config):
             pass
         local_pkg_location = os.path.join(local_dir, os.path.basename(package))
         utils.copy_into(package, local_pkg_location)
+        # only our package was added; no need to reindex the whole croot
+        register_package(local_pkg_location, verbose=config.debug)
         local_pkg_location = local_dir
 
     local_channel = os.path.dirname(local_pkg_location)
 
-    # update indices in the channel
-    update_index(local_channel, verbose=config.debug, threads=1)
+    if is_channel:
+        # update indices in the channel
+        update_index(local_channel, verbose=config.debug, threads=1)
 
     try:
         metadata = render_recipe(os.path.join(info_dir, 'recipe'), config=config,
@@ -2975,33 +3143,14 @@ def check_external():
             )
 
 
-def build_tree(recipe_list, config, stats, build_only=False, post=None, notest=False, variants=None):
-
+def _build_recipe_queue(recipe_list, config, stats, post=None, notest=False, variants=None):
+    """Build recipes one after the other, building any missing dependencies that have a recipe
+    next to the recipe that needs them first."""
     to_build_recursive = []
     recipe_list = deque(recipe_list)
-
-    if utils.on_win:
-        trash_dir = os.path.join(os.path.dirname(sys.executable), 'pkgs', '.trash')
-        if os.path.isdir(trash_dir):
-            # We don't really care if this does a complete job.
-            #    Cleaning up some files is better than none.
-            subprocess.call('del /s /q "{0}\\*.*" >nul 2>&1'.format(trash_dir), shell=True)
-        # delete_trash(None)
-
     extra_help = ""
     built_packages = OrderedDict()
     retried_recipes = []
-    initial_time = time.time()
-
-    if build_only:
-        post = False
-        notest = True
-        config.anaconda_upload = False
-    elif post:
-        post = True
-        config.anaconda_upload = False
-    else:
-        post = None
 
     # this is primarily for exception handling.  It's OK that it gets clobbered by
     #     the loop below.
@@ -3059,9 +3208,9 @@ def build_tree(recipe_list, config, stats, build_only=False, post=None, notest=F
             for (metadata, need_source_download, need_reparse_in_env) in metadata_tuples:
                 get_all_replacements(metadata.config.variant)
                 if post is None:
-                    utils.rm_rf(metadata.config.host_prefix)
-                    utils.rm_rf(metadata.config.build_prefix)
-                    utils.rm_rf(metadata.config.test_prefix)
+                    utils.rm_rf_background(metadata.config.host_prefix)
+                    utils.rm_rf_background(metadata.config.build_prefix)
+                    utils.rm_rf_background(metadata.config.test_prefix)
                 if metadata.name() not in metadata.config.build_folder:
                     metadata.config.compute_build_id(metadata.name(), metadata.version(), reset=True)
 
@@ -3206,6 +3355,164 @@ def build_tree(recipe_list, config, stats, build_only=False, post=None, notest=F
             retried_recipes.append(os.path.basename(name))
             recipe_list.extendleft(add_recipes)
 
+    return built_packages
+
+
+def _recipe_dependency_graph(recipe_list, config, variants=None):
+    """Render each recipe (without solving) and return {recipe: set of the other recipes in
+    recipe_list that produce something it needs to build, run or test its outputs}"""
+    outputs = {}
+    requirements = {}
+    for recipe in recipe_list:
+        names, deps = set(), set()
+        metadata_tuples = render_recipe(recipe, config=config.copy(), variants=variants,
+                                        permit_unsatisfiable_variants=True,
+                                        reset_build_id=False, bypass_env_check=True)
+        for metadata, _, _ in metadata_tuples:
+            for _, om in metadata.get_output_metadata_set(permit_undefined_jinja=True,
+                                                          bypass_env_check=True):
+                names.add(om.name())
+                reqs = om.meta.get('requirements', {})
+                specs = (utils.ensure_list(reqs.get('build')) + utils.ensure_list(reqs.get('host')) +
+                         utils.ensure_list(reqs.get('run')) +
+                         utils.ensure_list(om.get_value('test/requires')))
+                deps.update(spec.split()[0] for spec in specs if spec)
+        outputs[recipe] = names
+        requirements[recipe] = deps - names
+
+    producers = defaultdict(set)
+    for recipe, names in outputs.items():
+        for name in names:
+            producers[name].add(recipe)
+    return {recipe: set(producer for dep in requirements[recipe] for producer in producers[dep])
+            for recipe in recipe_list}
+
+
+def _has_cycle(depends_on):
+    done, visiting = set(), set()
+
+    def visit(node):
+        if node in done:
+            return False
+        if node in visiting:
+            return True
+        visiting.add(node)
+        if any(visit(dep) for dep in depends_on[node]):
+            return True
+        visiting.remove(node)
+        done.add(node)
+        return False
+    return any(visit(node) for node in depends_on)
+
+
+def _can_start_build(config):
+    """Whether there's enough free memory to start another build next to running ones"""
+    if not config.build_job_memory:
+        return True
+    try:
+        import psutil
+    except ImportError:
+        return True
+    return psutil.virtual_memory().available >= config.build_job_memory * 1024 ** 2
+
+
+def _build_recipe_node(recipe, config, notest, variants, cpu_count):
+    # runs in a worker process; share the machine's cores between the builds running at once
+    os.environ.setdefault('CPU_COUNT', cpu_count)
+    stats = {}
+    try:
+        built_packages = _build_recipe_queue([recipe], config, stats, notest=notest,
+                                             variants=variants)
+    finally:
+        # worker processes exit without running atexit handlers
+        utils.wait_for_background_deletions()
+    return built_packages, stats
+
+
+def _build_recipe_graph(recipe_list, config, stats, notest=False, variants=None):
+    """Build recipes in worker processes, config.build_jobs at a time.  A recipe starts once
+    all of the other recipes in recipe_list that it depends on are built.  Each build gets its
+    own build folder (build id) in the shared croot, whose local channel is how dependent
+    builds pick up the packages.  With build_job_memory set, further builds only start while
+    that much memory is free."""
+    log = utils.get_logger(__name__)
+    depends_on = _recipe_dependency_graph(recipe_list, config, variants=variants)
+    if _has_cycle(depends_on):
+        log.warn("Recipes depend on each other in a cycle; building them one at a time.")
+        return _build_recipe_queue(recipe_list, config, stats, notest=notest, variants=variants)
+
+    jobs = config.build_jobs
+    cpu_count = str(max(1, int(environ.get_cpu_count()) // jobs))
+    built_packages = OrderedDict()
+    pending = list(recipe_list)
+    done = set()
+    running = {}
+    error = None
+    with ProcessPoolExecutor(jobs) as executor:
+        while pending or running:
+            ready = [recipe for recipe in pending if depends_on[recipe] <= done]
+            while (ready and not error and len(running) < jobs and
+                    (not running or _can_start_build(config))):
+                recipe = ready.pop(0)
+                pending.remove(recipe)
+                log.info("Starting build of {} ({} running)".format(recipe, len(running) + 1))
+                future = executor.submit(_build_recipe_node, recipe, config, notest, variants,
+                                         cpu_count)
+                running[future] = recipe
+            if not running:
+                break
+            # when waiting for memory to free up, check back every few seconds
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED,
+                               timeout=5 if ready and not error else None)
+            for future in finished:
+                recipe = running.pop(future)
+                try:
+                    packages, node_stats = future.result()
+                except Exception as e:
+                    log.error("Build of {} failed; waiting for running builds to finish".format(
+                        recipe))
+                    error = error or e
+                    continue
+                done.add(recipe)
+                built_packages.update(packages)
+                stats.update(node_stats)
+    if error:
+        raise error
+    return built_packages
+
+
+def build_tree(recipe_list, config, stats, build_only=False, post=None, notest=False, variants=None):
+
+    recipe_list = list(recipe_list)
+
+    if utils.on_win:
+        trash_dir = os.path.join(os.path.dirname(sys.executable), 'pkgs', '.trash')
+        if os.path.isdir(trash_dir):
+            # We don't really care if this does a complete job.
+            #    Cleaning up some files is better than none.
+            subprocess.call('del /s /q "{0}\\*.*" >nul 2>&1'.format(trash_dir), shell=True)
+        # delete_trash(None)
+
+    initial_time = time.time()
+
+    if build_only:
+        post = False
+        notest = True
+        config.anaconda_upload = False
+    elif post:
+        post = True
+        config.anaconda_upload = False
+    else:
+        post = None
+
+    if (config.build_jobs > 1 and post is None and len(recipe_list) > 1 and
+            not any(hasattr(recipe, 'config') for recipe in recipe_list)):
+        built_packages = _build_recipe_graph(recipe_list, config, stats, notest=notest,
+                                             variants=variants)
+    else:
+        built_packages = _build_recipe_queue(recipe_list, config, stats, post=post,
+                                             notest=notest, variants=variants)
+
     tarballs = [f for f in built_packages if f.endswith(CONDA_PACKAGE_EXTENSIONS)]
     if post in [True, None]:
         # TODO: could probably use a better check for pkg type than this...
@@ -3375,7 +3682,9 @@ def is_package_built(metadata, env, include_local=True):
     for d in metadata.config.bldpkgs_dirs:
         if not os.path.isdir(d):
             os.makedirs(d)
-        update_index(d, verbose=metadata.config.debug, warn=False, threads=1)
+    ensure_local_channel_indexed(metadata.config.croot,
+                                 {os.path.basename(d) for d in metadata.config.bldpkgs_dirs},
+                                 verbose=metadata.config.debug)
     subdir = getattr(metadata.config, '{}_subdir'.format(env))
 
     urls = [url_path(metadata.config.output_folder), 'local'] if include_local else []
@@ -17,12 +17,10 @@ import sys
 import filelock
 
 import conda_build.api as api
-import conda_build.build as build
 import conda_build.utils as utils
 from conda_build.conda_interface import (add_parser_channels, binstar_upload,
                                          cc_conda_build)
 from conda_build.cli.main_render import get_render_parser
-import conda_build.source as source
 from conda_build.utils import LoggingContext
 from conda_build.config import Config, get_channel_urls
 from os.path import abspath, expanduser, expandvars
@@ -355,6 +353,63 @@ different sets of packages."""
                          'is only enabled for testing with the -t or --test flag.  Change '
                          'meta.yaml or use templates otherwise.'), )
 
+    p.add_argument('--env-template-cache',
+                   action='store_true',
+                   default=cc_conda_build.get('env_template_cache', 'false').lower() == 'true',
+                   help=("Keep a pristine copy of every created build/host/test environment and "
+                         "clone it (hardlinks or reflinks, plus prefix rewriting) when the same "
+                         "set of packages is needed again, instead of relinking every package."), )
+
+    p.add_argument('--git-checkout-mode',
+                   choices=('clone', 'shared', 'tree'),
+                   default=cc_conda_build.get('git_checkout_mode', 'clone'),
+                   help=("How git sources are checked out of the local git cache.  'clone' "
+                         "copies the repository, 'shared' borrows its objects (and those of "
+                         "submodules) from the cache, and 'tree' also keeps one checkout per "
+                         "commit and hardlinks it into the work dir.  Build scripts must not "
+                         "modify sources in place with 'tree'."), )
+
+    p.add_argument('--source-tree-cache',
+                   action='store_true',
+                   default=cc_conda_build.get('source_tree_cache', 'false').lower() == 'true',
+                   help=("Keep url sources extracted and patched in the source cache, keyed by "
+                         "the source and patch hashes, and clone them (reflinks or hardlinks) "
+                         "into the work dir of later builds and variants instead of extracting "
+                         "and patching them again."), )
+
+    p.add_argument('--build-jobs',
+                   type=int,
+                   default=int(cc_conda_build.get('build_jobs', 1)),
+                   help=("Number of recipes to build at once.  Recipes are rendered first, and "
+                         "each one starts when the recipes it depends on have been built."), )
+
+    p.add_argument('--build-job-memory',
+                   type=int,
+                   default=int(cc_conda_build.get('build_job_memory', 0)),
+                   help=("Memory in MiB that one build is expected to need.  With --build-jobs, "
+                         "further builds only start while this much memory is free."), )
+
+    p.add_argument('--package-jobs',
+                   type=int,
+                   default=int(cc_conda_build.get('package_jobs', 1)),
+                   help=("Number of packages to compress at once.  With more than one (and "
+                         "conda-package-handling 2 or later), outputs are packaged in the "
+                         "background while the next output is prepared, and zstd threads for "
+                         ".conda packages are shared between them."), )
+
+    p.add_argument('--zstd-compression-level',
+                   type=int,
+                   default=cc_conda_build.get('zstd_compression_level'),
+                   help=("zstd compression level (1-22) for the contents of .conda packages.  "
+                         "Lower levels package faster at the cost of larger packages.  "
+                         "Defaults to the level in the compression_tuple setting (22)."), )
+
+    p.add_argument('--zstd-compression-threads',
+                   type=int,
+                   default=int(cc_conda_build.get('zstd_compression_threads', 0)),
+                   help=("Threads for compressing each .conda package.  0 (the default) shares "
+                         "the available cores between --package-jobs."), )
+
     p.add_argument('--suppress-variables',
                    action='store_true',
                    help=("Do not display value of environment variables specified in build.script_env."), )
@@ -393,6 +448,7 @@ def output_action(recipe, config):
 
 
 def source_action(recipe, config):
+    import conda_build.source as source
     metadata = api.render(recipe, config=config)[0][0]
     source.provide(metadata)
     print('Source tree in:', metadata.config.work_dir)
@@ -408,6 +464,9 @@ def check_action(recipe, config):
 
 def execute(args):
     _parser, args = parse_args(args)
+    # build pulls in most of conda-build (LIEF, bs4, index, post); leave it until after
+    #    argument parsing so that --help and argument errors stay quick
+    import conda_build.build as build
     config = Config(**args.__dict__)
     build.check_external()
 
@@ -428,6 +487,9 @@ def execute(args):
 
     action = None
     outputs = None
+    if not args.output:
+        # unpinned metadata is only good for file names
+        config.render_without_solve = False
     if args.output:
         action = output_action
         config.verbose = False
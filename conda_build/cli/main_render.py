@@ -145,6 +145,39 @@ source to try fill in related template variables.",
         help=("Use channeldata, if available, to determine run_exports. Otherwise packages "
               "are downloaded to determine this information")
     )
+    p.add_argument(
+        '--output-without-solve',
+        action='store_true',
+        dest='render_without_solve',
+        help=("With --output, work out package file names from the run_exports of packages "
+              "that are available locally (package caches, the local channel and, with "
+              "--use-channeldata, channeldata) instead of solving build and host "
+              "environments.  Environments are still solved for dependencies whose "
+              "run_exports are unknown or ambiguous.")
+    )
+    p.add_argument(
+        '--render-cache',
+        action='store_true',
+        default=cc_conda_build.get('render_cache', 'false').lower() == 'true',
+        help=("Reuse rendered metadata from <croot>/render_cache when the recipe, its variant "
+              "config files, the relevant settings and (when solving) the channel contents "
+              "have not changed.")
+    )
+    p.add_argument(
+        '--render-jobs',
+        type=int,
+        default=int(cc_conda_build.get('render_jobs', 1)),
+        help=("Number of processes used to render independent variants of a recipe.  Recipes "
+              "that need their source to render are always rendered serially.")
+    )
+    p.add_argument(
+        '--source-jobs',
+        type=int,
+        default=int(cc_conda_build.get('source_jobs', 1)),
+        help=("Number of url sources to download at once.  When every source is an archive "
+              "with a folder of its own, they are also extracted at once and patched "
+              "afterwards, in recipe order.")
+    )
     p.add_argument('--variants',
                    nargs=1,
                    action=ParseYAMLArgument,
@@ -194,6 +227,9 @@ def execute(args, print_results=True):
     if args.output:
         config.verbose = False
         config.debug = False
+    else:
+        # unpinned metadata is only good for file names
+        config.render_without_solve = False
 
     metadata_tuples = api.render(args.recipe, config=config,
                                  no_download_source=args.no_source,
@@ -5,8 +5,7 @@ from functools import partial
 import os
 from os import lstat
 from importlib import import_module
-
-from pkg_resources import parse_version
+import re
 
 from conda import __version__ as CONDA_VERSION
 
@@ -28,12 +27,16 @@ except ImportError:
     # no need to patch if it doesn't exist
     pass
 
-conda_43 = parse_version(CONDA_VERSION) >= parse_version("4.3.0a0")
-conda_44 = parse_version(CONDA_VERSION) >= parse_version("4.4.0a0")
-conda_45 = parse_version(CONDA_VERSION) >= parse_version("4.5.0a0")
-conda_46 = parse_version(CONDA_VERSION) >= parse_version("4.6.0a0")
-conda_47 = parse_version(CONDA_VERSION) >= parse_version("4.7.0a0")
-conda_48 = parse_version(CONDA_VERSION) >= parse_version("4.8.0a0")
+# pkg_resources is slow to import, and these only ever compare the minor release (including
+#    its pre-releases), so the leading numbers of the version are all that's needed
+_conda_version_info = tuple(int(part) for part in
+                            re.match(r'(\d+)\.(\d+)', CONDA_VERSION).groups())
+conda_43 = _conda_version_info >= (4, 3)
+conda_44 = _conda_version_info >= (4, 4)
+conda_45 = _conda_version_info >= (4, 5)
+conda_46 = _conda_version_info >= (4, 6)
+conda_47 = _conda_version_info >= (4, 7)
+conda_48 = _conda_version_info >= (4, 8)
 
 if conda_44:
     from conda.exports import display_actions, execute_actions, execute_plan, install_actions
@@ -143,6 +146,12 @@ os.environ[str('CONDA_ALLOW_SOFTLINKS')] = str('false')
 reset_context()
 
 get_local_urls = lambda: list(get_conda_build_local_url()) or []
+
+# where conda keeps the repodata it downloads for each channel subdir
+try:
+    from conda.core.subdir_data import cache_fn_url, create_cache_dir  # NOQA
+except ImportError:
+    from conda.core.repodata import cache_fn_url, create_cache_dir  # NOQA
 arch_name = context.arch_name
 
 
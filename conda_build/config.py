@@ -18,7 +18,8 @@ from .conda_interface import binstar_upload
 from .variants import get_default_variant
 from .conda_interface import cc_platform, cc_conda_build, subdir, url_path
 
-from .utils import get_build_folders, rm_rf, get_logger, get_conda_operation_locks
+from .utils import (get_build_folders, rm_rf, get_logger, get_conda_operation_locks,
+                    CopyOnWriteDict)
 
 
 on_win = (sys.platform == 'win32')
@@ -129,6 +130,11 @@ def _get_default_settings():
             # not exist for the channel.
             Setting('use_channeldata', False),
 
+            # Finalize metadata with the run_exports of locally known packages instead of solving
+            #    build and host environments, solving only when those are unknown or ambiguous.
+            #    Enough to get package file names right, but leaves dependencies unpinned.
+            Setting('render_without_solve', False),
+
             # Disable the overlinking test for this package. This test checks that transitive DSOs
             # are not referenced by DSOs in the package being built. When this happens something
             # has gone wrong with:
@@ -180,6 +186,18 @@ def _get_default_settings():
 
             # source provisioning.
             Setting('git_commits_since_tag', 0),
+            # how git sources are checked out of the git_cache mirror: 'clone' copies the
+            #    objects, 'shared' borrows them from the mirror (and submodule mirrors) via
+            #    alternates, 'tree' additionally keeps one checkout per commit and hardlinks it
+            #    into the work dir.  Build scripts must not modify sources in place with 'tree'.
+            Setting('git_checkout_mode', cc_conda_build.get('git_checkout_mode', 'clone')),
+            # keep every url source extracted and patched in src_tree_cache, keyed by the source
+            #    and patch hashes, and clone it into the work dir of later builds and variants
+            Setting('source_tree_cache', cc_conda_build.get('source_tree_cache',
+                                                            'false').lower() == 'true'),
+            # number of url sources downloaded (and, when each has a folder of its own,
+            #    extracted) at once
+            Setting('source_jobs', int(cc_conda_build.get('source_jobs', 1))),
 
             # pypi upload settings (twine)
             Setting('password', None),
@@ -215,18 +233,59 @@ def _get_default_settings():
 
             # set up compression algorithm used in new-style packages
             Setting('compression_tuple', ('.tar.zst', 'zstd', 'zstd:compression-level=22')),
+            # zstd level and threads for the contents of .conda packages.  Without a level, the
+            #    one in compression_tuple is used.  0 threads shares the cores between
+            #    package_jobs.  .tar.bz2 packages are always written by conda-package-handling
+            #    with its own bzip2 settings.
+            Setting('zstd_compression_level', cc_conda_build.get('zstd_compression_level')),
+            Setting('zstd_compression_threads',
+                    int(cc_conda_build.get('zstd_compression_threads', 0))),
 
             # this can be set to different values (currently only 2 means anything) to use package formats
             Setting('conda_pkg_format', cc_conda_build.get('pkg_format', conda_pkg_format_default)),
 
+            # number of packages compressed at once, in the background of the next output
+            #    (conda-package-handling 2 or later)
+            Setting('package_jobs', int(cc_conda_build.get('package_jobs', 1))),
+
             Setting('suppress_variables', False),
 
+            # reuse previously linked environments (keyed by their exact set of packages) as
+            #    templates that are cloned into new prefixes instead of relinking every package
+            Setting('env_template_cache', cc_conda_build.get('env_template_cache',
+                                                             'false').lower() == 'true'),
+
+            # keep rendered metadata in <croot>/render_cache, keyed by everything that goes into
+            #    rendering, and return it from api.render when nothing has changed
+            Setting('render_cache', cc_conda_build.get('render_cache', 'false').lower() == 'true'),
+
+            # number of recipes build_tree builds at once, in the order their dependencies allow
+            Setting('build_jobs', int(cc_conda_build.get('build_jobs', 1))),
+            # memory (MiB) one build is expected to need; with build_jobs > 1, further builds
+            #    only start while this much is available.  0 disables the check.
+            Setting('build_job_memory', int(cc_conda_build.get('build_job_memory', 0))),
+
+            # number of worker processes used to render independent variants of a recipe
+            Setting('render_jobs', int(cc_conda_build.get('render_jobs', 1))),
+
             Setting('build_id_pat', cc_conda_build.get('build_id_pat',
                                                             '{n}_{t}')),
 
             ]
 
 
+def _fork_variant(variant, memo):
+    """Copy of variant for a new Config.  Dicts are forked copy-on-write (see
+    CopyOnWriteDict.fork); other types (OrderedDict, HashableDict etc.) keep their type."""
+    key = id(variant)
+    if key not in memo:
+        if type(variant) in (dict, CopyOnWriteDict):
+            memo[key] = CopyOnWriteDict.fork(variant)
+        else:
+            memo[key] = copy.deepcopy(variant)
+    return memo[key]
+
+
 def print_function_deprecation_warning(func):
     def func_wrapper(*args, **kw):
         log = get_logger(__name__)
@@ -761,6 +820,13 @@ class Config(object):
         _ensure_dir(path)
         return path
 
+    @property
+    def src_tree_cache(self):
+        """Where extracted and patched url sources are kept for reuse"""
+        path = join(self.src_cache_root, 'src_tree_cache')
+        _ensure_dir(path)
+        return path
+
     @property
     def hg_cache(self):
         """Where local clones of hg sources are stored"""
@@ -775,6 +841,20 @@ class Config(object):
         _ensure_dir(path)
         return path
 
+    @property
+    def render_cache_dir(self):
+        """Where api.render keeps previously rendered metadata"""
+        path = join(self.croot, 'render_cache')
+        _ensure_dir(path)
+        return path
+
+    @property
+    def env_template_dir(self):
+        """Where pristine copies of previously created environments are kept"""
+        path = join(self.croot, 'env_templates')
+        _ensure_dir(path)
+        return path
+
     @property
     def work_dir(self):
         """Where the source for the build is extracted/copied to."""
@@ -838,12 +918,21 @@ class Config(object):
     def clean_pkgs(self):
         for folder in self.bldpkgs_dirs:
             rm_rf(folder)
+        rm_rf(join(self.croot, 'env_templates'))
+        rm_rf(join(self.croot, 'render_cache'))
 
     def copy(self):
         new = copy.copy(self)
-        new.variant = copy.deepcopy(self.variant)
+        # variant dicts are forked copy-on-write: nested values only get copied by whichever
+        #    config touches them first.  The memo keeps new.variant and its entry in
+        #    new.variants the same object, as they are here.
+        memo = {}
+        new.variant = _fork_variant(self.variant, memo)
         if hasattr(self, 'variants'):
-            new.variants = copy.deepcopy(self.variants)
+            if isinstance(self.variants, list):
+                new.variants = [_fork_variant(variant, memo) for variant in self.variants]
+            else:
+                new.variants = copy.deepcopy(self.variants)
         return new
 
     # context management - automatic cleanup if self.dirty or self.keep_old_work is not True
@@ -1,12 +1,14 @@
 from __future__ import absolute_import, division, print_function
 
 import contextlib
+import hashlib
 import json
 import logging
 import multiprocessing
 import os
 import platform
 import re
+import shutil
 import subprocess
 import sys
 import warnings
@@ -263,6 +265,56 @@ def get_hg_build_info(repo):
     return d
 
 
+# GIT_*/HG_* variables by repository folder: {vcs_dir: (state, variables)}.  meta_vars runs on
+#    every render of a recipe, and working these out takes several git processes.
+_vcs_vars_cache = {}
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def _git_state(git_dir):
+    """Something that changes whenever the output of the git commands behind the GIT_*
+    variables could: HEAD and the ref it points to, packed refs, loose tags and the repo
+    config.  Read straight from the .git folder; None when that isn't a plain folder."""
+    if not os.path.isdir(git_dir):
+        return None
+    try:
+        with open(join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except (IOError, OSError):
+        return None
+    ref = None
+    if head.startswith('ref:'):
+        ref_path = join(git_dir, *head[4:].strip().split('/'))
+        if os.path.isfile(ref_path):
+            with open(ref_path) as f:
+                ref = f.read().strip()
+    return (head, ref) + tuple(_file_state(join(git_dir, name)) for name in
+                               ('packed-refs', join('refs', 'tags'), 'config', 'shallow'))
+
+
+def _hg_state(hg_dir):
+    return tuple(_file_state(join(hg_dir, name)) for name in
+                 ('dirstate', join('store', '00changelog.i'), join('..', '.hgtags')))
+
+
+def _cached_vcs_vars(vcs_dir, state, compute):
+    """compute(), reused as long as the repository's state stays the same"""
+    cached = _vcs_vars_cache.get(vcs_dir)
+    if state is not None and cached and cached[0] == state:
+        return dict(cached[1])
+    result = compute()
+    if state is not None:
+        _vcs_vars_cache[vcs_dir] = (state, dict(result))
+    return result
+
+
 def get_dict(m, prefix=None, for_env=True, skip_build_id=False, escape_backslash=False, variant=None):
     if not prefix:
         prefix = m.config.host_prefix
@@ -472,21 +524,32 @@ def meta_vars(meta, skip_build_id=False):
             # If git_url is a relative path instead of a url, convert it to an abspath
             git_url = normpath(join(meta.path, git_url))
 
-        _x = False
+        git_rev = meta.get_value('source/0/git_rev', 'HEAD')
+        source_path = meta.get_value('source/0/path')
+
+        def git_vars():
+            _x = False
 
-        if git_url:
-            _x = verify_git_repo(git_exe,
-                                 git_dir,
-                                 git_url,
-                                 meta.config.git_commits_since_tag,
-                                 meta.config.debug,
-                                 meta.get_value('source/0/git_rev', 'HEAD'))
+            if git_url:
+                _x = verify_git_repo(git_exe,
+                                     git_dir,
+                                     git_url,
+                                     meta.config.git_commits_since_tag,
+                                     meta.config.debug,
+                                     git_rev)
 
-        if _x or meta.get_value('source/0/path'):
-            d.update(get_git_info(git_exe, git_dir, meta.config.debug))
+            if _x or source_path:
+                return get_git_info(git_exe, git_dir, meta.config.debug)
+            return {}
+
+        state = _git_state(git_dir)
+        d.update(_cached_vcs_vars(git_dir, state and (state, git_exe, git_url, git_rev,
+                                                      bool(source_path),
+                                                      meta.config.git_commits_since_tag),
+                                  git_vars))
 
     elif external.find_executable('hg', meta.config.build_prefix) and os.path.exists(hg_dir):
-        d.update(get_hg_build_info(hg_dir))
+        d.update(_cached_vcs_vars(hg_dir, _hg_state(hg_dir), lambda: get_hg_build_info(hg_dir)))
 
     # use `get_value` to prevent early exit while name is still unresolved during rendering
     d['PKG_NAME'] = meta.get_value('package/name')
@@ -851,6 +914,134 @@ def get_install_actions(prefix, specs, env, retries=0, subdir=None,
     return actions
 
 
+def _link_record_id(rec):
+    url = getattr(rec, 'url', None) or str(rec)
+    md5 = getattr(rec, 'md5', None) or ''
+    return ' '.join((url, md5))
+
+
+def env_template_key(actions):
+    """Content address of the environment described by actions: a hash of its sorted LINK
+    records.  Returns None when there is nothing to link."""
+    records = sorted(_link_record_id(rec) for rec in actions.get('LINK', []))
+    if not records:
+        return None
+    return hashlib.sha256('\n'.join(records).encode('utf-8')).hexdigest()
+
+
+def _files_containing_prefix(prefix):
+    """Split the files in prefix that embed the prefix path into text and binary files."""
+    prefix_bytes = prefix.encode(utils.codec)
+    text, binary = [], []
+    for root, _, files in utils.walk(prefix):
+        for fn in files:
+            path = join(root, fn)
+            if os.path.islink(path) or os.path.getsize(path) < len(prefix_bytes):
+                continue
+            with open(path, 'rb') as fi:
+                mm = utils.mmap_mmap(fi.fileno(), 0, tagname=None, flags=utils.mmap_MAP_PRIVATE,
+                                     prot=utils.mmap_PROT_READ)
+                try:
+                    if mm.find(prefix_bytes) == -1:
+                        continue
+                    mode = binary if mm.find(b'\x00') != -1 else text
+                finally:
+                    mm.close()
+            mode.append(os.path.relpath(path, prefix).replace('\\', '/'))
+    return text, binary
+
+
+def _binary_replace(data, old, new):
+    """Replace old with new in the NUL-terminated strings of data, padding with NUL bytes so
+    that the length (and every offset) of data is unchanged.  Same approach as conda's."""
+    def replace(match):
+        occurrences = match.group().count(old)
+        padding = (len(old) - len(new)) * occurrences
+        return match.group().replace(old, new) + b'\x00' * padding
+
+    pat = re.compile(re.escape(old) + b'([^\x00]*?)\x00')
+    return pat.sub(replace, data)
+
+
+def _env_template_lock(path, config):
+    return [utils.get_lock(path, timeout=config.timeout)] if config.locking else []
+
+
+def save_env_template(key, prefix, config):
+    """Snapshot a freshly created prefix as the template for key.
+
+    Unchanged files are hardlinked (or reflinked) into the template, files that embed the
+    prefix are copied so that they can be rewritten when the template is materialized."""
+    template = join(config.env_template_dir, key)
+    manifest_path = template + '.json'
+    with utils.try_acquire_locks(_env_template_lock(template, config), timeout=config.timeout):
+        if os.path.isfile(manifest_path) and os.path.isdir(template):
+            return
+        text, binary = _files_containing_prefix(prefix)
+        tmp = '{}.tmp-{}'.format(template, os.getpid())
+        utils.rm_rf(tmp)
+        utils.rm_rf(template)
+        try:
+            utils.clone_tree(prefix, tmp, exclude=text + binary)
+            for f in text + binary:
+                utils.clone_file(join(prefix, f), join(tmp, f), hardlink=False)
+            os.rename(tmp, template)
+            with open(manifest_path + '.tmp', 'w') as fh:
+                json.dump({'prefix': prefix, 'text': text, 'binary': binary}, fh)
+            os.rename(manifest_path + '.tmp', manifest_path)
+        except (IOError, OSError) as exc:
+            utils.get_logger(__name__).warn("Failed to save environment template for %s: %s",
+                                            prefix, str(exc))
+            utils.rm_rf(tmp)
+            utils.rm_rf(template)
+
+
+def materialize_env_template(key, prefix, config):
+    """Create prefix by cloning the template for key, rewriting the template's prefix in the
+    files that embed it.  Returns False (leaving prefix empty) when no usable template exists."""
+    template = join(config.env_template_dir, key)
+    manifest_path = template + '.json'
+    log = utils.get_logger(__name__)
+    with utils.try_acquire_locks(_env_template_lock(template, config), timeout=config.timeout):
+        if not (os.path.isfile(manifest_path) and os.path.isdir(template)):
+            return False
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+        old_prefix = manifest['prefix']
+        if manifest['binary'] and len(prefix) > len(old_prefix):
+            log.debug("Environment template %s has binary files with a shorter prefix than %s",
+                      key, prefix)
+            return False
+        old, new = old_prefix.encode(utils.codec), prefix.encode(utils.codec)
+        try:
+            utils.clone_tree(template, prefix, exclude=manifest['text'] + manifest['binary'],
+                             link_prefixes=(old_prefix, prefix))
+            for files, rewrite in ((manifest['text'], lambda data: data.replace(old, new)),
+                                   (manifest['binary'], lambda data: _binary_replace(data, old, new))):
+                for f in files:
+                    src, dst = join(template, f), join(prefix, f)
+                    with open(src, 'rb') as fh:
+                        data = fh.read()
+                    with open(dst, 'wb') as fh:
+                        fh.write(rewrite(data))
+                    shutil.copymode(src, dst)
+        except (IOError, OSError) as exc:
+            log.warn("Failed to materialize environment template %s, removing it: %s",
+                     key, str(exc))
+            for entry in glob(os.path.join(prefix, "*")):
+                utils.rm_rf(entry)
+            utils.rm_rf(template)
+            utils.rm_rf(manifest_path)
+            return False
+    try:
+        # conda keeps an in-memory cache of prefix records which has not seen this prefix
+        from conda.core.prefix_data import PrefixData
+        PrefixData._cache_.pop(prefix, None)
+    except (ImportError, AttributeError):
+        pass
+    return True
+
+
 def create_env(prefix, specs_or_actions, env, config, subdir, clear_cache=True, retry=0,
                locks=None, is_cross=False, is_conda=False):
     '''
@@ -862,8 +1053,10 @@ def create_env(prefix, specs_or_actions, env, config, subdir, clear_cache=True,
         external_logger_context = utils.LoggingContext(logging.WARN)
 
     if os.path.exists(prefix):
+        # the trash has to be outside of the prefix, or it would end up in the package
+        trash_dir = os.path.join(os.path.dirname(os.path.normpath(prefix)), '.conda_trash')
         for entry in glob(os.path.join(prefix, "*")):
-            utils.rm_rf(entry)
+            utils.rm_rf_background(entry, config=config, trash_dir=trash_dir)
 
     with external_logger_context:
         log = utils.get_logger(__name__)
@@ -908,9 +1101,17 @@ def create_env(prefix, specs_or_actions, env, config, subdir, clear_cache=True,
                     if utils.on_win:
                         for k, v in os.environ.items():
                             os.environ[k] = str(v)
-                    with env_var('CONDA_QUIET', not config.verbose, reset_context):
-                        with env_var('CONDA_JSON', not config.verbose, reset_context):
-                            execute_actions(actions, index)
+                    template_key = None
+                    if config.env_template_cache and not utils.on_win:
+                        template_key = env_template_key(actions)
+                    if template_key and materialize_env_template(template_key, prefix, config):
+                        log.debug("Created %s from environment template %s", prefix, template_key)
+                    else:
+                        with env_var('CONDA_QUIET', not config.verbose, reset_context):
+                            with env_var('CONDA_JSON', not config.verbose, reset_context):
+                                execute_actions(actions, index)
+                        if template_key:
+                            save_env_template(template_key, prefix, config)
             except (SystemExit, PaddingError, LinkError, DependencyNeedsBuildingError,
                     CondaError, BuildLockError) as exc:
                 if (("too short in" in str(exc) or
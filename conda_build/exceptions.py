@@ -90,6 +90,17 @@ class RecipeError(CondaBuildException):
     pass
 
 
+class RunExportsUnavailableError(CondaBuildException):
+    """ Raised when the run_exports of a dependency can't be known without solving for it. """
+    def __init__(self, spec, reason, *args):
+        super(RunExportsUnavailableError, self).__init__(spec, reason, *args)
+        self.spec = spec
+        self.reason = reason
+
+    def __str__(self):
+        return "run_exports of {} are not known: {}".format(self.spec, self.reason)
+
+
 class BuildLockError(CondaBuildException):
     """ Raised when we failed to acquire a lock. """
 
@@ -21,7 +21,6 @@ from uuid import uuid4
 from conda.common.compat import ensure_binary
 
 import pytz
-from jinja2 import Environment, PackageLoader
 from tqdm import tqdm
 import yaml
 from yaml.constructor import ConstructorError
@@ -87,11 +86,11 @@ except ImportError:
     NAMESPACE_PACKAGE_NAMES = frozenset(NAMESPACES_MAP)
     NAMESPACES = frozenset(NAMESPACES_MAP.values())
 
-local_index_timestamp = 0
-cached_index = None
-local_subdir = ""
-local_output_folder = ""
-cached_channels = []
+# Loaded build indexes, keyed by (subdir, output folder, channel urls, omit_defaults), least
+#    recently used first.  Keeping several around means that alternating between the build and
+#    host subdirs of a cross-compile, or between channel lists, does not reload repodata.
+BUILD_INDEX_CACHE_SIZE = 8
+_build_index_cache = OrderedDict()
 channel_data = {}
 
 
@@ -114,122 +113,141 @@ except ImportError:  # pragma: no cover
     from conda._vendor.toolz.itertoolz import concat, concatv, groupby  # NOQA
 
 
+class _CachedBuildIndex(object):
+    """A loaded build index along with the state of the local channel it was built from."""
+
+    def __init__(self, index, output_folder, subdir):
+        self.index = index
+        self.output_folder = output_folder
+        self.subdir = subdir
+        self.timestamp = _local_repodata_mtime(output_folder, subdir)
+
+    def is_fresh(self):
+        # a couple of stats - much cheaper than re-reading repodata
+        mtime = _local_repodata_mtime(self.output_folder, self.subdir)
+        return bool(mtime) and mtime <= self.timestamp
+
+
+def _local_repodata_mtime(output_folder, subdir):
+    mtime = 0
+    for folder in {subdir, 'noarch'}:
+        index_file = os.path.join(output_folder, folder, 'repodata.json')
+        if os.path.isfile(index_file):
+            mtime = max(mtime, os.path.getmtime(index_file))
+    return mtime
+
+
+def clear_build_index_cache():
+    _build_index_cache.clear()
+
+
 def get_build_index(subdir, bldpkgs_dir, output_folder=None, clear_cache=False,
                     omit_defaults=False, channel_urls=None, debug=False, verbose=True,
                     **kwargs):
-    global local_index_timestamp
-    global local_subdir
-    global local_output_folder
-    global cached_index
-    global cached_channels
-    global channel_data
-    mtime = 0
-
     channel_urls = list(utils.ensure_list(channel_urls))
 
     if not output_folder:
         output_folder = dirname(bldpkgs_dir)
 
-    # check file modification time - this is the age of our local index.
-    index_file = os.path.join(output_folder, subdir, 'repodata.json')
-    if os.path.isfile(index_file):
-        mtime = os.path.getmtime(index_file)
-
-    if (clear_cache or
-            not os.path.isfile(index_file) or
-            local_subdir != subdir or
-            local_output_folder != output_folder or
-            mtime > local_index_timestamp or
-            cached_channels != channel_urls):
-
-        # priority: (local as either croot or output_folder IF NOT EXPLICITLY IN CHANNEL ARGS),
-        #     then channels passed as args (if local in this, it remains in same order),
-        #     then channels from condarc.
-        urls = list(channel_urls)
-
-        loggers = utils.LoggingContext.default_loggers + [__name__]
-        if debug:
-            log_context = partial(utils.LoggingContext, logging.DEBUG, loggers=loggers)
-        elif verbose:
-            log_context = partial(utils.LoggingContext, logging.WARN, loggers=loggers)
-        else:
-            log_context = partial(utils.LoggingContext, logging.CRITICAL + 1, loggers=loggers)
-        with log_context():
-            # this is where we add the "local" channel.  It's a little smarter than conda, because
-            #     conda does not know about our output_folder when it is not the default setting.
-            if os.path.isdir(output_folder):
-                local_path = url_path(output_folder)
-                # replace local with the appropriate real channel.  Order is maintained.
-                urls = [url if url != 'local' else local_path for url in urls]
-                if local_path not in urls:
-                    urls.insert(0, local_path)
-            _ensure_valid_channel(output_folder, subdir)
-            update_index(output_folder, verbose=debug)
-
-            # replace noarch with native subdir - this ends up building an index with both the
-            #      native content and the noarch content.
-
-            if subdir == 'noarch':
-                subdir = conda_interface.subdir
-            try:
-                cached_index = get_index(channel_urls=urls,
-                                         prepend=not omit_defaults,
-                                         use_local=False,
-                                         use_cache=context.offline,
-                                         platform=subdir)
-            # HACK: defaults does not have the many subfolders we support.  Omit it and
-            #          try again.
-            except CondaHTTPError:
-                if 'defaults' in urls:
-                    urls.remove('defaults')
-                cached_index = get_index(channel_urls=urls,
-                                         prepend=omit_defaults,
-                                         use_local=False,
-                                         use_cache=context.offline,
-                                         platform=subdir)
-
-            expanded_channels = {rec.channel for rec in cached_index.values()}
-
-            superchannel = {}
-            # we need channeldata.json too, as it is a more reliable source of run_exports data
-            for channel in expanded_channels:
-                if channel.scheme == "file":
-                    location = channel.location
-                    if utils.on_win:
-                        location = location.lstrip("/")
-                    elif (not os.path.isabs(channel.location) and
-                            os.path.exists(os.path.join(os.path.sep, channel.location))):
-                        location = os.path.join(os.path.sep, channel.location)
-                    channeldata_file = os.path.join(location, channel.name, 'channeldata.json')
-                    retry = 0
-                    max_retries = 1
-                    if os.path.isfile(channeldata_file):
-                        while retry < max_retries:
-                            try:
-                                with open(channeldata_file, "r+") as f:
-                                    channel_data[channel.name] = json.load(f)
-                                break
-                            except (IOError, JSONDecodeError):
-                                time.sleep(0.2)
-                                retry += 1
-                else:
-                    # download channeldata.json for url
-                    if not context.offline:
+    key = (subdir, output_folder, tuple(channel_urls), omit_defaults)
+    cached = _build_index_cache.pop(key, None)
+    if clear_cache or not cached or not cached.is_fresh():
+        index = _load_build_index(subdir, output_folder, channel_urls, omit_defaults,
+                                  debug=debug, verbose=verbose)
+        cached = _CachedBuildIndex(index, output_folder, subdir)
+    # (re)insert as the most recently used entry, evicting the least recently used ones
+    _build_index_cache[key] = cached
+    while len(_build_index_cache) > BUILD_INDEX_CACHE_SIZE:
+        _build_index_cache.popitem(last=False)
+    return cached.index, cached.timestamp, channel_data
+
+
+def _load_build_index(subdir, output_folder, channel_urls, omit_defaults, debug=False,
+                      verbose=True):
+    # priority: (local as either croot or output_folder IF NOT EXPLICITLY IN CHANNEL ARGS),
+    #     then channels passed as args (if local in this, it remains in same order),
+    #     then channels from condarc.
+    urls = list(channel_urls)
+
+    loggers = utils.LoggingContext.default_loggers + [__name__]
+    if debug:
+        log_context = partial(utils.LoggingContext, logging.DEBUG, loggers=loggers)
+    elif verbose:
+        log_context = partial(utils.LoggingContext, logging.WARN, loggers=loggers)
+    else:
+        log_context = partial(utils.LoggingContext, logging.CRITICAL + 1, loggers=loggers)
+    with log_context():
+        # this is where we add the "local" channel.  It's a little smarter than conda, because
+        #     conda does not know about our output_folder when it is not the default setting.
+        if os.path.isdir(output_folder):
+            local_path = url_path(output_folder)
+            # replace local with the appropriate real channel.  Order is maintained.
+            urls = [url if url != 'local' else local_path for url in urls]
+            if local_path not in urls:
+                urls.insert(0, local_path)
+        _ensure_valid_channel(output_folder, subdir)
+        ensure_local_channel_indexed(output_folder, {subdir, 'noarch'}, verbose=debug)
+
+        # replace noarch with native subdir - this ends up building an index with both the
+        #      native content and the noarch content.
+
+        if subdir == 'noarch':
+            subdir = conda_interface.subdir
+        try:
+            index = get_index(channel_urls=urls,
+                              prepend=not omit_defaults,
+                              use_local=False,
+                              use_cache=context.offline,
+                              platform=subdir)
+        # HACK: defaults does not have the many subfolders we support.  Omit it and
+        #          try again.
+        except CondaHTTPError:
+            if 'defaults' in urls:
+                urls.remove('defaults')
+            index = get_index(channel_urls=urls,
+                              prepend=omit_defaults,
+                              use_local=False,
+                              use_cache=context.offline,
+                              platform=subdir)
+
+        expanded_channels = {rec.channel for rec in index.values()}
+
+        superchannel = {}
+        # we need channeldata.json too, as it is a more reliable source of run_exports data
+        for channel in expanded_channels:
+            if channel.scheme == "file":
+                location = channel.location
+                if utils.on_win:
+                    location = location.lstrip("/")
+                elif (not os.path.isabs(channel.location) and
+                        os.path.exists(os.path.join(os.path.sep, channel.location))):
+                    location = os.path.join(os.path.sep, channel.location)
+                channeldata_file = os.path.join(location, channel.name, 'channeldata.json')
+                retry = 0
+                max_retries = 1
+                if os.path.isfile(channeldata_file):
+                    while retry < max_retries:
                         try:
-                            channel_data[channel.name] = utils.download_channeldata(channel.base_url + '/channeldata.json')
-                        except CondaHTTPError:
-                            continue
-                # collapse defaults metachannel back into one superchannel, merging channeldata
-                if channel.base_url in context.default_channels and channel_data.get(channel.name):
-                    packages = superchannel.get('packages', {})
-                    packages.update(channel_data[channel.name])
-                    superchannel['packages'] = packages
-            channel_data['defaults'] = superchannel
-        local_index_timestamp = os.path.getmtime(index_file)
-        local_subdir = subdir
-        local_output_folder = output_folder
-        cached_channels = channel_urls
-    return cached_index, local_index_timestamp, channel_data
+                            with open(channeldata_file, "r+") as f:
+                                channel_data[channel.name] = json.load(f)
+                            break
+                        except (IOError, JSONDecodeError):
+                            time.sleep(0.2)
+                            retry += 1
+            else:
+                # download channeldata.json for url
+                if not context.offline:
+                    try:
+                        channel_data[channel.name] = utils.download_channeldata(channel.base_url + '/channeldata.json')
+                    except CondaHTTPError:
+                        continue
+            # collapse defaults metachannel back into one superchannel, merging channeldata
+            if channel.base_url in context.default_channels and channel_data.get(channel.name):
+                packages = superchannel.get('packages', {})
+                packages.update(channel_data[channel.name])
+                superchannel['packages'] = packages
+        channel_data['defaults'] = superchannel
+    return index
 
 
 def _ensure_valid_channel(local_folder, subdir):
@@ -270,6 +288,40 @@ def update_index(dir_path, check_md5=False, channel_name=None, patch_generator=N
                             index_file=index_file)
 
 
+def register_package(pkg_path, verbose=False):
+    """Add a freshly built package to the repodata of the local channel that it was written to.
+
+    Only the new package is extracted and indexed; the rest of the channel is left alone.  Falls
+    back to a full update_index when the subdir has not been indexed yet or its index is broken."""
+    subdir_path, fn = os.path.split(abspath(pkg_path))
+    channel_root, subdir = os.path.split(subdir_path)
+    channel_index = ChannelIndex(channel_root, None, threads=1)
+    if not channel_index.register_package(subdir, fn, verbose=verbose):
+        log.debug("local index of %s is missing or broken; reindexing the channel", subdir_path)
+        update_index(channel_root, verbose=verbose, threads=1)
+
+
+def _local_subdir_is_consistent(channel_root, subdir):
+    subdir_path = join(channel_root, subdir)
+    if not isfile(join(subdir_path, REPODATA_JSON_FN)):
+        return False
+    try:
+        with open(join(subdir_path, REPODATA_FROM_PKGS_JSON_FN)) as fh:
+            repodata = json.load(fh)
+    except (EnvironmentError, JSONDecodeError):
+        return False
+    indexed = set(repodata.get('packages', {})) | set(repodata.get('packages.conda', {}))
+    present = {fn for fn in os.listdir(subdir_path) if fn.endswith(CONDA_PACKAGE_EXTENSIONS)}
+    return not (present - indexed - set(repodata.get('removed', [])) or indexed - present)
+
+
+def ensure_local_channel_indexed(channel_root, subdirs, verbose=False):
+    """Run a full update_index on channel_root only if the repodata of one of subdirs is missing
+    or does not match the packages that are actually there."""
+    if not all(_local_subdir_is_consistent(channel_root, subdir) for subdir in subdirs):
+        update_index(channel_root, verbose=verbose)
+
+
 def _determine_namespace(info):
     if info.get('namespace'):
         namespace = info['namespace']
@@ -389,6 +441,8 @@ def _apply_instructions(subdir, repodata, instructions):
 
 
 def _get_jinja2_environment():
+    from jinja2 import Environment, PackageLoader
+
     def _filter_strftime(dt, dt_format):
         if isinstance(dt, Number):
             if dt > 253402300799:  # 9999-12-31
@@ -856,6 +910,66 @@ class ChannelIndex(object):
                 self._write_channeldata_index_html(channel_data)
                 self._write_channeldata(channel_data)
 
+    def register_package(self, subdir, fn, verbose=False):
+        """Index the single package fn into the existing repodata of subdir.
+
+        Returns False, without changing anything, if subdir has no usable repodata to add to or
+        the package could not be read.  The subdir's index.html is refreshed by the next full
+        index."""
+        subdir_path = join(self.channel_root, subdir)
+        with utils.LoggingContext(logging.DEBUG if verbose else logging.ERROR, loggers=[__name__]):
+            with utils.try_acquire_locks([utils.get_lock(self.channel_root)], timeout=900):
+                try:
+                    with open(join(subdir_path, REPODATA_FROM_PKGS_JSON_FN)) as fh:
+                        repodata = json.load(fh)
+                except (EnvironmentError, JSONDecodeError):
+                    return False
+                if not repodata or not isfile(join(subdir_path, REPODATA_JSON_FN)):
+                    return False
+
+                self._ensure_dirs(subdir)
+                fn, mtime, size, index_json = ChannelIndex._extract_to_cache(self.channel_root,
+                                                                             subdir, fn)
+                if not (mtime and index_json):
+                    return False
+
+                stat_cache_path = join(subdir_path, '.cache', 'stat.json')
+                try:
+                    with open(stat_cache_path) as fh:
+                        stat_cache = json.load(fh) or {}
+                except (EnvironmentError, JSONDecodeError):
+                    stat_cache = {}
+                stat_cache[fn] = {'mtime': int(mtime), 'size': size}
+                with open(stat_cache_path, 'w') as fh:
+                    json.dump(stat_cache, fh)
+
+                if fn in repodata.get('removed', []):
+                    return True
+                key = 'packages.conda' if fn.endswith(CONDA_PACKAGE_EXTENSION_V2) else 'packages'
+                repodata.setdefault('packages', {})
+                repodata.setdefault('packages.conda', {})
+                repodata[key][fn] = index_json
+                self._write_repodata(subdir, repodata, REPODATA_FROM_PKGS_JSON_FN)
+
+                patched_repodata, _ = self._patch_repodata(subdir, repodata)
+                self._write_repodata(subdir, patched_repodata, REPODATA_JSON_FN)
+                current_repodata = _build_current_repodata(subdir, patched_repodata, pins=None)
+                self._write_repodata(subdir, current_repodata,
+                                     json_filename="current_repodata.json")
+
+                channel_data = {}
+                channeldata_file = join(self.channel_root, 'channeldata.json')
+                if isfile(channeldata_file):
+                    with open(channeldata_file) as f:
+                        channel_data = json.load(f)
+                new_packages = {'packages': {}, 'packages.conda': {}}
+                if fn in patched_repodata[key]:
+                    new_packages[key][fn] = patched_repodata[key][fn]
+                self._update_channeldata(channel_data, new_packages, subdir)
+                self._write_channeldata_index_html(channel_data)
+                self._write_channeldata(channel_data)
+        return True
+
     def index_subdir(self, subdir, index_file=None, verbose=False, progress=False):
         subdir_path = join(self.channel_root, subdir)
         self._ensure_dirs(subdir)
@@ -96,10 +96,34 @@ class FilteredLoader(jinja2.BaseLoader):
         from .metadata import select_lines, ns_cfg
         contents, filename, uptodate = self._unfiltered_loader.get_source(environment,
                                                                           template)
-        return (select_lines(contents, ns_cfg(self.config),
+        return (select_lines(contents, partial(ns_cfg, self.config),
                              variants_in_place=bool(self.config.variant)), filename, uptodate)
 
 
+class MemoryBytecodeCache(jinja2.BytecodeCache):
+    """
+    Keeps compiled template code in memory for the life of the process.
+
+    Jinja2 keys buckets on the template name and checks them against a checksum of the
+    (selector-filtered) source, so a template is only recompiled when the text that
+    FilteredLoader hands back actually changes.
+    """
+
+    def __init__(self):
+        self._code = {}
+
+    def load_bytecode(self, bucket):
+        cached = self._code.get(bucket.key)
+        if cached and cached[0] == bucket.checksum:
+            bucket.code = cached[1]
+
+    def dump_bytecode(self, bucket):
+        self._code[bucket.key] = (bucket.checksum, bucket.code)
+
+    def clear(self):
+        self._code.clear()
+
+
 def load_setup_py_data(m, setup_file='setup.py', from_recipe_dir=False, recipe_dir=None,
                        permit_undefined_jinja=True):
     _setuptools_data = None
@@ -216,8 +240,8 @@ def pin_compatible(m, package_name, lower_bound=None, upper_bound=None, min_pin=
     compatibility = ""
 
     # optimization: this is slow (requires solver), so better to bypass it
-    # until the finalization stage.
-    if not bypass_env_check and not permit_undefined_jinja:
+    # until the finalization stage.  Without solving, only the name matters.
+    if not bypass_env_check and not permit_undefined_jinja and not m.config.render_without_solve:
         # this is the version split up into its component bits.
         # There are two cases considered here (so far):
         # 1. Good packages that follow semver style (if not philosophy).  For example, 1.2.3
@@ -1,18 +1,20 @@
 from __future__ import absolute_import, division, print_function
 
+import ast
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import contextlib
+from functools import partial
 import copy
 import hashlib
 import json
 import os
 from os.path import isfile, join
+import pickle
 import re
 import sys
 import time
 
-from bs4 import UnicodeDammit
-
 from .conda_interface import iteritems, PY3, text_type
 from .conda_interface import md5_file
 from .conda_interface import non_x86_linux_machines
@@ -39,6 +41,11 @@ try:
 except:
     loader = yaml.Loader
 
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
 on_win = (sys.platform == 'win32')
 
 # arches that don't follow exact names in the subdir need to be mapped here
@@ -66,8 +73,102 @@ numpy_compatible_x_re = re.compile(
     r'pin_\w+\([\'\"]numpy[\'\"].*((?<=x_pin=[\'\"])[x\.]*(?=[\'\"]))')
 numpy_compatible_re = re.compile(r"pin_\w+\([\'\"]numpy[\'\"]")
 
+# number of get_used_vars results remembered
+USED_VARS_CACHE_SIZE = 1024
+
+# variant keys that can change the outcome of get_used_vars without being named in the recipe:
+#    selectors derived from them (py, np, pl, lua), compiler() and cdt() jinja functions, and
+#    keys that steer conda-build itself
+_implicit_variant_keys_re = re.compile(r'^(?:python|numpy|perl|lua|r_base|target_platform|'
+                                       r'channel_targets|ignore_version|ignore_build_only_deps|'
+                                       r'pin_run_as_build|zip_keys|extend_keys|replacements|'
+                                       r'cdt_name|cdt_arch|\w+_compiler(?:_version)?)$')
+_token_re = re.compile(r'\w+')
+
+
+class UsedVarsCache(object):
+    """Bounded LRU cache of MetaData.get_used_vars results.  hits and misses are counted for
+    diagnostics; see info()."""
+
+    def __init__(self, maxsize=USED_VARS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data),
+                'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
 # used to avoid recomputing/rescanning recipe contents for used variables
-used_vars_cache = {}
+used_vars_cache = UsedVarsCache()
+
+# (sha1, tokens) of the files that make up a recipe, by their (path, mtime, size)
+_recipe_fingerprints = OrderedDict()
+
+
+def _recipe_fingerprint(recipe_dir, meta_path):
+    """A digest of meta.yaml and the scripts next to it, and the set of words they contain.
+    Returns (None, None) for metadata that doesn't come from a file."""
+    if not meta_path or not isfile(meta_path):
+        return None, None
+    paths = [meta_path] + sorted(join(recipe_dir, fn) for fn in os.listdir(recipe_dir)
+                                 if fn.endswith(('.sh', '.bat')))
+    stats = []
+    for path in paths:
+        st = os.stat(path)
+        stats.append((path, st.st_mtime, st.st_size))
+    stats = tuple(stats)
+    try:
+        return _recipe_fingerprints[stats]
+    except KeyError:
+        pass
+    h = hashlib.sha1()
+    tokens = set()
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        h.update(data)
+        tokens.update(_token_re.findall(data.decode('utf-8', 'replace').replace('-', '_')))
+    _lru_store(_recipe_fingerprints, stats, (h.hexdigest(), frozenset(tokens)))
+    return _recipe_fingerprints[stats]
+
+
+# jinja2 environments reused across renders of the same recipe, keyed by
+#    (recipe dir, CONDA_DEFAULT_ENV, permit_undefined_jinja).  Only the globals change
+#    between renders; compiled templates are kept by the environment's bytecode cache.
+#    The least recently used environments are dropped past JINJA_ENV_CACHE_SIZE.
+jinja_env_cache = OrderedDict()
+JINJA_ENV_CACHE_SIZE = 16
+# number of from_string templates remembered per environment
+JINJA_STRING_TEMPLATE_CACHE_SIZE = 32
 
 
 def ns_cfg(config):
@@ -159,65 +260,181 @@ def ns_cfg(config):
 sel_pat = re.compile(r'(.+?)\s*(#.*)?\[([^\[\]]+)\](?(2)[^\(\)]*)$')
 
 
-# this function extracts the variable name from a NameError exception, it has the form of:
-# "NameError: name 'var' is not defined", where var is the variable that is not defined. This gets
-#    returned
-def parseNameNotFound(error):
-    m = re.search('\'(.+?)\'', str(error))
-    if len(m.groups()) == 1:
-        return m.group(1)
-    else:
-        return ""
+def _decode_text(data):
+    """Recipe file contents as text, whatever their encoding"""
+    # bs4 is slow to import, so leave it until a recipe is actually read
+    from bs4 import UnicodeDammit
+    return UnicodeDammit(data).unicode_markup
 
 
-# We evaluate the selector and return True (keep this line) or False (drop this line)
-# If we encounter a NameError (unknown variable in selector), then we replace it by False and
-#     re-run the evaluation
-def eval_selector(selector_string, namespace, variants_in_place):
-    try:
-        # TODO: is there a way to do this without eval?  Eval allows arbitrary
-        #    code execution.
-        return eval(selector_string, namespace, {})
-    except NameError as e:
-        missing_var = parseNameNotFound(e)
-        if variants_in_place:
-            log = utils.get_logger(__name__)
-            log.debug("Treating unknown selector \'" + missing_var +
-                      "\' as if it was False.")
-        next_string = selector_string.replace(missing_var, "False")
-        return eval_selector(next_string, namespace, variants_in_place)
+# selectors are compiled once per expression and recipe texts are split into lines once per
+#    text.  Selected output is also remembered, keyed on the values of the names the
+#    selectors in that text actually read, so re-parsing a recipe for another variant that
+#    doesn't change any of those values costs a dict lookup.
+SELECTOR_CACHE_SIZE = 256
+_compiled_selectors = {}
+_selector_lines_cache = OrderedDict()
+_selected_text_cache = OrderedDict()
+# only namespace values of these types are safe to use in a cache key.  Anything else (os,
+#    environ, lists from the variant) can change under us or isn't hashable.
+_SELECTOR_KEY_TYPES = (bool, int, float, type(None)) + tuple(string_types)
 
 
-def select_lines(data, namespace, variants_in_place):
-    lines = []
+def _lru_store(cache, key, value):
+    cache[key] = value
+    while len(cache) > SELECTOR_CACHE_SIZE:
+        cache.popitem(last=False)
 
-    for i, line in enumerate(data.splitlines()):
-        line = line.rstrip()
 
-        trailing_quote = ""
-        if line and line[-1] in ("'", '"'):
-            trailing_quote = line[-1]
+def compile_selector(selector_string):
+    """Return (code object, names read by the selector), compiled once per expression"""
+    try:
+        return _compiled_selectors[selector_string]
+    except KeyError:
+        pass
+    expression = selector_string.strip()
+    tree = ast.parse(expression, mode='eval')
+    names = frozenset(node.id for node in ast.walk(tree)
+                      if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load))
+    compiled = compile(tree, '<selector>', 'eval'), names
+    _compiled_selectors[selector_string] = compiled
+    return compiled
 
-        if line.lstrip().startswith('#'):
-            # Don't bother with comment only lines
-            continue
-        m = sel_pat.match(line)
-        if m:
-            cond = m.group(3)
-            try:
-                if eval_selector(cond, namespace, variants_in_place):
-                    lines.append(m.group(1) + trailing_quote)
-            except Exception as e:
-                sys.exit('''\
+
+# We evaluate the selector and return True (keep this line) or False (drop this line)
+# Names that are not in the namespace (unknown variables in the selector) are treated as False.
+def eval_selector(selector_string, namespace, variants_in_place):
+    code, names = compile_selector(selector_string)
+    selector_namespace = {}
+    for name in names:
+        if name in namespace:
+            selector_namespace[name] = namespace[name]
+        elif not hasattr(builtins, name):
+            if variants_in_place:
+                log = utils.get_logger(__name__)
+                log.debug("Treating unknown selector \'" + name +
+                          "\' as if it was False.")
+            selector_namespace[name] = False
+    # TODO: is there a way to do this without eval?  Eval allows arbitrary
+    #    code execution.
+    return eval(code, selector_namespace, {})
+
+
+def _split_selector_lines(data):
+    """Split recipe text into (line index, line, text kept if selected, selector or None)"""
+    lines = _selector_lines_cache.pop(data, None)
+    if lines is None:
+        lines = []
+        for i, line in enumerate(data.splitlines()):
+            line = line.rstrip()
+
+            trailing_quote = ""
+            if line and line[-1] in ("'", '"'):
+                trailing_quote = line[-1]
+
+            if line.lstrip().startswith('#'):
+                # Don't bother with comment only lines
+                continue
+            m = sel_pat.match(line)
+            if m:
+                lines.append((i, line, m.group(1) + trailing_quote, m.group(3)))
+            else:
+                lines.append((i, line, line, None))
+        lines = tuple(lines)
+    _lru_store(_selector_lines_cache, data, lines)
+    return lines
+
+
+def _invalid_selector(i, line, e):
+    sys.exit('''\
 Error: Invalid selector in meta.yaml line %d:
 offending line:
 %s
 exception:
 %s
 ''' % (i + 1, line, str(e)))
-        else:
-            lines.append(line)
-    return '\n'.join(lines) + '\n'
+
+
+def select_lines(data, namespace, variants_in_place):
+    """Drop lines of recipe text whose selectors evaluate to False.
+
+    namespace may also be a callable returning the namespace, in which case it is only
+    called when the text actually contains selectors."""
+    lines = _split_selector_lines(data)
+
+    has_selectors = False
+    used_names = set()
+    for i, line, _, cond in lines:
+        if cond is not None:
+            has_selectors = True
+            try:
+                used_names.update(compile_selector(cond)[1])
+            except Exception as e:
+                _invalid_selector(i, line, e)
+    if not has_selectors:
+        return '\n'.join(text for _, _, text, _ in lines) + '\n'
+
+    if callable(namespace):
+        namespace = namespace()
+
+    key = [data, bool(variants_in_place)]
+    for name in sorted(used_names):
+        value = namespace.get(name)
+        if not isinstance(value, _SELECTOR_KEY_TYPES):
+            key = None
+            break
+        key.append((name, name in namespace, value))
+    key = tuple(key) if key else None
+    if key is not None and key in _selected_text_cache:
+        selected = _selected_text_cache.pop(key)
+        _selected_text_cache[key] = selected
+        return selected
+
+    selected = []
+    for i, line, text, cond in lines:
+        if cond is None:
+            selected.append(text)
+            continue
+        try:
+            if eval_selector(cond, namespace, variants_in_place):
+                selected.append(text)
+        except Exception as e:
+            _invalid_selector(i, line, e)
+    selected = '\n'.join(selected) + '\n'
+    if key is not None:
+        _lru_store(_selected_text_cache, key, selected)
+    return selected
+
+
+def _resolve_variant_metadata(args):
+    metadata, kwargs = args
+    try:
+        metadata.parse_until_resolved(**kwargs)
+    except SystemExit:
+        pass
+    return metadata
+
+
+def resolve_variant_metadata(metadata_list, jobs=1, **kwargs):
+    """Run parse_until_resolved on each of a list of (independent) MetaData objects.
+
+    With jobs > 1, the objects are sent to a process pool and the resolved copies that come
+    back replace them.  Results are always returned in input order, so callers see the same
+    thing as with serial rendering.  Metadata that can't be pickled is rendered serially.
+    SystemExit from unresolvable recipes is swallowed, as callers re-check for that later."""
+    jobs = min(int(jobs or 1), len(metadata_list))
+    if jobs > 1:
+        try:
+            pickle.dumps(metadata_list[0], pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            utils.get_logger(__name__).debug("Rendering variants serially; metadata is not "
+                                             "picklable: %s", e)
+            jobs = 1
+    work = [(m, kwargs) for m in metadata_list]
+    if jobs <= 1:
+        return [_resolve_variant_metadata(item) for item in work]
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(_resolve_variant_metadata, work))
 
 
 def yamlize(data):
@@ -336,7 +553,7 @@ def ensure_matching_hashes(output_metadata):
 
 
 def parse(data, config, path=None):
-    data = select_lines(data, ns_cfg(config), variants_in_place=bool(config.variant))
+    data = select_lines(data, partial(ns_cfg, config), variants_in_place=bool(config.variant))
     res = yamlize(data)
     # ensure the result is a dict
     if res is None:
@@ -820,7 +1037,7 @@ def _filter_recipe_text(text, extract_pattern=None):
 @memoized
 def read_meta_file(meta_path):
     with open(meta_path, 'rb') as f:
-        recipe_text = UnicodeDammit(f.read()).unicode_markup
+        recipe_text = _decode_text(f.read())
     if PY3 and hasattr(recipe_text, 'decode'):
         recipe_text = recipe_text.decode()
     return recipe_text
@@ -1537,33 +1754,53 @@ class MetaData(object):
             with open(self.meta_path) as fd:
                 return fd.read()
 
-        from conda_build.jinja_context import context_processor, UndefinedNeverFail, FilteredLoader
+        from conda_build.jinja_context import (context_processor, UndefinedNeverFail,
+                                               FilteredLoader, MemoryBytecodeCache)
 
         path, filename = os.path.split(self.meta_path)
-        loaders = [  # search relative to '<conda_root>/Lib/site-packages/conda_build/templates'
-                   jinja2.PackageLoader('conda_build'),
-                   # search relative to RECIPE_DIR
-                   jinja2.FileSystemLoader(path)
-                   ]
 
         # search relative to current conda environment directory
         conda_env_path = os.environ.get('CONDA_DEFAULT_ENV')  # path to current conda environment
         if conda_env_path and os.path.isdir(conda_env_path):
             conda_env_path = os.path.abspath(conda_env_path)
             conda_env_path = conda_env_path.replace('\\', '/')  # need unix-style path
-            env_loader = jinja2.FileSystemLoader(conda_env_path)
-            loaders.append(jinja2.PrefixLoader({'$CONDA_DEFAULT_ENV': env_loader}))
+        else:
+            conda_env_path = None
 
-        undefined_type = jinja2.StrictUndefined
         if permit_undefined_jinja:
             # The UndefinedNeverFail class keeps a global list of all undefined names
             # Clear any leftover names from the last parse.
             UndefinedNeverFail.all_undefined_names = []
-            undefined_type = UndefinedNeverFail
-
-        loader = FilteredLoader(jinja2.ChoiceLoader(loaders), config=self.config)
-        env = jinja2.Environment(loader=loader, undefined=undefined_type)
 
+        env_key = (path, conda_env_path, bool(permit_undefined_jinja))
+        cached_env = jinja_env_cache.pop(env_key, None)
+        if cached_env is None:
+            loaders = [  # search relative to '<conda_root>/Lib/site-packages/conda_build/templates'
+                       jinja2.PackageLoader('conda_build'),
+                       # search relative to RECIPE_DIR
+                       jinja2.FileSystemLoader(path)
+                       ]
+            if conda_env_path:
+                env_loader = jinja2.FileSystemLoader(conda_env_path)
+                loaders.append(jinja2.PrefixLoader({'$CONDA_DEFAULT_ENV': env_loader}))
+
+            undefined_type = UndefinedNeverFail if permit_undefined_jinja else jinja2.StrictUndefined
+            loader = FilteredLoader(jinja2.ChoiceLoader(loaders), config=self.config)
+            # the filtered source depends on the config, so jinja2's own name-based template
+            #    cache can't be used.  The bytecode cache checks a checksum of the filtered
+            #    source instead, so compiled code is only reused when the text matches.
+            env = jinja2.Environment(loader=loader, undefined=undefined_type, cache_size=0,
+                                     bytecode_cache=MemoryBytecodeCache())
+            cached_env = env, dict(env.globals), OrderedDict()
+        jinja_env_cache[env_key] = cached_env
+        while len(jinja_env_cache) > JINJA_ENV_CACHE_SIZE:
+            jinja_env_cache.popitem(last=False)
+        env, base_globals, string_templates = cached_env
+        env.loader.config = self.config
+
+        # templates share env.globals, so reset it in place rather than replacing it
+        env.globals.clear()
+        env.globals.update(base_globals)
         env.globals.update(ns_cfg(self.config))
         env.globals.update(environ.get_dict(m=self, skip_build_id=skip_build_id))
         env.globals.update({"CONDA_BUILD_STATE": "RENDER"})
@@ -1586,7 +1823,12 @@ class MetaData(object):
 
         try:
             if template_string:
-                template = env.from_string(template_string)
+                template = string_templates.pop(template_string, None)
+                if template is None:
+                    template = env.from_string(template_string)
+                string_templates[template_string] = template
+                while len(string_templates) > JINJA_STRING_TEMPLATE_CACHE_SIZE:
+                    string_templates.popitem(last=False)
             elif filename:
                 template = env.get_or_select_template(filename)
             else:
@@ -1640,7 +1882,7 @@ class MetaData(object):
         meta_text = ''
         if self.meta_path:
             with open(self.meta_path, 'rb') as f:
-                meta_text = UnicodeDammit(f.read()).unicode_markup
+                meta_text = _decode_text(f.read())
         return u"load_setup_py_data" in meta_text or u"load_setuptools" in meta_text
 
     @property
@@ -1648,7 +1890,7 @@ class MetaData(object):
         meta_text = ""
         if self.meta_path:
             with open(self.meta_path, 'rb') as f:
-                meta_text = UnicodeDammit(f.read()).unicode_markup
+                meta_text = _decode_text(f.read())
         return "load_file_regex" in meta_text
 
     @property
@@ -1660,7 +1902,7 @@ class MetaData(object):
         if not self.meta_path:
             return False
         with open(self.meta_path, 'rb') as f:
-            meta_text = UnicodeDammit(f.read()).unicode_markup
+            meta_text = _decode_text(f.read())
             matches = re.findall(r"{{.*}}", meta_text)
         return len(matches) > 0
 
@@ -1674,7 +1916,7 @@ class MetaData(object):
         # We would get here if we use Jinja2 templating, but specify source with path.
         if self.meta_path:
             with open(self.meta_path, 'rb') as f:
-                meta_text = UnicodeDammit(f.read()).unicode_markup
+                meta_text = _decode_text(f.read())
                 for _vcs in vcs_types:
                     matches = re.findall(r"{}_[^\.\s\'\"]+".format(_vcs.upper()), meta_text)
                     if len(matches) > 0 and _vcs != self.meta['package']['name']:
@@ -1693,7 +1935,7 @@ class MetaData(object):
             if os.path.isfile(recipe_file):
                 vcs_types = ["git", "svn", "hg"]
                 with open(self.meta_path, 'rb') as f:
-                    build_script = UnicodeDammit(f.read()).unicode_markup
+                    build_script = _decode_text(f.read())
                     for vcs in vcs_types:
                         # commands are assumed to have 3 parts:
                         #   1. the vcs command, optionally with an exe extension
@@ -1718,7 +1960,7 @@ class MetaData(object):
             recipe_text = output_yaml(self)
         recipe_text = _filter_recipe_text(recipe_text, extract_pattern)
         if apply_selectors:
-            recipe_text = select_lines(recipe_text, ns_cfg(self.config),
+            recipe_text = select_lines(recipe_text, partial(ns_cfg, self.config),
                                     variants_in_place=bool(self.config.variant))
         return recipe_text.rstrip()
 
@@ -1823,9 +2065,13 @@ class MetaData(object):
 
     def copy(self):
         new = copy.copy(self)
+        # Config.copy already forks the variant, and meta sections are shared copy-on-write
+        #    (see CopyOnWriteDict.fork)
         new.config = self.config.copy()
-        new.config.variant = copy.deepcopy(self.config.variant)
-        new.meta = copy.deepcopy(self.meta)
+        if type(self.meta) in (dict, utils.CopyOnWriteDict):
+            new.meta = utils.CopyOnWriteDict.fork(self.meta)
+        else:
+            new.meta = copy.deepcopy(self.meta)
         new.type = getattr(self, 'type', 'conda_v2' if self.config.conda_pkg_format == "2" else
                            'conda')
         return new
@@ -2002,28 +2248,10 @@ class MetaData(object):
         out_metadata.meta['extra'] = extra
 
     def get_reduced_variant_set(self, used_variables):
-        # reduce variable space to limit work we need to do
+        # reduce variable space to limit work we need to do: keys that aren't used (and aren't
+        #    zipped with one that is) keep only one of their values
         full_collapsed_variants = variants.list_of_dicts_to_dict_of_lists(self.config.variants)
-        reduced_collapsed_variants = full_collapsed_variants.copy()
-        reduce_keys = set(self.config.variants[0].keys()) - set(used_variables)
-
-        zip_key_groups = self.config.variant.get('zip_keys', [])
-        zip_key_groups = ([zip_key_groups] if zip_key_groups and
-                          isinstance(zip_key_groups[0], string_types) else zip_key_groups)
-        used_zip_key_groups = [group for group in zip_key_groups if any(
-            set(group) & set(used_variables))]
-
-        extend_keys = full_collapsed_variants.get('extend_keys', [])
-        reduce_keys = [key for key in reduce_keys if not any(key in group for group in
-                                                used_zip_key_groups) and key not in extend_keys]
-        for key in reduce_keys:
-            values = full_collapsed_variants.get(key)
-            if values is not None and len(values) and not hasattr(values, 'keys') and key != 'zip_keys':
-                # save only one element from this key
-                reduced_collapsed_variants[key] = utils.ensure_list(next(iter(values)))
-
-        out = variants.dict_of_lists_to_list_of_dicts(reduced_collapsed_variants)
-        return out
+        return variants.VariantMatrix(full_collapsed_variants).project(used_variables).to_list()
 
     def get_output_metadata_set(self, permit_undefined_jinja=False,
                                 permit_unsatisfiable_variants=False,
@@ -2039,18 +2267,30 @@ class MetaData(object):
             used_variables = self.get_used_loop_vars(force_global=True)
             top_loop = self.get_reduced_variant_set(used_variables) or self.config.variants[:1]
 
+            ref_metadatas = []
             for variant in (top_loop if (hasattr(self.config, 'variants') and self.config.variants) else [self.config.variant]):
                 ref_metadata = self.copy()
                 ref_metadata.config.variant = variant
-                if ref_metadata.needs_source_for_render and self.variant_in_source:
+                ref_metadatas.append(ref_metadata)
+
+            if any(m.needs_source_for_render for m in ref_metadatas) and self.variant_in_source:
+                # every variant shares the work dir, so each one has to be provisioned and
+                #    parsed before the next one replaces the source.
+                for ref_metadata in ref_metadatas:
                     ref_metadata.parse_again()
                     utils.rm_rf(ref_metadata.config.work_dir)
                     provide(ref_metadata)
                     ref_metadata.parse_again()
-                try:
-                    ref_metadata.parse_until_resolved(allow_no_other_outputs=True, bypass_env_check=True)
-                except SystemExit:
-                    pass
+                    resolve_variant_metadata([ref_metadata], allow_no_other_outputs=True,
+                                             bypass_env_check=True)
+            else:
+                ref_metadatas = resolve_variant_metadata(ref_metadatas,
+                                                         jobs=self.config.render_jobs,
+                                                         allow_no_other_outputs=True,
+                                                         bypass_env_check=True)
+
+            for ref_metadata in ref_metadatas:
+                variant = ref_metadata.config.variant
                 outputs = get_output_dicts_from_metadata(ref_metadata)
 
                 try:
@@ -2186,23 +2426,28 @@ class MetaData(object):
     def force_use_keys(self):
         return ensure_list(self.get_value('build/force_use_keys'))
 
+    def _used_vars_cache_key(self, force_top_level, force_global):
+        """What get_used_vars depends on: the recipe files, the names of all variant keys (any
+        of them may be used) and the values of just the keys that can affect rendering - those
+        named somewhere in the recipe, plus a few that act implicitly."""
+        variant = self.config.variant
+        digest, tokens = _recipe_fingerprint(self.path, self.meta_path)
+        if tokens is None:
+            relevant = variant
+        else:
+            # only read the values that matter: reading a value out of a copy-on-write
+            #    variant copies it
+            relevant = {k: variant[k] for k in variant
+                        if k.replace('-', '_') in tokens or _implicit_variant_keys_re.match(k)}
+        return (self.name(), self.path, force_top_level, force_global, self.config.subdir, digest,
+                tuple(sorted(variant)), json.dumps(relevant, sort_keys=True, default=repr))
+
     def get_used_vars(self, force_top_level=False, force_global=False):
-        global used_vars_cache
-        recipe_dir = self.path
-
-        # `HashableDict` does not handle lists of other dictionaries correctly. Also it
-        # is constructed inplace, taking references to sub-elements of the input dict
-        # and thus corrupting it. Also, this was being called in 3 places in this function
-        # so caching it is probably a good thing.
-        hashed_variants = HashableDict(copy.deepcopy(self.config.variant))
         if hasattr(self.config, 'used_vars'):
-            used_vars = self.config.used_vars
-        elif (self.name(), recipe_dir, force_top_level, force_global, self.config.subdir,
-              hashed_variants) in used_vars_cache:
-            used_vars = used_vars_cache[(self.name(), recipe_dir,
-                                         force_top_level, force_global, self.config.subdir,
-                                         hashed_variants)]
-        else:
+            return self.config.used_vars
+        cache_key = self._used_vars_cache_key(force_top_level, force_global)
+        used_vars = used_vars_cache.get(cache_key)
+        if used_vars is None:
             meta_yaml_reqs = self._get_used_vars_meta_yaml(force_top_level=force_top_level,
                                                            force_global=force_global)
             is_output = 'package:' not in self.get_recipe_text()
@@ -2223,8 +2468,7 @@ class MetaData(object):
             if self.force_use_keys or self.force_ignore_keys:
                 used_vars = (used_vars - set(self.force_ignore_keys)) | set(self.force_use_keys)
 
-            used_vars_cache[(self.name(), recipe_dir, force_top_level, force_global,
-                             self.config.subdir, hashed_variants)] = used_vars
+            used_vars_cache.put(cache_key, used_vars)
         return used_vars
 
     def _get_used_vars_meta_yaml_helper(self, force_top_level=False, force_global=False,
@@ -9,27 +9,68 @@ from conda_build.conda_interface import root_dir
 from glob2 import glob
 
 
+# find_executable results: {(executable, prefix, all_matches, PATH): (bin dir mtimes, result)}
+_executable_cache = {}
+
+
+def _bin_dirs(prefix):
+    if sys.platform == 'win32':
+        return [join(prefix, 'Scripts'),
+                join(prefix, 'Library\\mingw-w64\\bin'),
+                join(prefix, 'Library\\usr\\bin'),
+                join(prefix, 'Library\\bin'), ]
+    return [join(prefix, 'bin'), ]
+
+
+def _bin_dirs_state(prefix):
+    """mtimes of the prefix's (and the root env's) bin folders, which change when executables
+    are added to or removed from them"""
+    state = []
+    for dir_path in (_bin_dirs(prefix) if prefix else []) + _bin_dirs(root_dir):
+        try:
+            state.append(os.stat(dir_path).st_mtime)
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
 def find_executable(executable, prefix=None, all_matches=False):
+    """Look for executable in prefix, the root env and on PATH.  Results are remembered for
+    the same PATH until something is added to or removed from the prefix's bin folders."""
+    key = (executable, prefix, all_matches, os.environ['PATH'])
+    state = _bin_dirs_state(prefix)
+    cached = _executable_cache.get(key)
+    if cached and cached[0] == state and (isinstance(cached[1], list) or isfile(cached[1])):
+        _set_dir_paths(prefix)
+        result = cached[1]
+    else:
+        result = _find_executable(executable, prefix, all_matches)
+        _executable_cache[key] = (state, result)
+    return list(result) if isinstance(result, list) else result
+
+
+def prefetch_executables(executables, prefix=None, all_matches=False):
+    """Look up several executables at once (e.g. before post-processing every file of a
+    package), so that later find_executable calls for them are answered from the cache."""
+    return {executable: find_executable(executable, prefix, all_matches)
+            for executable in executables}
+
+
+def _set_dir_paths(prefix):
     # dir_paths is referenced as a module-level variable
     #  in other code
     global dir_paths
-    result = None
-    if sys.platform == 'win32':
-        dir_paths = [join(root_dir, 'Scripts'),
-                     join(root_dir, 'Library\\mingw-w64\\bin'),
-                     join(root_dir, 'Library\\usr\\bin'),
-                     join(root_dir, 'Library\\bin'), ]
-        if prefix:
-            dir_paths[0:0] = [join(prefix, 'Scripts'),
-                              join(prefix, 'Library\\mingw-w64\\bin'),
-                              join(prefix, 'Library\\usr\\bin'),
-                              join(prefix, 'Library\\bin'), ]
-    else:
-        dir_paths = [join(root_dir, 'bin'), ]
-        if prefix:
-            dir_paths.insert(0, join(prefix, 'bin'))
+    dir_paths = _bin_dirs(root_dir)
+    if prefix:
+        dir_paths[0:0] = _bin_dirs(prefix)
 
     dir_paths.extend(os.environ['PATH'].split(os.pathsep))
+    return dir_paths
+
+
+def _find_executable(executable, prefix=None, all_matches=False):
+    result = None
+    dir_paths = _set_dir_paths(prefix)
     if sys.platform == 'win32':
         exts = ('.exe', '.bat', '')
     else:
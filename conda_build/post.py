@@ -1307,6 +1307,15 @@ def post_build(m, files, build_python, host_prefix=None, is_already_linked=False
         check_symlinks(files, host_prefix, m.config.croot)
         prefix_files = utils.prefix_files(host_prefix)
 
+        # the relocation tools are looked up for every file below; do the lookups up front
+        if m.config.target_subdir.startswith('linux-'):
+            external.prefetch_executables(('patchelf', ), host_prefix)
+        elif m.config.target_subdir.startswith('osx-'):
+            tools_prefix = (m.config.build_prefix if exists(m.config.build_prefix) else
+                            host_prefix)
+            external.prefetch_executables(('*otool', 'otool', '*install_name_tool',
+                                           'install_name_tool'), tools_prefix, all_matches=True)
+
         for f in files:
             if f.startswith('bin/'):
                 fix_shebang(f, prefix=host_prefix, build_python=build_python,
@@ -7,10 +7,12 @@
 from __future__ import absolute_import, division, print_function
 
 from collections import OrderedDict, defaultdict
+import hashlib
 from locale import getpreferredencoding
 import json
 import os
 from os.path import isdir, isfile, abspath
+import pickle
 import random
 import re
 import shutil
@@ -29,10 +31,15 @@ from .conda_interface import pkgs_dirs
 from .conda_interface import conda_43
 from .conda_interface import specs_from_url
 from .conda_interface import memoized
+from .conda_interface import MatchSpec, VersionOrder
+from .conda_interface import cache_fn_url, create_cache_dir, get_conda_channel, get_rc_urls
+from .conda_interface import subdir as conda_subdir
+from .conda_interface import url_path
 from .utils import CONDA_PACKAGE_EXTENSION_V1, CONDA_PACKAGE_EXTENSION_V2
 
 from conda_build import exceptions, utils, environ
-from conda_build.metadata import MetaData, combine_top_level_metadata_with_output
+from conda_build.metadata import (MetaData, combine_top_level_metadata_with_output,
+                                   resolve_variant_metadata)
 import conda_build.source as source
 from conda_build.variants import (get_package_variants, list_of_dicts_to_dict_of_lists,
                                   filter_by_key_value)
@@ -113,9 +120,7 @@ def _categorize_deps(m, specs, exclude_pattern, variant):
     return subpackages, dependencies, pass_through_deps
 
 
-def get_env_dependencies(m, env, variant, exclude_pattern=None,
-                         permit_unsatisfiable_variants=False,
-                         merge_build_host_on_same_platform=True):
+def _env_dependency_specs(m, env, variant, exclude_pattern=None):
     specs = m.get_depends_top_and_out(env)
     # replace x.x with our variant's numpy version, or else conda tries to literally go get x.x
     if env in ('build', 'host'):
@@ -128,7 +133,22 @@ def get_env_dependencies(m, env, variant, exclude_pattern=None,
                 no_xx_specs.append(spec)
         specs = no_xx_specs
 
-    subpackages, dependencies, pass_through_deps = _categorize_deps(m, specs, exclude_pattern, variant)
+    return _categorize_deps(m, specs, exclude_pattern, variant)
+
+
+def get_unsolved_env_dependencies(m, env, variant, exclude_pattern=None):
+    """The specs that get_env_dependencies would solve for, as they are"""
+    subpackages, dependencies, pass_through_deps = _env_dependency_specs(m, env, variant,
+                                                                         exclude_pattern)
+    return utils.ensure_list((sorted(set(dependencies)) + subpackages + pass_through_deps) or
+                             m.meta.get('requirements', {}).get(env, []))
+
+
+def get_env_dependencies(m, env, variant, exclude_pattern=None,
+                         permit_unsatisfiable_variants=False,
+                         merge_build_host_on_same_platform=True):
+    subpackages, dependencies, pass_through_deps = _env_dependency_specs(m, env, variant,
+                                                                         exclude_pattern)
 
     dependencies = set(dependencies)
     unsat = None
@@ -250,8 +270,11 @@ def _read_specs_from_package(pkg_loc, pkg_dist):
                 specs = json.load(f)
     if not specs and pkg_loc and os.path.isfile(pkg_loc):
         # switching to json for consistency in conda-build 4
-        specs_yaml = utils.package_has_file(pkg_loc, 'info/run_exports.yaml')
-        specs_json = utils.package_has_file(pkg_loc, 'info/run_exports.json')
+        contents = utils.package_has_files(pkg_loc, ('info/run_exports.yaml',
+                                                     'info/run_exports.json',
+                                                     'info/run_exports'))
+        specs_yaml = contents['info/run_exports.yaml']
+        specs_json = contents['info/run_exports.json']
         if hasattr(specs_json, "decode"):
             specs_json = specs_json.decode("utf-8")
 
@@ -260,7 +283,7 @@ def _read_specs_from_package(pkg_loc, pkg_dist):
         elif specs_yaml:
             specs = yaml.safe_load(specs_yaml)
         else:
-            legacy_specs = utils.package_has_file(pkg_loc, 'info/run_exports')
+            legacy_specs = contents['info/run_exports']
             # exclude packages pinning themselves (makes no sense)
             if legacy_specs:
                 weak_specs = set()
@@ -338,6 +361,86 @@ def execute_download_actions(m, actions, env, package_subset=None, require_files
     return pkg_files
 
 
+class RunExportsIndex(object):
+    """run_exports of linked packages, looked up for a whole environment at once.
+
+    Sources, cheapest first: channeldata (if use_channeldata is set), the .cache/run_exports
+    entries that conda_build.index keeps for the local channel, packages already extracted in
+    the package caches and, for whatever is left, the packages themselves - all downloaded with
+    a single set of download actions, and each read with a single extraction.  Results are
+    kept for the life of the process, keyed by url and md5, since packages in the local
+    channel can be rebuilt under the same url."""
+
+    def __init__(self):
+        self._run_exports = {}
+
+    @staticmethod
+    def _key(pkg):
+        return getattr(pkg, 'url', None) or str(pkg), getattr(pkg, 'md5', None)
+
+    def _from_channeldata(self, m, pkg):
+        channeldata = utils.download_channeldata(pkg.channel)
+        # only use channeldata if it exists and contains a packages key, otherwise use
+        #    run_exports from the packages themselves
+        if 'packages' in channeldata:
+            pkg_data = channeldata['packages'].get(pkg.name, {})
+            return pkg_data.get('run_exports', {}).get(pkg.version, {})
+
+    def _from_local_channel(self, m, pkg):
+        fn, subdir = getattr(pkg, 'fn', None), getattr(pkg, 'subdir', None)
+        if not fn or not subdir:
+            return None
+        for folder in sorted({m.config.output_folder, m.config.croot}):
+            cache_path = os.path.join(folder, subdir, '.cache')
+            run_exports_path = os.path.join(cache_path, 'run_exports', fn + '.json')
+            index_path = os.path.join(cache_path, 'index', fn + '.json')
+            if not (isfile(run_exports_path) and isfile(index_path)):
+                continue
+            # the same file name in another channel is not necessarily the same package
+            with open(index_path) as f:
+                md5 = json.load(f).get('md5')
+            if md5 and getattr(pkg, 'md5', None) and md5 != pkg.md5:
+                continue
+            with open(run_exports_path) as f:
+                return json.load(f)
+
+    def _from_pkgs_dirs(self, m, pkg):
+        for pkgs_dir in pkgs_dirs + list(m.config.bldpkgs_dirs):
+            pkg_dir = os.path.join(pkgs_dir, pkg.dist_name)
+            if isdir(os.path.join(pkg_dir, 'info')):
+                return _read_specs_from_package(pkg_dir, pkg.dist_name)
+
+    def get(self, m, actions, env, packages):
+        """Return {package: run_exports} for packages, some of the LINK entries of actions"""
+        result = {}
+        missing = []
+        lookups = [self._from_local_channel, self._from_pkgs_dirs]
+        if m.config.use_channeldata:
+            lookups.insert(0, self._from_channeldata)
+        for pkg in packages:
+            key = self._key(pkg)
+            if key not in self._run_exports:
+                for lookup in lookups:
+                    run_exports = lookup(m, pkg)
+                    if run_exports is not None:
+                        self._run_exports[key] = run_exports
+                        break
+                else:
+                    missing.append(pkg)
+                    continue
+            result[pkg] = self._run_exports[key]
+        if missing:
+            pkg_files = execute_download_actions(m, actions, env=env, package_subset=missing)
+            for pkg in missing:
+                loc, dist = pkg_files[pkg]
+                result[pkg] = self._run_exports[self._key(pkg)] = _read_specs_from_package(loc,
+                                                                                           dist)
+        return result
+
+
+run_exports_index = RunExportsIndex()
+
+
 def get_upstream_pins(m, actions, env):
     """Download packages from specs, then inspect each downloaded package for additional
     downstream dependency specs.  Return these additional specs."""
@@ -349,28 +452,119 @@ def get_upstream_pins(m, actions, env):
 
     ignore_pkgs_list = utils.ensure_list(m.get_value('build/ignore_run_exports_from'))
     ignore_list = utils.ensure_list(m.get_value('build/ignore_run_exports'))
+    linked_packages = [pkg for pkg in linked_packages
+                       if not any(pkg.name in req.split(' ')[0] for req in ignore_pkgs_list)]
+    all_run_exports = run_exports_index.get(m, actions, env, linked_packages)
     additional_specs = {}
     for pkg in linked_packages:
-        if any(pkg.name in req.split(' ')[0] for req in ignore_pkgs_list):
-            continue
-        run_exports = None
-        if m.config.use_channeldata:
-            channeldata = utils.download_channeldata(pkg.channel)
-            # only use channeldata if requested, channeldata exists and contains
-            # a packages key, otherwise use run_exports from the packages themselves
-            if 'packages' in channeldata:
-                pkg_data = channeldata['packages'].get(pkg.name, {})
-                run_exports = pkg_data.get('run_exports', {}).get(pkg.version, {})
-        if run_exports is None:
-            loc, dist = execute_download_actions(m, actions, env=env, package_subset=pkg)[pkg]
-            run_exports = _read_specs_from_package(loc, dist)
-        specs = _filter_run_exports(run_exports, ignore_list)
+        specs = _filter_run_exports(all_run_exports[pkg], ignore_list)
         if specs:
             additional_specs = utils.merge_dicts_of_lists(additional_specs, specs)
     return additional_specs
 
 
-def _read_upstream_pin_files(m, env, permit_unsatisfiable_variants, exclude_pattern):
+@memoized
+def _list_pkgs_dir(pkgs_dir, mtime):
+    """name -> [(version, dist, path)] for the packages in a package cache.  mtime is only
+    part of the memoization key, so that the listing is redone when packages are added."""
+    packages = defaultdict(list)
+    for entry in os.listdir(pkgs_dir):
+        path = os.path.join(pkgs_dir, entry)
+        if entry.endswith(CONDA_PACKAGE_EXTENSION_V1):
+            dist = entry[:-len(CONDA_PACKAGE_EXTENSION_V1)]
+        elif isdir(os.path.join(path, 'info')):
+            dist = entry
+        else:
+            continue
+        parts = dist.rsplit('-', 2)
+        if len(parts) == 3:
+            packages[parts[0]].append((parts[1], dist, path))
+    return dict(packages)
+
+
+def _run_export_names(run_exports):
+    return sorted((kind, sorted(set(spec.split()[0] for spec in utils.ensure_list(specs))))
+                  for kind, specs in run_exports.items() if specs)
+
+
+def get_cached_run_exports(m, spec):
+    """Find the run_exports of the package that a solve for spec would pick, without solving.
+
+    Looks at the packages in the package caches, the local channel's channeldata and, if
+    use_channeldata is set, the channeldata of the configured channels.  All of the builds that
+    match spec have to agree on the names of the packages that they export, since those are
+    what end up in file names (py/np build string prefixes and the dependency hash); the
+    versions can differ.  Raises RunExportsUnavailableError otherwise."""
+    ms = MatchSpec(spec)
+    version_spec = ms.get('version')
+    candidates = []
+
+    channeldata = [utils.download_channeldata(channel) for channel in m.config.channel_urls
+                   if m.config.use_channeldata]
+    local_channeldata = os.path.join(m.config.output_folder, 'channeldata.json')
+    if isfile(local_channeldata):
+        with open(local_channeldata) as f:
+            channeldata.append(json.load(f))
+    for data in channeldata:
+        pkg_data = data.get('packages', {}).get(ms.name, {})
+        for version, run_exports in pkg_data.get('run_exports', {}).items():
+            candidates.append((version, run_exports or {}))
+
+    for pkgs_dir in pkgs_dirs + list(m.config.bldpkgs_dirs):
+        if not isdir(pkgs_dir):
+            continue
+        for version, dist, path in _list_pkgs_dir(pkgs_dir, os.stat(pkgs_dir).st_mtime).get(
+                ms.name, []):
+            candidates.append((version, _read_specs_from_package(path, dist)))
+
+    candidates = [(version, run_exports) for version, run_exports in candidates
+                  if not version_spec or version_spec.match(version)]
+    if not candidates:
+        raise exceptions.RunExportsUnavailableError(spec, "no matching package is available "
+                                                    "locally")
+    if len(set(str(_run_export_names(run_exports)) for _, run_exports in candidates)) > 1:
+        raise exceptions.RunExportsUnavailableError(spec, "matching packages export different "
+                                                    "packages")
+    return max(candidates, key=lambda candidate: VersionOrder(candidate[0]))[1]
+
+
+def get_upstream_pins_without_solve(m, env, specs):
+    """Like get_upstream_pins, but with the run_exports of whatever is available locally
+    instead of those of the packages a solve picks for specs."""
+    env_specs = m.meta.get('requirements', {}).get(env, [])
+    explicit_specs = [req.split(' ')[0] for req in env_specs] if env_specs else []
+    ignore_pkgs_list = utils.ensure_list(m.get_value('build/ignore_run_exports_from'))
+    ignore_list = utils.ensure_list(m.get_value('build/ignore_run_exports'))
+    outputs = {out.get('name'): out for out in m.get_section('outputs')}
+
+    # the most specific spec for each package
+    by_name = {}
+    for spec in specs:
+        name = spec.split()[0]
+        if len(spec) > len(by_name.get(name, '')):
+            by_name[name] = spec
+
+    additional_specs = {}
+    for name, spec in sorted(by_name.items()):
+        if name not in explicit_specs or any(name in req.split(' ')[0]
+                                             for req in ignore_pkgs_list):
+            continue
+        if name in outputs:
+            # the run_exports of another output of this recipe are only known once it's built
+            if outputs[name].get('build', {}).get('run_exports'):
+                raise exceptions.RunExportsUnavailableError(spec, "it is an output of this "
+                                                            "recipe")
+            continue
+        exported = _filter_run_exports(get_cached_run_exports(m, spec), ignore_list)
+        if exported:
+            additional_specs = utils.merge_dicts_of_lists(additional_specs, exported)
+    return additional_specs
+
+
+def _read_upstream_pin_files(m, env, permit_unsatisfiable_variants, exclude_pattern, solve=True):
+    if not solve:
+        deps = get_unsolved_env_dependencies(m, env, m.config.variant, exclude_pattern)
+        return deps, None, get_upstream_pins_without_solve(m, env, deps)
     deps, actions, unsat = get_env_dependencies(m, env, m.config.variant,
                                 exclude_pattern,
                                 permit_unsatisfiable_variants=permit_unsatisfiable_variants)
@@ -380,12 +574,12 @@ def _read_upstream_pin_files(m, env, permit_unsatisfiable_variants, exclude_patt
     return list(set(deps)) or m.meta.get('requirements', {}).get(env, []), unsat, extra_run_specs
 
 
-def add_upstream_pins(m, permit_unsatisfiable_variants, exclude_pattern):
+def add_upstream_pins(m, permit_unsatisfiable_variants, exclude_pattern, solve=True):
     """Applies run_exports from any build deps to host and run sections"""
     # if we have host deps, they're more important than the build deps.
     requirements = m.meta.get('requirements', {})
     build_deps, build_unsat, extra_run_specs_from_build = _read_upstream_pin_files(m, 'build',
-                                                    permit_unsatisfiable_variants, exclude_pattern)
+                                            permit_unsatisfiable_variants, exclude_pattern, solve)
 
     # is there a 'host' section?
     if m.is_cross:
@@ -407,7 +601,7 @@ def add_upstream_pins(m, permit_unsatisfiable_variants, exclude_pattern):
         host_reqs.extend(extra_run_specs_from_build.get('strong', []))
 
         host_deps, host_unsat, extra_run_specs_from_host = _read_upstream_pin_files(m, 'host',
-                                                    permit_unsatisfiable_variants, exclude_pattern)
+                                            permit_unsatisfiable_variants, exclude_pattern, solve)
         if m.noarch or m.noarch_python:
             extra_run_specs = set(extra_run_specs_from_host.get('noarch', []))
             extra_run_constrained_specs = set([])
@@ -497,6 +691,16 @@ def _simplify_to_exact_constraints(metadata):
 
 def finalize_metadata(m, parent_metadata=None, permit_unsatisfiable_variants=False):
     """Fully render a recipe.  Fill in versions for build/host dependencies."""
+    if m.config.render_without_solve and not m.skip():
+        try:
+            return _finalize_metadata(m.copy(), parent_metadata, permit_unsatisfiable_variants,
+                                      solve=False)
+        except exceptions.RunExportsUnavailableError as e:
+            utils.get_logger(__name__).debug("Solving to finalize {}: {}".format(m.name(), e))
+    return _finalize_metadata(m, parent_metadata, permit_unsatisfiable_variants)
+
+
+def _finalize_metadata(m, parent_metadata=None, permit_unsatisfiable_variants=False, solve=True):
     if not parent_metadata:
         parent_metadata = m
     if m.skip():
@@ -546,7 +750,7 @@ def finalize_metadata(m, parent_metadata=None, permit_unsatisfiable_variants=Fal
         m = parent_metadata.get_output_metadata(m.get_rendered_output(m.name()))
         build_unsat, host_unsat = add_upstream_pins(m,
                                                     permit_unsatisfiable_variants,
-                                                    exclude_pattern)
+                                                    exclude_pattern, solve)
         # getting this AFTER add_upstream_pins is important, because that function adds deps
         #     to the metadata.
         requirements = m.meta.get('requirements', {})
@@ -566,10 +770,14 @@ def finalize_metadata(m, parent_metadata=None, permit_unsatisfiable_variants=Fal
             build_reqs.append('python {}'.format(m.config.variant['python']))
             m.meta['requirements'][pinning_env] = build_reqs
 
-        full_build_deps, _, _ = get_env_dependencies(m, pinning_env,
+        if solve:
+            full_build_deps, _, _ = get_env_dependencies(m, pinning_env,
                                         m.config.variant,
                                         exclude_pattern=exclude_pattern,
                                         permit_unsatisfiable_variants=permit_unsatisfiable_variants)
+        else:
+            full_build_deps = get_unsolved_env_dependencies(m, pinning_env, m.config.variant,
+                                                            exclude_pattern=exclude_pattern)
         full_build_dep_versions = {dep.split()[0]: " ".join(dep.split()[1:])
                                    for dep in full_build_deps}
 
@@ -720,6 +928,7 @@ def distribute_variants(metadata, variants, permit_unsatisfiable_variants=False,
     used_variables = metadata.get_used_loop_vars(force_global=False)
     top_loop = metadata.get_reduced_variant_set(used_variables)
 
+    variant_metadata = []
     for variant in top_loop:
         from conda_build.build import get_all_replacements
         get_all_replacements(variant)
@@ -753,18 +962,25 @@ def distribute_variants(metadata, variants, permit_unsatisfiable_variants=False,
         mv.config.variants = numpy_pinned_variants
 
         mv.config.squished_variants = list_of_dicts_to_dict_of_lists(mv.config.variants)
+        variant_metadata.append(mv)
+
+    if any(mv.needs_source_for_render and mv.variant_in_source for mv in variant_metadata):
+        # source is provided into the shared work dir, so these have to go one at a time
+        for mv in variant_metadata:
+            if mv.needs_source_for_render and mv.variant_in_source:
+                mv.parse_again()
+                utils.rm_rf(mv.config.work_dir)
+                source.provide(mv)
+                mv.parse_again()
+            resolve_variant_metadata([mv], allow_no_other_outputs=allow_no_other_outputs,
+                                     bypass_env_check=bypass_env_check)
+    else:
+        variant_metadata = resolve_variant_metadata(variant_metadata,
+                                                    jobs=metadata.config.render_jobs,
+                                                    allow_no_other_outputs=allow_no_other_outputs,
+                                                    bypass_env_check=bypass_env_check)
 
-        if mv.needs_source_for_render and mv.variant_in_source:
-            mv.parse_again()
-            utils.rm_rf(mv.config.work_dir)
-            source.provide(mv)
-            mv.parse_again()
-
-        try:
-            mv.parse_until_resolved(allow_no_other_outputs=allow_no_other_outputs,
-                                    bypass_env_check=bypass_env_check)
-        except SystemExit:
-            pass
+    for mv in variant_metadata:
         need_source_download = (not mv.needs_source_for_render or not mv.source_provided)
 
         rendered_metadata[(mv.dist(),
@@ -785,8 +1001,7 @@ def expand_outputs(metadata_tuples):
     for (_m, download, reparse) in metadata_tuples:
         from conda_build.build import get_all_replacements
         get_all_replacements(_m.config)
-        from copy import deepcopy
-        for (output_dict, m) in deepcopy(_m).get_output_metadata_set(permit_unsatisfiable_variants=False):
+        for (output_dict, m) in _m.copy().get_output_metadata_set(permit_unsatisfiable_variants=False):
             get_all_replacements(m.config)
             expanded_outputs[m.dist()] = (output_dict, m)
     return list(expanded_outputs.values())
@@ -866,6 +1081,119 @@ def render_recipe(recipe_path, config, no_download_source=False, variants=None,
     return rendered_metadata
 
 
+# Config attributes that can change what api.render returns.  Anything that only matters at
+#    build time is left out so it doesn't needlessly invalidate the render cache.
+RENDER_CACHE_CONFIG_FIELDS = ('host_subdir', 'build_subdir', 'variant', 'channel_urls',
+                              'override_channels', 'filename_hashing', 'hash_length',
+                              'append_sections_file', 'clobber_sections_file', 'bootstrap',
+                              'exclusive_config_files', 'variant_config_files',
+                              'ignore_system_variants', 'noarch_python_build_age',
+                              'conda_pkg_format', 'croot', 'output_folder', 'merge_build_host',
+                              'trim_skip', 'use_channeldata', 'render_without_solve',
+                              'build_id_pat', 'set_build_id', 'no_download_source')
+
+
+def _stat_fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime]
+
+
+def _repodata_fingerprint(config):
+    """Cheap stand-in for the contents of the channels that rendering solves against: the state
+    of the local channel's repodata.json and of conda's cached repodata for every other channel.
+    Neither the index nor the repodata is loaded, so a cache hit stays fast."""
+    output_folder = config.output_folder or os.path.dirname(config.bldpkgs_dir)
+    local_url = url_path(output_folder)
+    # channel arguments, then condarc channels.  The local channel is looked at directly.
+    urls = [url for url in list(utils.ensure_list(config.channel_urls)) + get_rc_urls()
+            if url not in ('local', local_url)]
+    cache_dir = create_cache_dir()
+    state = []
+    for subdir in sorted({config.host_subdir, config.build_subdir}):
+        subdirs = {subdir if subdir != 'noarch' else conda_subdir, 'noarch'}
+        for folder in sorted(subdirs):
+            state.append([subdir, local_url, folder, _stat_fingerprint(
+                os.path.join(output_folder, folder, 'repodata.json'))])
+        for url in urls:
+            for subdir_url in get_conda_channel(url).urls(with_credentials=True,
+                                                          subdirs=sorted(subdirs)):
+                state.append([subdir, subdir_url, _stat_fingerprint(
+                    os.path.join(cache_dir, cache_fn_url(subdir_url)))])
+    return hashlib.sha256(json.dumps(state).encode('utf-8')).hexdigest()
+
+
+def render_cache_key(recipe_path, config, variants=None, env_check=False, **render_args):
+    """Hash everything that goes into rendering a recipe directory: its files, the variant
+    config files that apply to it, the relevant Config fields, environment variables the
+    recipe mentions, and (if env_check) the contents of the channels it would be solved
+    against.  Returns None for things that can't be cached (recipe tarballs)."""
+    if not isdir(recipe_path):
+        if not (isfile(recipe_path) and recipe_path.endswith('.yaml')):
+            return None
+        recipe_path = os.path.dirname(recipe_path)
+    recipe_path = abspath(recipe_path)
+    from conda_build import __version__
+    from conda_build.variants import find_config_files
+
+    h = hashlib.sha256()
+    h.update(__version__.encode('utf-8'))
+    tokens = set()
+    for root, dirs, files in os.walk(recipe_path):
+        dirs.sort()
+        for fn in sorted(files):
+            path = os.path.join(root, fn)
+            with open(path, 'rb') as f:
+                data = f.read()
+            h.update(os.path.relpath(path, recipe_path).encode('utf-8') + b'\0' + data + b'\0')
+            tokens.update(re.findall(br'\w+', data))
+    for path in find_config_files(recipe_path, config):
+        with open(path, 'rb') as f:
+            h.update(path.encode('utf-8') + b'\0' + f.read() + b'\0')
+
+    # selectors and jinja see os.environ; only the variables the recipe names can matter
+    env = {k: v for k, v in os.environ.items() if k.encode('utf-8') in tokens}
+    fields = {field: getattr(config, field, None) for field in RENDER_CACHE_CONFIG_FIELDS}
+    h.update(json.dumps([fields, env, variants, sorted(render_args.items())],
+                        sort_keys=True, default=repr).encode('utf-8'))
+    if env_check:
+        h.update(_repodata_fingerprint(config).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_cached_render(key, config):
+    path = os.path.join(config.render_cache_dir, key + '.pickle')
+    if not isfile(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        utils.get_logger(__name__).debug("Discarding unreadable render cache entry %s: %s",
+                                         path, e)
+        utils.rm_rf(path)
+        return None
+
+
+def save_cached_render(key, config, metadata_tuples):
+    # rendering from downloaded source depends on more than we can hash up front
+    if any(m.needs_source_for_render for m, _, _ in metadata_tuples):
+        return False
+    path = os.path.join(config.render_cache_dir, key + '.pickle')
+    tmp = path + '.tmp{}'.format(os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump(metadata_tuples, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+    except Exception as e:
+        utils.get_logger(__name__).debug("Not caching render of %s: %s", key, e)
+        utils.rm_rf(tmp)
+        return False
+    return True
+
+
 # Keep this out of the function below so it can be imported by other modules.
 FIELDS = ["package", "source", "build", "requirements", "test", "app", "outputs", "about", "extra"]
 
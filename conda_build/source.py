@@ -1,6 +1,9 @@
 from __future__ import absolute_import, division, print_function
 
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import io
+import json
 import locale
 import os
 from os.path import join, isdir, isfile, abspath, basename, exists, normpath, expanduser
@@ -11,14 +14,17 @@ import sys
 import tempfile
 import time
 
-from .conda_interface import download, TemporaryDirectory
+from requests.exceptions import RequestException
+
+from .conda_interface import CondaSession, context, TemporaryDirectory
 from .conda_interface import hashsum_file
 
 from conda_build.os_utils import external
 from conda_build.conda_interface import url_path, CondaHTTPError
 from conda_build.utils import (decompressible_exts, tar_xf, safe_print_unicode, copy_into, on_win, ensure_list,
                                check_output_env, check_call_env, convert_path_for_cygwin_or_msys2,
-                               get_logger, rm_rf, LoggingContext)
+                               get_logger, rm_rf, LoggingContext, clone_file,
+                               clone_tree, make_tree_read_only)
 
 
 log = get_logger(__name__)
@@ -32,12 +38,60 @@ else:
 
 git_submod_re = re.compile(r'(?:.+)\.(.+)\.(?:.+)\s(.+)')
 ext_re = re.compile(r"(.*?)(\.(?:tar\.)?[^.]+)$")
+DOWNLOAD_CHUNK_SIZE = 2 ** 20
 
 
 def append_hash_to_fn(fn, hash_value):
     return ext_re.sub(r"\1_{}\2".format(hash_value[:10]), fn)
 
 
+def _download_with_digests(url, path, hash_types):
+    """Stream url into path, computing the hash_types digests of the data as it is written.
+
+    Returns {hash_type: hexdigest}"""
+    hashers = dict((hash_type, hashlib.new(hash_type)) for hash_type in hash_types)
+    timeout = (getattr(context, 'remote_connect_timeout_secs', 9.15),
+               getattr(context, 'remote_read_timeout_secs', 60.))
+    response = CondaSession().get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+    finally:
+        response.close()
+    return dict((hash_type, hasher.hexdigest()) for hash_type, hasher in hashers.items())
+
+
+def _digests_path(path):
+    return path + '.digests'
+
+
+def _read_digests(path):
+    """Digests recorded for path when it entered the cache, if it has not changed since"""
+    try:
+        with open(_digests_path(path)) as f:
+            recorded = json.load(f)
+        st = os.stat(path)
+    except (IOError, OSError, ValueError):
+        return {}
+    if recorded.get('size') != st.st_size or recorded.get('mtime') != int(st.st_mtime):
+        return {}
+    return recorded.get('digests', {})
+
+
+def _write_digests(path, digests):
+    st = os.stat(path)
+    tmp = '%s-%s' % (_digests_path(path), next(tempfile._get_candidate_names()))
+    with open(tmp, 'w') as f:
+        json.dump({'size': st.st_size, 'mtime': int(st.st_mtime), 'digests': digests}, f)
+    if on_win and isfile(_digests_path(path)):
+        os.unlink(_digests_path(path))
+    os.rename(tmp, _digests_path(path))
+
+
 def download_to_cache(cache_folder, recipe_path, source_dict, verbose=False):
     ''' Download a source to the local cache. '''
     if verbose:
@@ -60,14 +114,23 @@ def download_to_cache(cache_folder, recipe_path, source_dict, verbose=False):
     else:
         log.warn("No hash (md5, sha1, sha256) provided for {}.  Source download forced.  "
                  "Add hash to recipe to use source cache.".format(unhashed_fn))
+    # without a hash, sha256 is needed to name the file in the cache
+    hash_type = hash_type if hash_added else 'sha256'
     path = join(cache_folder, fn)
     if isfile(path):
         if verbose:
             log.info('Found source in cache: %s' % fn)
+        digests = _read_digests(path)
+        if hash_type not in digests:
+            digests[hash_type] = hashsum_file(path, hash_type)
+            _write_digests(path, digests)
     else:
         if verbose:
             log.info('Downloading source to cache: %s' % fn)
 
+        # download next to the final name and only move it there once it has been verified,
+        #    so the cache never holds a partial or corrupt file
+        partial_path = '%s.partial-%s' % (path, next(tempfile._get_candidate_names()))
         for url in source_urls:
             if "://" not in url:
                 if url.startswith('~'):
@@ -82,42 +145,37 @@ def download_to_cache(cache_folder, recipe_path, source_dict, verbose=False):
                 if verbose:
                     log.info("Downloading %s" % url)
                 with LoggingContext():
-                    download(url, path)
-            except CondaHTTPError as e:
+                    digests = _download_with_digests(url, partial_path, [hash_type])
+            except (CondaHTTPError, RuntimeError, IOError, RequestException) as e:
                 log.warn("Error: %s" % str(e).strip())
-                rm_rf(path)
-            except RuntimeError as e:
-                log.warn("Error: %s" % str(e).strip())
-                rm_rf(path)
+                rm_rf(partial_path)
             else:
                 if verbose:
                     log.info("Success")
                 break
         else:  # no break
-            rm_rf(path)
+            rm_rf(partial_path)
             raise RuntimeError("Could not download %s" % url)
 
-    hashed = None
-    for tp in ('md5', 'sha1', 'sha256'):
-        if tp in source_dict:
-            expected_hash = source_dict[tp]
-            hashed = hashsum_file(path, tp)
-            if expected_hash != hashed:
-                rm_rf(path)
-                raise RuntimeError("%s mismatch: '%s' != '%s'" %
-                           (tp.upper(), hashed, expected_hash))
-            break
-
-    # this is really a fallback.  If people don't provide the hash, we still need to prevent
-    #    collisions in our source cache, but the end user will get no benefit from the cache.
-    if not hash_added:
-        if not hashed:
-            hashed = hashsum_file(path, 'sha256')
-        dest_path = append_hash_to_fn(path, hashed)
-        if not os.path.isfile(dest_path):
-            shutil.move(path, dest_path)
-        path = dest_path
-
+        if hash_added and digests[hash_type] != source_dict[hash_type]:
+            rm_rf(partial_path)
+            raise RuntimeError("%s mismatch: '%s' != '%s'" %
+                       (hash_type.upper(), digests[hash_type], source_dict[hash_type]))
+        # this is really a fallback.  If people don't provide the hash, we still need to prevent
+        #    collisions in our source cache, but the end user will get no benefit from the cache.
+        if not hash_added:
+            path = append_hash_to_fn(path, digests[hash_type])
+        if on_win and isfile(path):
+            os.unlink(path)
+        os.rename(partial_path, path)
+        _write_digests(path, digests)
+        return path, unhashed_fn
+
+    if hash_added and digests[hash_type] != source_dict[hash_type]:
+        rm_rf(path)
+        rm_rf(_digests_path(path))
+        raise RuntimeError("%s mismatch: '%s' != '%s'" %
+                   (hash_type.upper(), digests[hash_type], source_dict[hash_type]))
     return path, unhashed_fn
 
 
@@ -128,19 +186,32 @@ def hoist_single_extracted_folder(nested_folder):
     know exactly what that folder is called."""
     parent = os.path.dirname(nested_folder)
     flist = os.listdir(nested_folder)
-    with TemporaryDirectory() as tmpdir:
-        for entry in flist:
-            shutil.move(os.path.join(nested_folder, entry), os.path.join(tmpdir, entry))
-        rm_rf(nested_folder)
+    # move the folder aside next to itself rather than through the system temp dir, so that
+    #    every move is a rename on the same filesystem
+    tmpdir = tempfile.mkdtemp(prefix='.hoist-', dir=parent)
+    try:
+        aside = os.path.join(tmpdir, 'nested')
+        os.rename(nested_folder, aside)
         for entry in flist:
-            shutil.move(os.path.join(tmpdir, entry), os.path.join(parent, entry))
+            shutil.move(os.path.join(aside, entry), os.path.join(parent, entry))
+    finally:
+        rm_rf(tmpdir)
 
 
 def unpack(source_dict, src_dir, cache_folder, recipe_path, croot, verbose=False,
-           timeout=900, locking=True):
-    ''' Uncompress a downloaded source. '''
-    src_path, unhashed_fn = download_to_cache(cache_folder, recipe_path, source_dict, verbose)
+           timeout=900, locking=True, downloaded=None):
+    ''' Uncompress a downloaded source.
+
+    downloaded is the (path, unhashed_fn) download_to_cache returned, if it was already called.
+    '''
+    src_path, unhashed_fn = downloaded or download_to_cache(cache_folder, recipe_path,
+                                                            source_dict, verbose)
+    _extract_source(src_path, unhashed_fn, source_dict, src_dir, croot, verbose=verbose,
+                    timeout=timeout, locking=locking)
+
 
+def _extract_source(src_path, unhashed_fn, source_dict, src_dir, croot, verbose=False,
+                    timeout=900, locking=True):
     if not isdir(src_dir):
         os.makedirs(src_dir)
     if verbose:
@@ -169,42 +240,110 @@ def unpack(source_dict, src_dir, cache_folder, recipe_path, croot, verbose=False
             shutil.move(os.path.join(tmpdir, f), os.path.join(src_dir, f))
 
 
-def git_mirror_checkout_recursive(git, mirror_dir, checkout_dir, git_url, git_cache, git_ref=None,
-                                  git_depth=-1, is_top_level=True, verbose=True):
-    """ Mirror (and checkout) a Git repository recursively.
-
-        It's not possible to use `git submodule` on a bare
-        repository, so the checkout must be done before we
-        know which submodules there are.
+def _source_tree_key(src_path, source_dict, recipe_path):
+    """Hash of everything that goes into the extracted and patched tree of a url source"""
+    from conda_build import __version__
+    h = hashlib.sha256()
+    # the file name only carries the first characters of the hash, so prefer the full one
+    for hash_type in ('md5', 'sha1', 'sha256'):
+        if hash_type in source_dict:
+            h.update(('%s:%s' % (hash_type, source_dict[hash_type])).encode('utf-8'))
+            break
+    else:
+        h.update(basename(src_path).encode('utf-8'))
+    h.update(str('no_hoist' in source_dict).encode('utf-8'))
+    for patch in ensure_list(source_dict.get('patches', [])):
+        h.update(patch.encode('utf-8'))
+        h.update(hashsum_file(join(recipe_path, patch), 'sha256').encode('utf-8'))
+    h.update(__version__.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _tree_manifest(tree_dir):
+    """size, mtime and mode of every file under tree_dir, to tell whether a cached tree was
+    modified through one of its hardlinks"""
+    manifest = {}
+    for root, dirs, files in os.walk(tree_dir):
+        for name in files:
+            path = join(root, name)
+            if os.path.islink(path):
+                continue
+            st = os.lstat(path)
+            manifest[os.path.relpath(path, tree_dir).replace('\\', '/')] = [
+                st.st_size, int(st.st_mtime), st.st_mode]
+    return manifest
+
+
+def _read_source_tree_manifest(entry_dir):
+    """The manifest of a cached tree, or None when the tree was modified since it was cached"""
+    try:
+        with open(join(entry_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('files') != _tree_manifest(
+            join(entry_dir, 'tree')):
+        return None
+    return manifest
+
+
+def unpack_cached(source_dict, src_dir, metadata, downloaded=None):
+    """Provide a url source, already patched, from config.src_tree_cache.
+
+    The source is extracted and patched once per source hash and patch set, and each work
+    dir gets a clone of that tree (reflinks where the filesystem supports them, otherwise
+    hardlinks).  The files of the cached tree are made read-only, so a build can't write to
+    them in place through a hardlink; copies and reflinks get their write bits back.  As a
+    second line of defense, a tree that no longer matches its manifest is discarded and
+    extracted again."""
+    config = metadata.config
+    src_path, unhashed_fn = downloaded or download_to_cache(config.src_cache, metadata.path,
+                                                            source_dict, config.verbose)
+    cache_dir = config.src_tree_cache
+    entry_dir = join(cache_dir, _source_tree_key(src_path, source_dict, metadata.path))
+    manifest = _read_source_tree_manifest(entry_dir) if isdir(entry_dir) else None
+    if isdir(entry_dir) and not manifest:
+        log.warn("Cached source tree %s was modified, extracting it again", entry_dir)
+        rm_rf(entry_dir)
+    if not isdir(entry_dir):
+        temp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+        try:
+            tree_dir = join(temp_dir, 'tree')
+            _extract_source(src_path, unhashed_fn, source_dict, tree_dir, config.croot,
+                            verbose=config.verbose, timeout=config.timeout,
+                            locking=config.locking)
+            patch_attributes_output = []
+            for patch in ensure_list(source_dict.get('patches', [])):
+                patch_attributes_output += [apply_one_patch(tree_dir, metadata.path, patch,
+                                                            config)]
+            _patch_attributes_debug_print(patch_attributes_output)
+            modes = make_tree_read_only(tree_dir)
+            with open(join(temp_dir, 'manifest.json'), 'w') as f:
+                json.dump({'files': _tree_manifest(tree_dir), 'modes': modes}, f)
+            try:
+                os.rename(temp_dir, entry_dir)
+            except OSError:
+                # another build extracted the same source first
+                if not isdir(entry_dir):
+                    raise
+        finally:
+            rm_rf(temp_dir)
+        manifest = _read_source_tree_manifest(entry_dir)
+    elif config.verbose:
+        print("Using cached source tree %s" % entry_dir)
+    clone_tree(join(entry_dir, 'tree'), src_dir, modes=(manifest or {}).get('modes'))
 
-        Worse, submodules can be identified by using either
-        absolute URLs or relative paths.  If relative paths
-        are used those need to be relocated upon mirroring,
-        but you could end up with `../../../../blah` and in
-        that case conda-build could be tricked into writing
-        to the root of the drive and overwriting the system
-        folders unless steps are taken to prevent that.
-    """
 
-    if verbose:
-        stdout = None
-        stderr = None
-    else:
-        FNULL = open(os.devnull, 'wb')
-        stdout = FNULL
-        stderr = FNULL
+def _git_update_mirror(git, mirror_dir, git_url, git_cache, git_ref='HEAD', git_depth=-1,
+                       stdout=None, stderr=None):
+    """Create or update the bare mirror of git_url at mirror_dir.
 
+    Returns git_url, normalized if it had to be retried as a local path."""
     if not mirror_dir.startswith(git_cache + os.sep):
         sys.exit("Error: Attempting to mirror to %s which is outside of GIT_CACHE %s"
                  % (mirror_dir, git_cache))
 
-    # This is necessary for Cygwin git and m2-git, although it is fixed in newer MSYS2.
     git_mirror_dir = convert_path_for_cygwin_or_msys2(git, mirror_dir).rstrip('/')
-    git_checkout_dir = convert_path_for_cygwin_or_msys2(git, checkout_dir).rstrip('/')
-
-    # Set default here to catch empty dicts
-    git_ref = git_ref or 'HEAD'
-
     mirror_dir = mirror_dir.rstrip('/')
     if not isdir(os.path.dirname(mirror_dir)):
         os.makedirs(os.path.dirname(mirror_dir))
@@ -249,6 +388,44 @@ def git_mirror_checkout_recursive(git, mirror_dir, checkout_dir, git_url, git_ca
                 git_url = normpath(git_url)
             check_call_env(args + [git_url, git_mirror_dir], stdout=stdout, stderr=stderr)
         assert isdir(mirror_dir)
+    return git_url
+
+
+def git_mirror_checkout_recursive(git, mirror_dir, checkout_dir, git_url, git_cache, git_ref=None,
+                                  git_depth=-1, is_top_level=True, verbose=True):
+    """ Mirror (and checkout) a Git repository recursively.
+
+        It's not possible to use `git submodule` on a bare
+        repository, so the checkout must be done before we
+        know which submodules there are.
+
+        Worse, submodules can be identified by using either
+        absolute URLs or relative paths.  If relative paths
+        are used those need to be relocated upon mirroring,
+        but you could end up with `../../../../blah` and in
+        that case conda-build could be tricked into writing
+        to the root of the drive and overwriting the system
+        folders unless steps are taken to prevent that.
+    """
+
+    if verbose:
+        stdout = None
+        stderr = None
+    else:
+        FNULL = open(os.devnull, 'wb')
+        stdout = FNULL
+        stderr = FNULL
+
+    # This is necessary for Cygwin git and m2-git, although it is fixed in newer MSYS2.
+    git_mirror_dir = convert_path_for_cygwin_or_msys2(git, mirror_dir).rstrip('/')
+    git_checkout_dir = convert_path_for_cygwin_or_msys2(git, checkout_dir).rstrip('/')
+
+    # Set default here to catch empty dicts
+    git_ref = git_ref or 'HEAD'
+
+    mirror_dir = mirror_dir.rstrip('/')
+    git_url = _git_update_mirror(git, mirror_dir, git_url, git_cache, git_ref=git_ref,
+                                 git_depth=git_depth, stdout=stdout, stderr=stderr)
 
     # Now clone from mirror_dir into checkout_dir.
     check_call_env([git, 'clone', git_mirror_dir, git_checkout_dir], stdout=stdout, stderr=stderr)
@@ -300,7 +477,201 @@ def git_mirror_checkout_recursive(git, mirror_dir, checkout_dir, git_url, git_ca
         FNULL.close()
 
 
-def git_source(source_dict, git_cache, src_dir, recipe_path=None, verbose=True):
+def _git_submodules(git, checkout_dir, stderr=None):
+    """(name, url, path) for every submodule listed in checkout_dir's .gitmodules"""
+    try:
+        output = check_output_env([git, 'config', '--file', '.gitmodules', '--get-regexp',
+                                   r'^submodule\..*\.(url|path)$'], stderr=stderr, cwd=checkout_dir)
+    except CalledProcessError:
+        return []
+    entries = {}
+    order = []
+    for line in output.decode('utf-8').splitlines():
+        key, _, value = line.partition(' ')
+        name, field = key[len('submodule.'):].rsplit('.', 1)
+        if name not in entries:
+            order.append(name)
+        entries.setdefault(name, {})[field] = value.strip()
+    return [(name, entries[name]['url'], entries[name]['path']) for name in order
+            if 'url' in entries[name] and 'path' in entries[name]]
+
+
+def _git_submodules_from_mirrors(git, checkout_dir, git_url, mirror_dir, git_cache, git_depth=-1,
+                                 stdout=None, stderr=None, verbose=True):
+    """Check out the submodules of checkout_dir (recursively), cloning each one with
+    --reference against its own mirror in git_cache instead of fetching it again."""
+    for name, url, path in _git_submodules(git, checkout_dir, stderr=stderr):
+        if url.startswith('.'):
+            # relative submodules are mirrored relative to their parent's mirror, like
+            #    git_mirror_checkout_recursive does
+            submod_url = urljoin(git_url + '/', url)
+            submod_mirror_dir = normpath(join(mirror_dir, url))
+        else:
+            submod_url = url
+            submod_mirror_dir = join(git_cache, _git_cache_dirname(url))
+        try:
+            output = check_output_env([git, 'ls-tree', 'HEAD', '--', path], stderr=stderr,
+                                      cwd=checkout_dir)
+            submod_rev = output.decode('utf-8').split()[2]
+        except (CalledProcessError, IndexError):
+            submod_rev = 'HEAD'
+        if verbose:
+            print('Submodule %s found: url is %s, submod_mirror_dir is %s' % (
+                  name, submod_url, submod_mirror_dir))
+        _git_update_mirror(git, submod_mirror_dir, submod_url, git_cache, git_ref=submod_rev,
+                           git_depth=git_depth, stdout=stdout, stderr=stderr)
+        git_submod_mirror_dir = convert_path_for_cygwin_or_msys2(git, submod_mirror_dir)
+        check_call_env([git, 'submodule', 'init', '--', path], cwd=checkout_dir,
+                       stdout=stdout, stderr=stderr)
+        check_call_env([git, 'config', 'submodule.%s.url' % name, git_submod_mirror_dir],
+                       cwd=checkout_dir, stdout=stdout, stderr=stderr)
+        # newer git refuses file:// submodules unless they are allowed explicitly
+        check_call_env([git, '-c', 'protocol.file.allow=always', 'submodule', 'update',
+                        '--reference', git_submod_mirror_dir, '--', path],
+                       cwd=checkout_dir, stdout=stdout, stderr=stderr)
+        _git_submodules_from_mirrors(git, join(checkout_dir, path), submod_url, submod_mirror_dir,
+                                     git_cache, git_depth=git_depth, stdout=stdout, stderr=stderr,
+                                     verbose=verbose)
+
+
+def _git_shared_checkout(git, mirror_dir, checkout_dir, git_url, git_cache, git_ref='HEAD',
+                         git_depth=-1, stdout=None, stderr=None, verbose=True):
+    git_mirror_dir = convert_path_for_cygwin_or_msys2(git, mirror_dir).rstrip('/')
+    git_checkout_dir = convert_path_for_cygwin_or_msys2(git, checkout_dir).rstrip('/')
+    # --shared records the mirror in .git/objects/info/alternates rather than copying objects
+    check_call_env([git, 'clone', '--shared', git_mirror_dir, git_checkout_dir],
+                   stdout=stdout, stderr=stderr)
+    if git_ref != 'HEAD':
+        if verbose:
+            print('checkout: %r' % git_ref)
+        check_call_env([git, 'checkout', git_ref], cwd=checkout_dir, stdout=stdout, stderr=stderr)
+    _git_submodules_from_mirrors(git, checkout_dir, git_url, mirror_dir, git_cache,
+                                 git_depth=git_depth, stdout=stdout, stderr=stderr,
+                                 verbose=verbose)
+
+
+def _git_metadata_paths(tree_dir):
+    """Relative paths (forward slashes) of the .git folders and files in tree_dir - those of
+    submodules included"""
+    paths = []
+    for root, dirs, files in os.walk(tree_dir):
+        rel_root = os.path.relpath(root, tree_dir).replace('\\', '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        if '.git' in dirs + files:
+            paths.append(rel_root + '.git')
+        dirs[:] = [name for name in dirs if name != '.git']
+    return paths
+
+
+def _git_cached_tree(git, mirror_dir, commit, git_url, git_cache, git_ref='HEAD', git_depth=-1,
+                     stdout=None, stderr=None, verbose=True):
+    """Path of the checkout of commit (submodules included) kept in git_cache, and its manifest,
+    creating it if this is the first time the commit is needed.
+
+    Like the trees of url sources, its files are made read-only, and it is checked out again when
+    it no longer matches its manifest.  The manifest lists the .git folders, which work dirs get
+    copies of: git itself (and build scripts running git) write to them in place."""
+    mirror_hash = hashlib.sha1(mirror_dir.encode('utf-8')).hexdigest()[:10]
+    trees_dir = join(git_cache, '_conda_trees', mirror_hash)
+    entry_dir = join(trees_dir, commit)
+    manifest = _read_source_tree_manifest(entry_dir) if isdir(entry_dir) else None
+    if manifest:
+        return join(entry_dir, 'tree'), manifest
+    if isdir(entry_dir):
+        log.warn("Cached git tree %s was modified, checking it out again", entry_dir)
+        rm_rf(entry_dir)
+    try:
+        os.makedirs(trees_dir)
+    except OSError:
+        if not isdir(trees_dir):
+            raise
+    temp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=trees_dir)
+    try:
+        tree_dir = join(temp_dir, 'tree')
+        _git_shared_checkout(git, mirror_dir, tree_dir, git_url, git_cache,
+                             git_ref=git_ref, git_depth=git_depth, stdout=stdout, stderr=stderr,
+                             verbose=verbose)
+        git_paths = _git_metadata_paths(tree_dir)
+        modes = make_tree_read_only(tree_dir, exclude=git_paths)
+        with open(join(temp_dir, 'manifest.json'), 'w') as f:
+            json.dump({'files': _tree_manifest(tree_dir), 'modes': modes, 'git': git_paths}, f)
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            # another build exported the same commit first
+            if not isdir(entry_dir):
+                raise
+    finally:
+        rm_rf(temp_dir)
+    return join(entry_dir, 'tree'), _read_source_tree_manifest(entry_dir)
+
+
+def git_mirror_checkout_shared(git, mirror_dir, checkout_dir, git_url, git_cache, git_ref=None,
+                               git_depth=-1, tree_cache=False, verbose=True):
+    """ Mirror a Git repository and check it out without copying the mirror's objects.
+
+        The checkout is a `git clone --shared` of the mirror and submodules are cloned
+        with `--reference` against their own mirrors, so only the working tree is
+        written.  With tree_cache, one such checkout is kept in the git_cache for each
+        commit git_ref resolves to and is cloned into checkout_dir with hardlinks (or
+        reflinks), so variants building the same revision share one tree.  Its files are
+        read-only and its .git folders are copied rather than linked.
+    """
+    if verbose:
+        stdout = None
+        stderr = None
+    else:
+        FNULL = open(os.devnull, 'wb')
+        stdout = FNULL
+        stderr = FNULL
+
+    git_ref = git_ref or 'HEAD'
+    mirror_dir = mirror_dir.rstrip('/')
+    git_url = _git_update_mirror(git, mirror_dir, git_url, git_cache, git_ref=git_ref,
+                                 git_depth=git_depth, stdout=stdout, stderr=stderr)
+
+    commit = None
+    # a populated folder can't take hardlinks; let git refuse it as it does for 'clone'
+    if tree_cache and not (isdir(checkout_dir) and os.listdir(checkout_dir)):
+        try:
+            output = check_output_env([git, 'rev-parse', '--verify', git_ref + '^{commit}'],
+                                      stderr=stderr, cwd=mirror_dir)
+            commit = output.decode('utf-8').strip()
+        except CalledProcessError:
+            log.warn("Could not resolve git_rev %s in %s, checking it out without the tree "
+                     "cache", git_ref, mirror_dir)
+    manifest = None
+    if commit:
+        tree_dir, manifest = _git_cached_tree(git, mirror_dir, commit, git_url, git_cache,
+                                              git_ref=git_ref, git_depth=git_depth,
+                                              stdout=stdout, stderr=stderr, verbose=verbose)
+    if manifest:
+        if verbose:
+            print('Cloning cached tree of %s from %s' % (commit, tree_dir))
+        clone_tree(tree_dir, checkout_dir, exclude=manifest['git'], modes=manifest['modes'])
+        for path in manifest['git']:
+            if isdir(join(tree_dir, path)):
+                clone_tree(join(tree_dir, path), join(checkout_dir, path), hardlink=False)
+            else:
+                clone_file(join(tree_dir, path), join(checkout_dir, path), hardlink=False)
+    else:
+        _git_shared_checkout(git, mirror_dir, checkout_dir, git_url, git_cache, git_ref=git_ref,
+                             git_depth=git_depth, stdout=stdout, stderr=stderr, verbose=verbose)
+    git_info(checkout_dir, None, git=git, verbose=verbose)
+    if not verbose:
+        FNULL.close()
+
+
+def _git_cache_dirname(git_url):
+    """Path of git_url's mirror relative to the git_cache"""
+    git_dn = git_url.split('://')[-1].replace('/', os.sep)
+    if git_dn.startswith(os.sep):
+        git_dn = git_dn[1:]
+    return git_dn.replace(':', '_')
+
+
+def git_source(source_dict, git_cache, src_dir, recipe_path=None, verbose=True,
+               checkout_mode='clone'):
     ''' Download a source from a Git repo (or submodule, recursively) '''
     if not isdir(git_cache):
         os.makedirs(git_cache)
@@ -318,19 +689,15 @@ def git_source(source_dict, git_cache, src_dir, recipe_path=None, verbose=True):
     if git_url.startswith('.'):
         # It's a relative path from the conda recipe
         git_url = abspath(normpath(os.path.join(recipe_path, git_url)))
-        if sys.platform == 'win32':
-            git_dn = git_url.replace(':', '_')
-        else:
-            git_dn = git_url[1:]
+    mirror_dir = join(git_cache, _git_cache_dirname(git_url))
+    if checkout_mode in ('shared', 'tree'):
+        git_mirror_checkout_shared(
+            git, mirror_dir, src_dir, git_url, git_cache=git_cache, git_ref=git_ref,
+            git_depth=git_depth, tree_cache=checkout_mode == 'tree', verbose=verbose)
     else:
-        git_dn = git_url.split('://')[-1].replace('/', os.sep)
-        if git_dn.startswith(os.sep):
-            git_dn = git_dn[1:]
-        git_dn = git_dn.replace(':', '_')
-    mirror_dir = join(git_cache, git_dn)
-    git_mirror_checkout_recursive(
-        git, mirror_dir, src_dir, git_url, git_cache=git_cache, git_ref=git_ref,
-        git_depth=git_depth, is_top_level=True, verbose=verbose)
+        git_mirror_checkout_recursive(
+            git, mirror_dir, src_dir, git_url, git_cache=git_cache, git_ref=git_ref,
+            git_depth=git_depth, is_top_level=True, verbose=verbose)
     return git
 
 
@@ -837,6 +1204,64 @@ def apply_patch(src_dir, patch, config, git=None):
     apply_one_patch(src_dir, os.path.dirname(patch), os.path.basename(patch), config, git)
 
 
+def _map_in_threads(func, items, jobs):
+    """[func(item) for item in items], with up to jobs calls running at once.
+
+    Every call is allowed to finish before an error is raised, and the error raised is that
+    of the first failing item, so failures are reported the same way from run to run."""
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(min(jobs, len(items))) as executor:
+        futures = [executor.submit(func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def _download_url_sources(dicts, metadata):
+    """Download (and verify) every url source, metadata.config.source_jobs at a time.
+
+    Returns {index in dicts: (path, unhashed_fn)}"""
+    config = metadata.config
+    indices = [i for i, source_dict in enumerate(dicts)
+               if any(k in source_dict for k in ('fn', 'url'))]
+
+    def download(i):
+        return download_to_cache(config.src_cache, metadata.path, dicts[i], config.verbose)
+
+    if config.source_jobs <= 1 or len(indices) <= 1:
+        return dict(zip(indices, [download(i) for i in indices]))
+    # LoggingContext changes process-wide logger levels.  Entered here, around all of the
+    #    threads, the ones each download enters only ever restore the levels set here.
+    with LoggingContext():
+        return dict(zip(indices, _map_in_threads(download, indices, config.source_jobs)))
+
+
+def _overlapping_dirs(dirs):
+    dirs = [os.path.normpath(d) + os.sep for d in dirs]
+    return any(a.startswith(b) for i, a in enumerate(dirs) for j, b in enumerate(dirs) if i != j)
+
+
+def _unpack_url_source(source_dict, src_dir, metadata, git, downloaded):
+    """Extract a downloaded url source into src_dir.  Returns the patches still to apply."""
+    config = metadata.config
+    # the cached tree only depends on this source if nothing else is in its folder yet and
+    #    its patches won't be applied with git
+    if config.source_tree_cache and not git and not (isdir(src_dir) and os.listdir(src_dir)):
+        unpack_cached(source_dict, src_dir, metadata, downloaded=downloaded)
+        return []
+    unpack(source_dict, src_dir, config.src_cache, recipe_path=metadata.path, croot=config.croot,
+           verbose=config.verbose, timeout=config.timeout, locking=config.locking,
+           downloaded=downloaded)
+    return ensure_list(source_dict.get('patches', []))
+
+
+def _apply_source_patches(src_dir, patches, metadata, git):
+    patch_attributes_output = []
+    for patch in patches:
+        patch_attributes_output += [apply_one_patch(src_dir, metadata.path, patch, metadata.config, git)]
+    _patch_attributes_debug_print(patch_attributes_output)
+
+
 def provide(metadata):
     """
     given a recipe_dir:
@@ -854,17 +1279,33 @@ def provide(metadata):
     else:
         dicts = meta
 
+    src_dirs = [os.path.join(metadata.config.work_dir, source_dict.get('folder') or '')
+                for source_dict in dicts]
     try:
-        for source_dict in dicts:
+        downloads = _download_url_sources(dicts, metadata)
+        if (metadata.config.source_jobs > 1 and len(downloads) == len(dicts) > 1 and
+                not _overlapping_dirs(src_dirs)):
+            # every source is an archive going to its own folder: extract them all at once,
+            #    then patch in recipe order
+            def extract(i):
+                return _unpack_url_source(dicts[i], src_dirs[i], metadata, None, downloads[i])
+
+            patch_lists = _map_in_threads(extract, range(len(dicts)),
+                                          metadata.config.source_jobs)
+            for i, patches in enumerate(patch_lists):
+                _apply_source_patches(src_dirs[i], patches, metadata, git)
+            return metadata.config.work_dir
+
+        for i, source_dict in enumerate(dicts):
             folder = source_dict.get('folder')
-            src_dir = os.path.join(metadata.config.work_dir, folder if folder else '')
+            src_dir = src_dirs[i]
+            patches = ensure_list(source_dict.get('patches', []))
             if any(k in source_dict for k in ('fn', 'url')):
-                unpack(source_dict, src_dir, metadata.config.src_cache, recipe_path=metadata.path,
-                    croot=metadata.config.croot, verbose=metadata.config.verbose,
-                    timeout=metadata.config.timeout, locking=metadata.config.locking)
+                patches = _unpack_url_source(source_dict, src_dir, metadata, git, downloads[i])
             elif 'git_url' in source_dict:
                 git = git_source(source_dict, metadata.config.git_cache, src_dir, metadata.path,
-                                verbose=metadata.config.verbose)
+                                verbose=metadata.config.verbose,
+                                checkout_mode=metadata.config.git_checkout_mode)
             # build to make sure we have a work directory with source in it. We
             #    want to make sure that whatever version that is does not
             #    interfere with the test we run next.
@@ -905,11 +1346,7 @@ def provide(metadata):
                 if not isdir(src_dir):
                     os.makedirs(src_dir)
 
-            patches = ensure_list(source_dict.get('patches', []))
-            patch_attributes_output = []
-            for patch in patches:
-                patch_attributes_output += [apply_one_patch(src_dir, metadata.path, patch, metadata.config, git)]
-            _patch_attributes_debug_print(patch_attributes_output)
+            _apply_source_patches(src_dir, patches, metadata, git)
 
     except CalledProcessError:
         shutil.move(metadata.config.work_dir, metadata.config.work_dir + '_failed_provide')
@@ -1,15 +1,18 @@
 from __future__ import absolute_import, division, print_function
 
-from collections import OrderedDict, defaultdict
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+import atexit
 import contextlib
+import copy
 import fnmatch
 import hashlib
 import json
 from locale import getpreferredencoding
-import libarchive
 import logging
 import logging.config
 import mmap
+from multiprocessing import cpu_count
 import operator
 import os
 from os.path import (dirname, getmtime, getsize, isdir, join, isfile, abspath, islink,
@@ -21,7 +24,7 @@ import sys
 import shutil
 import tarfile
 import tempfile
-from threading import Thread
+from threading import Lock, Thread
 import time
 
 try:
@@ -32,7 +35,6 @@ except ImportError:
 import yaml
 
 import filelock
-import conda_package_handling.api
 
 try:
     from conda.base.constants import CONDA_PACKAGE_EXTENSIONS, CONDA_PACKAGE_EXTENSION_V1, CONDA_PACKAGE_EXTENSION_V2
@@ -207,6 +209,99 @@ class DummyPsutilProcess(object):
         return []
 
 
+# bytes read from a build script's stdout at a time while rewriting it
+REWRITE_CHUNK_SIZE = 2 ** 16
+
+
+class StreamRewriter(object):
+    """Rewrites the values of env variables in a stream of bytes as references to the variables,
+    e.g. "~/conda/conda-bld/pkg_<date>/_h_place..." as "$PREFIX".
+
+    All values are found in one pass of a single compiled pattern.  When values share a prefix,
+    the longest one wins.  Data can be fed in chunks of any size: the end of a chunk that could be
+    the start of a value is held back until the next chunk (or flush) shows whether it is.
+    Output does not need to be valid in any encoding; it is handled as bytes throughout."""
+
+    def __init__(self, env, template=None):
+        if template is None:
+            template = '%{}%' if on_win else '${}'
+        encoding = sys.getfilesystemencoding() or 'utf-8'
+        self.replacements = {}
+        for key, value in env.items():
+            if value:
+                if not isinstance(value, bytes):
+                    value = value.encode(encoding)
+                self.replacements[value] = template.format(key).encode(encoding)
+        # alternatives are tried in order, so longer values come first
+        values = sorted(self.replacements, key=len, reverse=True)
+        self.pattern = re.compile(b'|'.join(re.escape(value) for value in values))
+        self.values = values
+        # no match can span a line break, so whole lines are rewritten by pattern.sub
+        self._by_line = not any(b'\n' in value for value in values)
+        self._pending = b''
+
+    def _undecided(self, data):
+        """Where the part of data starts that could still be the start of a value, depending on
+        what follows it."""
+        start = max(0, len(data) - len(self.values[0]) + 1)
+        undecided = len(data)
+        for value in self.values:
+            i = data.find(value[:1], start, undecided)
+            while i != -1:
+                if value.startswith(data[i:]) and len(value) > len(data) - i:
+                    undecided = i
+                    break
+                i = data.find(value[:1], i + 1, undecided)
+        return undecided
+
+    def _replace(self, match):
+        return self.replacements[match.group()]
+
+    def _rewrite(self, data, final):
+        if not self.values:
+            return data
+        # the pattern's choice at any position before limit can't change with more data
+        limit = len(data) if final else self._undecided(data)
+        pos = data.rfind(b'\n', 0, limit) + 1 if self._by_line else 0
+        pieces = [self.pattern.sub(self._replace, data[:pos])]
+        for match in self.pattern.finditer(data, pos):
+            start = match.start()
+            if start >= limit:
+                break
+            pieces.append(data[pos:start])
+            pieces.append(self.replacements[match.group()])
+            pos = match.end()
+        pieces.append(data[pos:limit])
+        self._pending = data[max(pos, limit):]
+        return b''.join(pieces)
+
+    def feed(self, data):
+        """Returns the rewritten output that data completes."""
+        return self._rewrite(self._pending + data, final=False)
+
+    def flush(self):
+        """Returns whatever output is still held back, rewritten."""
+        return self._rewrite(self._pending, final=True)
+
+
+def _write_stdout(data):
+    if not data:
+        return
+    stdout = sys.stdout
+    buffer = getattr(stdout, 'buffer', None)
+    if buffer is not None:
+        # keep the order with text already written to sys.stdout
+        stdout.flush()
+        buffer.write(data)
+        buffer.flush()
+    elif PY3:
+        stdout.write(data.decode(codec, 'replace'))
+        stdout.flush()
+    else:
+        stdout.write(data)
+        stdout.flush()
+
+
 def _setup_rewrite_pipe(env):
     """Rewrite values of env variables back to $ENV in stdout
 
@@ -215,46 +310,29 @@ def _setup_rewrite_pipe(env):
 
     Useful for replacing "~/conda/conda-bld/pkg_<date>/_h_place..." with "$PREFIX"
 
-    Returns an FD to be passed to Popen(stdout=...)
+    Returns an FD to be passed to Popen(stdout=...), and the thread that rewrites what is written
+    to it.  Close the FD once the process is done; the thread then finishes with what is left.
     """
-    # replacements is the env dict reversed,
-    # ordered by the length of the value so that longer replacements
-    # always occur first in case of common prefixes
-    replacements = OrderedDict()
-    for k, v in sorted(env.items(), key=lambda kv: len(kv[1]), reverse=True):
-        replacements[v] = k
-
+    rewriter = StreamRewriter(env)
     r_fd, w_fd = os.pipe()
-    r = os.fdopen(r_fd, 'rt')
-    if sys.platform == 'win32':
-        replacement_t = '%{}%'
-    else:
-        replacement_t = '${}'
 
-    def rewriter():
-        while True:
-            try:
-                line = r.readline()
-                if not line:
+    def rewrite():
+        try:
+            while True:
+                data = os.read(r_fd, REWRITE_CHUNK_SIZE)
+                if not data:
                     # reading done
-                    r.close()
-                    os.close(w_fd)
+                    _write_stdout(rewriter.flush())
                     return
-                for s, key in replacements.items():
-                    line = line.replace(s, replacement_t.format(key))
-                sys.stdout.write(line)
-            except UnicodeDecodeError:
-                try:
-                    txt = os.read(r, 10000)
-                    sys.stdout.write(txt or '')
-                except TypeError:
-                    pass
+                _write_stdout(rewriter.feed(data))
+        finally:
+            os.close(r_fd)
 
-    t = Thread(target=rewriter)
+    t = Thread(target=rewrite)
     t.daemon = True
     t.start()
 
-    return w_fd
+    return w_fd, t
 
 
 class PopenWrapper(object):
@@ -379,32 +457,41 @@ def _func_defaulting_env_to_os_environ(func, *popenargs, **kwargs):
         del kwargs['stats']
 
     rewrite_stdout_env = kwargs.pop('rewrite_stdout_env', None)
+    rewriter = None
     if rewrite_stdout_env:
-        kwargs['stdout'] = _setup_rewrite_pipe(rewrite_stdout_env)
-
-    out = None
-    if stats is not None:
-        proc = PopenWrapper(_args, **kwargs)
-        if func == 'output':
-            out = proc.out.read()
-
-        if proc.returncode != 0:
-            raise subprocess.CalledProcessError(proc.returncode, _args)
-
-        stats.update({'elapsed': proc.elapsed,
-                    'disk': proc.disk,
-                    'processes': proc.processes,
-                    'cpu_user': proc.cpu_user,
-                    'cpu_sys': proc.cpu_sys,
-                    'rss': proc.rss,
-                    'vms': proc.vms})
-    else:
-        if func == 'call':
-            subprocess.check_call(_args, **kwargs)
+        stdout_fd, rewriter = _setup_rewrite_pipe(rewrite_stdout_env)
+        kwargs['stdout'] = stdout_fd
+
+    try:
+        out = None
+        if stats is not None:
+            proc = PopenWrapper(_args, **kwargs)
+            if func == 'output':
+                out = proc.out.read()
+
+            if proc.returncode != 0:
+                raise subprocess.CalledProcessError(proc.returncode, _args)
+
+            stats.update({'elapsed': proc.elapsed,
+                        'disk': proc.disk,
+                        'processes': proc.processes,
+                        'cpu_user': proc.cpu_user,
+                        'cpu_sys': proc.cpu_sys,
+                        'rss': proc.rss,
+                        'vms': proc.vms})
         else:
-            if 'stdout' in kwargs:
-                del kwargs['stdout']
-            out = subprocess.check_output(_args, **kwargs)
+            if func == 'call':
+                subprocess.check_call(_args, **kwargs)
+            else:
+                if 'stdout' in kwargs:
+                    del kwargs['stdout']
+                out = subprocess.check_output(_args, **kwargs)
+    finally:
+        if rewriter:
+            # the rewriter reaches the end of the output once no process has the pipe open.
+            #    Don't wait long for it: something the script started may keep running.
+            os.close(stdout_fd)
+            rewriter.join(5)
     return out
 
 
@@ -541,6 +628,112 @@ def _copy_with_shell_fallback(src, dst):
                 raise OSError("Failed to copy {} to {}.  Error was: {}".format(src, dst, e))
 
 
+# FICLONE from linux/fs.h.  Filesystems that support it (btrfs, xfs with reflink=1) create a
+#    copy-on-write clone of the file, sharing all data blocks with the original.
+_FICLONE = 0x40049409
+_reflink_unsupported_devices = set()
+
+
+def _reflink(src, dst):
+    if not sys.platform.startswith('linux'):
+        return False
+    device = os.lstat(src).st_dev
+    if device in _reflink_unsupported_devices:
+        return False
+    import fcntl
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    except (IOError, OSError):
+        _reflink_unsupported_devices.add(device)
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def clone_file(src, dst, hardlink=True):
+    """Materialize the file src at dst as cheaply as the filesystem allows.
+
+    Tries a copy-on-write reflink first, then a hardlink (unless hardlink is False), and
+    finally falls back to a full copy.  Returns the method that was used."""
+    if _reflink(src, dst):
+        return 'reflink'
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        # on Windows os.link raises AttributeError on python 2
+        except (OSError, AttributeError):
+            pass
+    _copy_with_shell_fallback(src, dst)
+    return 'copy'
+
+
+def make_tree_read_only(path, exclude=()):
+    """Clear the write bits of every file under path, so that hardlinks to them can't be written
+    to in place.  Tools that write a new file and rename it over the old one still work, as the
+    folders stay writable.  (This does not stop root.)
+
+    Relative paths (forward slashes) in exclude, and everything below them, are left alone.
+    Returns {relative path: previous mode} of the files that were changed, for clone_tree."""
+    write_bits = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+    modes = {}
+    path = os.path.normpath(path)
+    for root, dirs, files in walk(path):
+        rel_root = os.path.relpath(root, path).replace('\\', '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        dirs[:] = [name for name in dirs if rel_root + name not in exclude]
+        for name in files:
+            file_path = os.path.join(root, name)
+            if rel_root + name in exclude or os.path.islink(file_path):
+                continue
+            mode = stat.S_IMODE(os.lstat(file_path).st_mode)
+            if mode & write_bits:
+                os.chmod(file_path, mode & ~write_bits)
+                modes[rel_root + name] = mode
+    return modes
+
+
+def clone_tree(src, dst, hardlink=True, exclude=(), link_prefixes=None, modes=None):
+    """Recreate the directory tree at src under dst, using clone_file for every file.
+
+    Relative paths (forward slashes) in exclude are skipped.  link_prefixes is an optional
+    (old, new) tuple used to rewrite absolute symlink targets that point inside the tree.
+    modes ({relative path: mode}, as returned by make_tree_read_only) is applied to the files
+    that end up as copies or reflinks rather than hardlinks, which are safe to write to."""
+    exclude = set(exclude)
+    modes = modes or {}
+    src = os.path.normpath(src)
+    for root, dirs, files in walk(src):
+        rel_root = os.path.relpath(root, src)
+        dst_root = os.path.normpath(os.path.join(dst, rel_root))
+        if not os.path.isdir(dst_root):
+            os.makedirs(dst_root)
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            rel = os.path.normpath(os.path.join(rel_root, name)).replace('\\', '/')
+            if rel in exclude:
+                continue
+            target = os.path.join(dst_root, name)
+            if os.path.islink(path):
+                link = os.readlink(path)
+                if link_prefixes and link.startswith(link_prefixes[0]):
+                    link = link_prefixes[1] + link[len(link_prefixes[0]):]
+                os.symlink(link, target)
+            elif name in files:
+                if clone_file(path, target, hardlink=hardlink) != 'hardlink' and rel in modes:
+                    os.chmod(target, modes[rel])
+            elif not os.path.isdir(target):
+                os.makedirs(target)
+        # don't descend into excluded folders
+        dirs[:] = [name for name in dirs if os.path.normpath(os.path.join(rel_root, name))
+                   .replace('\\', '/') not in exclude]
+
+
 def get_prefix_replacement_paths(src, dst):
     ssplit = src.split(os.path.sep)
     dsplit = dst.split(os.path.sep)
@@ -815,6 +1008,7 @@ def tar_xf_file(tarball, entries):
         tarball = os.path.join(os.getcwd(), tarball)
     result = None
     n_found = 0
+    import libarchive
     with libarchive.file_reader(tarball) as archive:
         for entry in archive:
             if entry.name in entries:
@@ -834,13 +1028,20 @@ def tar_xf_getnames(tarball):
     if not os.path.isabs(tarball):
         tarball = os.path.join(os.getcwd(), tarball)
     result = []
+    import libarchive
     with libarchive.file_reader(tarball) as archive:
         for entry in archive:
             result.append(entry.name)
     return result
 
 
+# tar_xf changes the working directory of the whole process, so archives are extracted one at a
+#    time, even when sources are unpacked on several threads
+_tar_xf_lock = Lock()
+
+
 def tar_xf(tarball, dir_path):
+    import libarchive
     flags = libarchive.extract.EXTRACT_TIME | \
             libarchive.extract.EXTRACT_PERM | \
             libarchive.extract.EXTRACT_SECURE_NODOTDOT | \
@@ -848,17 +1049,19 @@ def tar_xf(tarball, dir_path):
             libarchive.extract.EXTRACT_SECURE_NOABSOLUTEPATHS
     if not os.path.isabs(tarball):
         tarball = os.path.join(os.getcwd(), tarball)
-    try:
-        with tmp_chdir(os.path.realpath(dir_path)):
-            libarchive.extract_file(tarball, flags)
-    except libarchive.exception.ArchiveError:
-        # try again, maybe we are on Windows and the archive contains symlinks
-        # https://github.com/conda/conda-build/issues/3351
-        # https://github.com/libarchive/libarchive/pull/1030
-        if tarball.lower().endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.z', '.tar.xz')):
-            _tar_xf_fallback(tarball, dir_path)
-        else:
-            raise
+    with _tar_xf_lock:
+        try:
+            with tmp_chdir(os.path.realpath(dir_path)):
+                libarchive.extract_file(tarball, flags)
+        except libarchive.exception.ArchiveError:
+            # try again, maybe we are on Windows and the archive contains symlinks
+            # https://github.com/conda/conda-build/issues/3351
+            # https://github.com/libarchive/libarchive/pull/1030
+            if tarball.lower().endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.z',
+                                         '.tar.xz')):
+                _tar_xf_fallback(tarball, dir_path)
+            else:
+                raise
 
 
 def file_info(path):
@@ -1153,25 +1356,41 @@ def get_skip_message(m):
         {k: m.config.variant[k] for k in m.get_used_vars()}))
 
 
+def _read_extracted_file(resolved_file_path):
+    if os.path.exists(resolved_file_path):
+        # TODO :: Remove this text-mode load. Files are binary.
+        try:
+            with open(resolved_file_path) as f:
+                content = f.read()
+        except UnicodeDecodeError:
+            with open(resolved_file_path, 'rb') as f:
+                content = f.read()
+    else:
+        content = False
+    return content
+
+
 def package_has_file(package_path, file_path, refresh_mode='modified'):
     # This version does nothing to the package cache.
+    import conda_package_handling.api
     with TemporaryDirectory() as td:
         if file_path.startswith('info'):
             conda_package_handling.api.extract(package_path, dest_dir=td, components='info')
         else:
             conda_package_handling.api.extract(package_path, dest_dir=td, components=file_path)
-        resolved_file_path = os.path.join(td, file_path)
-        if os.path.exists(resolved_file_path):
-            # TODO :: Remove this text-mode load. Files are binary.
-            try:
-                with open(resolved_file_path) as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                with open(resolved_file_path, 'rb') as f:
-                    content = f.read()
-        else:
-            content = False
-        return content
+        return _read_extracted_file(os.path.join(td, file_path))
+
+
+def package_has_files(package_path, file_paths):
+    """package_has_file for several files under info/, extracting the package's info section
+    only once.  Returns a dict of file path -> content (False for missing files)."""
+    if not all(file_path.startswith('info') for file_path in file_paths):
+        return {file_path: package_has_file(package_path, file_path) for file_path in file_paths}
+    import conda_package_handling.api
+    with TemporaryDirectory() as td:
+        conda_package_handling.api.extract(package_path, dest_dir=td, components='info')
+        return {file_path: _read_extracted_file(os.path.join(td, file_path))
+                for file_path in file_paths}
 
 
 def ensure_list(arg, include_dict=True):
@@ -1419,6 +1638,143 @@ def represent_hashabledict(dumper, data):
 yaml.add_representer(HashableDict, represent_hashabledict)
 
 
+class CopyOnWriteDict(dict):
+    """A dict whose values may be shared with other CopyOnWriteDicts.
+
+    fork() returns a copy holding the same value objects as the original, as long as nobody
+    outside could have a reference to them.  Each side deep-copies a shared value the first
+    time it hands it out, so nested data (metadata sections, variant subkeys) that isn't
+    touched is never copied.  Values that have been handed out, set, or passed to the
+    constructor may be changed through those references at any time, so fork() copies them
+    right away.  Reads that go straight to the C-level dict API (json.dumps, ==) see the
+    shared values without copying them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CopyOnWriteDict, self).__init__(*args, **kwargs)
+        self._shared = set()
+        # keys whose values may be referenced from outside this dict
+        self._exposed = set(dict.keys(self))
+
+    @classmethod
+    def fork(cls, d):
+        """Return a copy of d.  If d is a CopyOnWriteDict, the copy shares the values it has
+        never handed out with it."""
+        if not isinstance(d, cls):
+            d = cls(d)
+        new = cls()
+        for key, value in dict.items(d):
+            # Python 2's dict() and dict.update() read subclasses through the C API, which
+            #    would hand out shared values without copying them, so nothing is shared there
+            if key in d._exposed or not PY3:
+                value = copy.deepcopy(value)
+            else:
+                d._shared.add(key)
+                new._shared.add(key)
+            dict.__setitem__(new, key, value)
+        return new
+
+    def _own(self, key):
+        if key in self._shared:
+            self._shared.discard(key)
+            if dict.__contains__(self, key):
+                dict.__setitem__(self, key, copy.deepcopy(dict.__getitem__(self, key)))
+        self._exposed.add(key)
+
+    def _own_all(self):
+        for key in list(dict.keys(self)):
+            self._own(key)
+
+    def __getitem__(self, key):
+        self._own(key)
+        return dict.__getitem__(self, key)
+
+    def __iter__(self):
+        # overriding this keeps dict(self) and dict.update(self) off the C fast path on
+        #    Python 3, which would hand out shared values without copying them
+        return dict.__iter__(self)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        self._shared.discard(key)
+        self._exposed.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._shared.discard(key)
+        self._exposed.discard(key)
+        dict.__delitem__(self, key)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *args):
+        self._own(key)
+        self._exposed.discard(key)
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        self._own_all()
+        key, value = dict.popitem(self)
+        self._exposed.discard(key)
+        return key, value
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)  # a CopyOnWriteDict argument copies its shared values here
+        self._shared.difference_update(other)
+        self._exposed.update(other)
+        dict.update(self, other)
+
+    def clear(self):
+        self._shared.clear()
+        self._exposed.clear()
+        dict.clear(self)
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    if not PY3:
+        def itervalues(self):
+            self._own_all()
+            return dict.itervalues(self)
+
+        def iteritems(self):
+            self._own_all()
+            return dict.iteritems(self)
+
+    def copy(self):
+        self._own_all()
+        return dict.copy(self)
+
+    def __copy__(self):
+        return self.__class__(self)
+
+    def __deepcopy__(self, memo):
+        result = self.__class__()
+        memo[id(self)] = result
+        for key, value in dict.items(self):
+            dict.__setitem__(result, copy.deepcopy(key, memo), copy.deepcopy(value, memo))
+        return result
+
+    def __reduce__(self):
+        return self.__class__, (dict(dict.items(self)), )
+
+
+yaml.add_representer(CopyOnWriteDict, lambda dumper, data: dumper.represent_dict(data))
+
+
 # http://stackoverflow.com/a/10743550/1170370
 @contextlib.contextmanager
 def capture():
@@ -1574,16 +1930,12 @@ def rm_rf(path, config=None):
             if on_win:
                 subprocess.check_call('rd /s /q {}'.format(path), shell=True)
             else:
+                # an empty folder of our own rather than .empty in whatever the cwd is
+                empty = tempfile.mkdtemp()
                 try:
-                    os.makedirs('.empty')
-                except:
-                    pass
-                del_dir_cmd = 'rsync -a --delete .empty {}/'
-                subprocess.check_call(del_dir_cmd.format(path).split())
-                try:
-                    shutil.rmtree('.empty')
-                except:
-                    pass
+                    subprocess.check_call(['rsync', '-a', '--delete', empty + '/', path + '/'])
+                finally:
+                    shutil.rmtree(empty, ignore_errors=True)
         # we don't really care about errors that much. People can and should
         #     clean out their folders once in a while with "purge"
         except:
@@ -1598,6 +1950,87 @@ def rm_rf(path, config=None):
         _rm_rf(path)
 
 
+# folders renamed out of the way by rm_rf_background, and the deletions still running on them
+_trash_lock = Lock()
+_trash_executor = None
+_trash_futures = []
+_trashed = []
+
+
+def _delete_trashed(path):
+    def onerror(func, failed_path, exc_info):
+        # read-only entries (git objects, files on Windows) need write permission to go
+        try:
+            os.chmod(failed_path, stat.S_IREAD | stat.S_IWRITE | stat.S_IEXEC)
+            func(failed_path)
+        except (IOError, OSError):
+            pass
+
+    if isdir(path) and not islink(path):
+        shutil.rmtree(path, onerror=onerror)
+    else:
+        try:
+            os.unlink(path)
+        except (IOError, OSError):
+            pass
+
+
+def rm_rf_background(path, config=None, trash_dir=None):
+    """Remove path without waiting for its contents to be deleted.
+
+    The folder is renamed into trash_dir (a .conda_trash folder next to it by default), so it is
+    gone - and can be created again - as soon as this returns.  Its top-level entries are then
+    deleted in parallel on a thread pool.  Anything that can't be renamed that way (files,
+    another filesystem, files in use on Windows) goes through rm_rf instead.  Pending deletions
+    are joined by wait_for_background_deletions, which also runs at exit."""
+    global _trash_executor
+    if not isdir(path) or islink(path):
+        return rm_rf(path, config)
+    path = os.path.normpath(abspath(path))
+    trash_dir = trash_dir or join(dirname(path), '.conda_trash')
+    try:
+        if not isdir(trash_dir):
+            try:
+                os.makedirs(trash_dir)
+            except OSError:
+                if not isdir(trash_dir):
+                    raise
+        trashed = tempfile.mkdtemp(prefix=os.path.basename(path) + '-', dir=trash_dir)
+        os.rename(path, join(trashed, 'contents'))
+    except (IOError, OSError):
+        return rm_rf(path, config)
+    # path no longer exists, so this only clears it from conda's caches
+    rm_rf(path, config)
+
+    with _trash_lock:
+        if _trash_executor is None:
+            _trash_executor = ThreadPoolExecutor(max(4, cpu_count()))
+        _trashed.append(trashed)
+        contents = join(trashed, 'contents')
+        for entry in os.listdir(contents):
+            _trash_futures.append(_trash_executor.submit(_delete_trashed, join(contents, entry)))
+
+
+def wait_for_background_deletions():
+    """Block until everything passed to rm_rf_background has been deleted."""
+    with _trash_lock:
+        futures = list(_trash_futures)
+        trashed = list(_trashed)
+        del _trash_futures[:]
+        del _trashed[:]
+    wait(futures)
+    for folder in trashed:
+        _delete_trashed(folder)
+        try:
+            # only goes once no other build has anything left in there
+            os.rmdir(dirname(folder))
+        except OSError:
+            pass
+
+
+atexit.register(wait_for_background_deletions)
+
+
 # https://stackoverflow.com/a/31459386/1170370
 class LessThanFilter(logging.Filter):
     def __init__(self, exclusive_maximum, name=""):
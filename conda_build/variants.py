@@ -3,9 +3,9 @@ ending up with a configuration matrix"""
 
 from collections import OrderedDict
 from copy import copy
+from functools import partial
 from itertools import product
 import os.path
-from pkg_resources import parse_version
 import re
 import sys
 
@@ -15,6 +15,7 @@ from conda_build.conda_interface import string_types
 from conda_build.conda_interface import subdir
 from conda_build.conda_interface import cc_conda_build
 from conda_build.conda_interface import memoized
+from conda_build.conda_interface import VersionOrder
 from conda_build.utils import ensure_list, get_logger, islist, on_win, trim_empty_keys
 
 DEFAULT_VARIANTS = {
@@ -86,9 +87,9 @@ SUFFIX_MAP = {'PY': 'python',
 def _get_default_compilers(platform, py_ver):
     compilers = DEFAULT_COMPILERS[platform].copy()
     if platform == 'win':
-        if parse_version(py_ver) >= parse_version('3.5'):
+        if VersionOrder(py_ver) >= VersionOrder('3.5'):
             py_ver = '3.5'
-        elif parse_version(py_ver) <= parse_version('3.2'):
+        elif VersionOrder(py_ver) <= VersionOrder('3.2'):
             py_ver = '2.7'
         compilers['c'] = compilers['c'][py_ver]
         compilers['cxx'] = compilers['cxx'][py_ver]
@@ -113,7 +114,7 @@ def parse_config_file(path, config):
     from conda_build.metadata import select_lines, ns_cfg
     with open(path) as f:
         contents = f.read()
-    contents = select_lines(contents, ns_cfg(config), variants_in_place=False)
+    contents = select_lines(contents, partial(ns_cfg, config), variants_in_place=False)
     content = yaml.load(contents, Loader=yaml.loader.BaseLoader) or {}
     trim_empty_keys(content)
     return content
@@ -428,6 +429,14 @@ def _get_explode_keys(spec, passthru_keys=None, zip_keys=None, extend_keys=None)
 def filter_by_key_value(variants, key, values, source_name):
     """variants is the exploded out list of dicts, with one value per key in each dict.
     key and values come from subsequent variants before they are exploded out."""
+    if isinstance(variants, VariantMatrix):
+        reduced = variants.filter(key, values)
+        if len(reduced) < len(variants):
+            get_logger(__name__).debug(
+                'Filtered {n} variants with key {key} not matching target value(s) ({tgt_vals}) '
+                'from {source_name}'.format(n=len(variants) - len(reduced), key=key,
+                                            tgt_vals=values, source_name=source_name))
+        return reduced
     reduced_variants = []
     if hasattr(values, 'keys'):
         reduced_variants = variants
@@ -490,30 +499,92 @@ def explode_variants(spec):
     :return: Exploded specification
     :rtype: `list` of `dict`
     """
-    zip_keys = _get_zip_keys(spec)
-
-    # key/values from spec that do not explode
-    passthru_keys = _get_passthru_keys(spec, zip_keys)
-    passthru = {k: spec[k] for k in passthru_keys if spec[k] or spec[k] == ""}
-
-    # key/values from spec that do explode
-    explode_keys = _get_explode_keys(spec, passthru_keys)
-    explode = {
-        (k,): [ensure_list(v, include_dict=False) for v in ensure_list(spec[k])]
-        for k in explode_keys.difference(*zip_keys)
-    }
-    explode.update({zg: list(zip(*(ensure_list(spec[k]) for k in zg))) for zg in zip_keys})
-    trim_empty_keys(explode)
-
-    # Cartesian Product of dict of lists
-    # http://stackoverflow.com/a/5228294/1170370
-    # dict.keys() and dict.values() orders are the same even prior to Python 3.6
-    variants = []
-    for values in product(*explode.values()):
-        variant = {k: copy(v) for k, v in passthru.items()}
-        variant.update({k: v for zg, zv in zip(explode, values) for k, v in zip(zg, zv)})
-        variants.append(variant)
-    return variants
+    return VariantMatrix(spec).to_list()
+
+
+def _value_matches(value, values):
+    # same test as filter_by_key_value
+    return value is not None and value in values
+
+
+class VariantMatrix(object):
+    """
+    The variants of a spec, kept as the axes of their Cartesian product rather than as a
+    list of dicts.
+
+    Each axis is a group of keys (one key, or one group of zip_keys) with the rows of values
+    it can take.  Filtering on a key only drops rows from the axis holding it, so the matrix
+    can be narrowed down without ever building the full product.  Iterating (or to_list)
+    gives the same dicts, in the same order, as explode_variants always has.
+    """
+
+    def __init__(self, spec=None):
+        self.passthru = {}
+        self.axes = OrderedDict()
+        if spec is None:
+            return
+        zip_keys = _get_zip_keys(spec)
+
+        # key/values from spec that do not explode
+        passthru_keys = _get_passthru_keys(spec, zip_keys)
+        self.passthru = {k: spec[k] for k in passthru_keys if spec[k] or spec[k] == ""}
+
+        # key/values from spec that do explode
+        explode_keys = _get_explode_keys(spec, passthru_keys)
+        explode = {
+            (k,): [ensure_list(v, include_dict=False) for v in ensure_list(spec[k])]
+            for k in explode_keys.difference(*zip_keys)
+        }
+        explode.update({zg: list(zip(*(ensure_list(spec[k]) for k in zg))) for zg in zip_keys})
+        trim_empty_keys(explode)
+        # dict.keys() and dict.values() orders are the same even prior to Python 3.6
+        self.axes.update(explode)
+
+    def _with_axes(self, axes):
+        new = VariantMatrix()
+        new.passthru = self.passthru
+        new.axes = axes
+        return new
+
+    def __len__(self):
+        length = 1
+        for rows in self.axes.values():
+            length *= len(rows)
+        return length
+
+    def __iter__(self):
+        # Cartesian Product of dict of lists
+        # http://stackoverflow.com/a/5228294/1170370
+        for values in product(*self.axes.values()):
+            variant = {k: copy(v) for k, v in self.passthru.items()}
+            variant.update({k: v for zg, zv in zip(self.axes, values) for k, v in zip(zg, zv)})
+            yield variant
+
+    def to_list(self):
+        return list(self)
+
+    def filter(self, key, values):
+        """Keep only the variants whose value for key is in values (see filter_by_key_value)"""
+        if hasattr(values, 'keys'):
+            return self
+        for group, rows in self.axes.items():
+            if key in group:
+                idx = tuple(group).index(key)
+                axes = self.axes.copy()
+                axes[group] = [row for row in rows if _value_matches(row[idx], values)]
+                return self._with_axes(axes)
+        if _value_matches(self.passthru.get(key), values):
+            return self
+        return self._with_axes(OrderedDict((group, []) for group in self.axes) or
+                               OrderedDict([((key, ), [])]))
+
+    def project(self, keys):
+        """Reduce every axis that doesn't involve any of keys to its first row.  This is the
+        variant set needed when only keys affect the result."""
+        keys = set(keys)
+        return self._with_axes(OrderedDict(
+            (group, rows if keys.intersection(group) else rows[:1])
+            for group, rows in self.axes.items()))
 
 
 # temporary backport for other places in cond_build
@@ -604,17 +675,17 @@ def filter_combined_spec_to_used_keys(combined_spec, specs):
     specs = specs.copy()
     del specs['internal_defaults']
 
-    # TODO: act here?
-    combined_spec = explode_variants(combined_spec)
+    # filter the axes of the matrix, and only build the variant dicts that survive
+    matrix = VariantMatrix(combined_spec)
     for source, source_specs in reversed(specs.items()):
         for k, vs in source_specs.items():
             if k not in extend_keys:
                 # when filtering ends up killing off all variants, we just ignore that.  Generally,
                 #    this arises when a later variant config overrides, rather than selects a
                 #    subspace of earlier configs
-                combined_spec = (filter_by_key_value(combined_spec, k, vs, source_name=source) or
-                                 combined_spec)
-    return combined_spec
+                matrix = (filter_by_key_value(matrix, k, vs, source_name=source) or
+                          matrix)
+    return matrix.to_list()
 
 
 def get_package_variants(recipedir_or_metadata, config=None, variants=None):
@@ -633,42 +704,133 @@ def get_vars(variants, loop_only=False):
     return loop_vars
 
 
+def _variable_used_in_lines(v, recipe_lines, selectors_only=False):
+    """Regex search for a single variant key.  Only used for keys that RecipeTextIndex
+    can't answer (keys that aren't plain identifiers)."""
+    all_res = []
+    compiler_match = re.match(r'(.*?)_compiler(_version)?$', v)
+    if compiler_match and not selectors_only:
+        compiler_lang = compiler_match.group(1)
+        compiler_regex = (
+            r"\{\s*compiler\([\'\"]%s[\"\'][^\{]*?\}" % re.escape(compiler_lang)
+        )
+        all_res.append(compiler_regex)
+        variant_lines = [line for line in recipe_lines if v in line or compiler_lang in line]
+    else:
+        variant_lines = [line for line in recipe_lines if v in line.replace('-', '_')]
+    if not variant_lines:
+        return False
+    v_regex = re.escape(v)
+    v_req_regex = '[-_]'.join(map(re.escape, v.split('_')))
+    variant_regex = r"\{\s*(?:pin_[a-z]+\(\s*?['\"])?%s[^'\"]*?\}\}" % v_regex
+    selector_regex = r"^[^#\[]*?\#?\s\[[^\]]*?(?<![_\w\d])%s[=\s<>!\]]" % v_regex
+    conditional_regex = r"(?:^|[^\{])\{%\s*(?:el)?if\s*.*" + v_regex + r"\s*(?:[^%]*?)?%\}"
+    # plain req name, no version spec.  Look for end of line after name, or comment or selector
+    requirement_regex = r"^\s+\-\s+%s\s*(?:\s[\[#]|$)" % v_req_regex
+    if selectors_only:
+        all_res.insert(0, selector_regex)
+    else:
+        all_res.extend([variant_regex, requirement_regex, conditional_regex])
+    # consolidate all re's into one big one for speedup
+    all_res = r"|".join(all_res)
+    return any(re.search(all_res, line) for line in variant_lines)
+
+
+_identifier_re = re.compile(r'^\w+$')
+# {{ var ... }} and {{ pin_xxx('var' ... }}; the rest of the line is checked for the closing braces
+_jinja_head_re = re.compile(r"\{\s*(\w+)")
+_jinja_pin_head_re = re.compile(r"\{\s*pin_[a-z]+\(\s*?['\"](\w+)")
+_quote_re = re.compile(r"['\"]")
+_selector_body_re = re.compile(r"^[^#\[]*?\#?\s\[([^\]]*\]?)")
+_selector_name_re = re.compile(r"(?<![_\w\d])(\w+)(?=[=\s<>!\]])")
+_conditional_start_re = re.compile(r"(?:^|[^\{])\{%\s*(?:el)?if")
+_requirement_name_re = re.compile(r"^\s+\-\s+(\S+?)\s*(?:\s[\[#]|$)")
+_compiler_lang_re = re.compile(r"\{\s*compiler\(['\"]([^'\"]*)[\"'][^\{]*?\}")
+_compiler_key_re = re.compile(r'(.*?)_compiler(_version)?$')
+
+
+class RecipeTextIndex(object):
+    """All the places recipe text can refer to a variant key, tokenized once per text.
+
+    The sets here are built to give the same answers as the per-key regexes in
+    _variable_used_in_lines:
+
+    jinja_names: every prefix of the first word of a {{ ... }} (or {{ pin_xxx('...') }})
+        expression, as the regex only anchors the start of the key
+    selector_names: whole words inside the first [...] selector of each line
+    conditional_tails: text of {% if/elif ... %} tags that may contain a key (substring match)
+    requirement_names: bare requirement names, with dashes normalized to underscores
+    compiler_langs: languages passed to compiler('...')
+    """
+
+    def __init__(self, recipe_text):
+        self.jinja_names = set()
+        self.selector_names = set()
+        self.conditional_tails = []
+        self.requirement_names = set()
+        self.compiler_langs = set()
+        for line in recipe_text.splitlines():
+            if '{' in line:
+                self._index_jinja(line)
+            if '[' in line:
+                match = _selector_body_re.match(line)
+                if match:
+                    self.selector_names.update(_selector_name_re.findall(match.group(1)))
+            if line.lstrip().startswith('-'):
+                match = _requirement_name_re.match(line)
+                if match:
+                    self.requirement_names.add(match.group(1).replace('-', '_'))
+
+    def _index_jinja(self, line):
+        for regex in (_jinja_head_re, _jinja_pin_head_re):
+            for match in regex.finditer(line):
+                name = match.group(1)
+                tail = _quote_re.split(line[match.end():], 1)[0]
+                if '}}' in tail:
+                    self.jinja_names.update(name[:i] for i in range(1, len(name) + 1))
+        self.compiler_langs.update(_compiler_lang_re.findall(line))
+        if '{%' in line:
+            for match in _conditional_start_re.finditer(line):
+                start = match.end()
+                end = line.find('%}', start)
+                while end != -1:
+                    tail = line[start:end]
+                    self.conditional_tails.append(tail[tail.rfind('%') + 1:])
+                    end = line.find('%}', end + 1)
+
+    def used_variables(self, keys, selectors_only=False):
+        keys = set(keys)
+        if selectors_only:
+            return keys & self.selector_names
+        used = keys & (self.jinja_names | self.requirement_names)
+        if self.conditional_tails:
+            used.update(k for k in keys - used
+                        if any(k in tail for tail in self.conditional_tails))
+        if self.compiler_langs:
+            for k in keys - used:
+                match = _compiler_key_re.match(k)
+                if match and match.group(1) in self.compiler_langs:
+                    used.add(k)
+        return used
+
+
+@memoized
+def get_recipe_text_index(recipe_text):
+    return RecipeTextIndex(recipe_text)
+
+
 @memoized
 def find_used_variables_in_text(variant, recipe_text, selectors_only=False):
-    used_variables = set()
-    recipe_lines = recipe_text.splitlines()
-    for v in variant:
-        all_res = []
-        compiler_match = re.match(r'(.*?)_compiler(_version)?$', v)
-        if compiler_match and not selectors_only:
-            compiler_lang = compiler_match.group(1)
-            compiler_regex = (
-                r"\{\s*compiler\([\'\"]%s[\"\'][^\{]*?\}" % re.escape(compiler_lang)
-            )
-            all_res.append(compiler_regex)
-            variant_lines = [line for line in recipe_lines if v in line or compiler_lang in line]
-        else:
-            variant_lines = [line for line in recipe_lines if v in line.replace('-', '_')]
-        if not variant_lines:
-            continue
-        v_regex = re.escape(v)
-        v_req_regex = '[-_]'.join(map(re.escape, v.split('_')))
-        variant_regex = r"\{\s*(?:pin_[a-z]+\(\s*?['\"])?%s[^'\"]*?\}\}" % v_regex
-        selector_regex = r"^[^#\[]*?\#?\s\[[^\]]*?(?<![_\w\d])%s[=\s<>!\]]" % v_regex
-        conditional_regex = r"(?:^|[^\{])\{%\s*(?:el)?if\s*.*" + v_regex + r"\s*(?:[^%]*?)?%\}"
-        # plain req name, no version spec.  Look for end of line after name, or comment or selector
-        requirement_regex = r"^\s+\-\s+%s\s*(?:\s[\[#]|$)" % v_req_regex
-        if selectors_only:
-            all_res.insert(0, selector_regex)
-        else:
-            all_res.extend([variant_regex, requirement_regex, conditional_regex])
-        # consolidate all re's into one big one for speedup
-        all_res = r"|".join(all_res)
-        if any(re.search(all_res, line) for line in variant_lines):
-            used_variables.add(v)
-            if v in ('c_compiler', 'cxx_compiler'):
-                if 'CONDA_BUILD_SYSROOT' in variant:
-                    used_variables.add('CONDA_BUILD_SYSROOT')
+    identifiers = [v for v in variant if _identifier_re.match(v)]
+    used_variables = get_recipe_text_index(recipe_text).used_variables(
+        identifiers, selectors_only=selectors_only)
+    others = [v for v in variant if not _identifier_re.match(v)]
+    if others:
+        recipe_lines = recipe_text.splitlines()
+        used_variables.update(v for v in others
+                              if _variable_used_in_lines(v, recipe_lines, selectors_only))
+    if used_variables & {'c_compiler', 'cxx_compiler'} and 'CONDA_BUILD_SYSROOT' in variant:
+        used_variables.add('CONDA_BUILD_SYSROOT')
     return used_variables
 
 
@@ -1587,3 +1587,13 @@ def test_script_env_warnings(testing_config, recwarn):
         assert_keyword('<hidden>')
     finally:
         os.environ.pop(token)
+
+
+@pytest.mark.sanity
+def test_build_jobs_builds_dependencies_first(testing_config):
+    recipes = [os.path.join(metadata_dir, name) for name in
+               ('_recursive-build-two-layers', '_recursive-build-a', '_recursive-build-b')]
+    testing_config.build_jobs = 2
+    outputs = api.build(recipes, config=testing_config)
+    assert len(outputs) == 3
+    assert all(os.path.isfile(output) for output in outputs)
@@ -5,6 +5,7 @@ should go in test_render.py
 
 import os
 import re
+import shutil
 import sys
 
 import mock
@@ -246,3 +247,52 @@ def test_run_exports_from_repo_without_channeldata(testing_config):
     # these two will be missing if run_exports has failed.
     assert ms[0][0].meta['requirements']['host'] == ["exporty"]
     assert ms[0][0].meta['requirements']['run'] == ["exporty"]
+
+
+def test_parallel_variant_rendering_matches_serial(testing_config):
+    recipe = os.path.join(thisdir, 'test-recipes', 'variants', '03_numpy_matrix')
+    serial = api.render(recipe, config=testing_config, finalize=False, bypass_env_check=True)
+    testing_config.render_jobs = 2
+    parallel = api.render(recipe, config=testing_config, finalize=False, bypass_env_check=True)
+    assert len(parallel) == len(serial) == 4
+    assert [m.dist() for m, _, _ in parallel] == [m.dist() for m, _, _ in serial]
+    assert ([m.config.variant['python'] for m, _, _ in parallel] ==
+            [m.config.variant['python'] for m, _, _ in serial])
+
+
+def test_render_cache_reuses_unchanged_recipe(testing_workdir, testing_config):
+    recipe = os.path.join(testing_workdir, 'recipe')
+    shutil.copytree(os.path.join(thisdir, 'test-recipes', 'variants', '03_numpy_matrix'), recipe)
+    testing_config.render_cache = True
+    first = api.render(recipe, config=testing_config, finalize=False, bypass_env_check=True)
+    assert os.listdir(testing_config.render_cache_dir)
+
+    with mock.patch('conda_build.render.render_recipe') as render_recipe:
+        cached = api.render(recipe, config=testing_config, finalize=False, bypass_env_check=True)
+    assert not render_recipe.called
+    assert [m.dist() for m, _, _ in cached] == [m.dist() for m, _, _ in first]
+
+    def key():
+        return render.render_cache_key(recipe, testing_config, permit_unsatisfiable_variants=True,
+                                       finalize=False, bypass_env_check=True)
+    assert render.load_cached_render(key(), testing_config)
+    with open(os.path.join(recipe, 'meta.yaml'), 'a') as f:
+        f.write('\n# touched\n')
+    assert render.load_cached_render(key(), testing_config) is None
+
+
+def test_render_cache_key_does_not_load_the_index(testing_workdir, testing_config):
+    recipe = os.path.join(testing_workdir, 'recipe')
+    shutil.copytree(os.path.join(thisdir, 'test-recipes', 'variants', '03_numpy_matrix'), recipe)
+    with mock.patch('conda_build.render.get_build_index') as get_build_index:
+        key = render.render_cache_key(recipe, testing_config, env_check=True)
+        assert key == render.render_cache_key(recipe, testing_config, env_check=True)
+    assert not get_build_index.called
+
+    # a change to the local channel's repodata makes it a different key
+    repodata = os.path.join(testing_config.bldpkgs_dir, 'repodata.json')
+    if not os.path.isdir(os.path.dirname(repodata)):
+        os.makedirs(os.path.dirname(repodata))
+    with open(repodata, 'w') as f:
+        f.write('{"packages": {}}')
+    assert render.render_cache_key(recipe, testing_config, env_check=True) != key
@@ -9,7 +9,7 @@ import sys
 
 import pytest
 
-from conda_build import build, api
+from conda_build import build, api, utils
 from conda_build.utils import on_win
 
 from .utils import metadata_dir, get_noarch_python_meta
@@ -245,3 +245,88 @@ def test_rewrite_output(testing_workdir, testing_config, capsys):
         assert "LIBDIR=$PREFIX/lib" in stdout
         assert "PWD=$SRC_DIR" in stdout
         assert "BUILD_PREFIX=$BUILD_PREFIX" in stdout
+
+
+def test_recipe_dependency_graph(testing_config):
+    recipes = [os.path.join(metadata_dir, name) for name in
+               ('_recursive-build-two-layers', '_recursive-build-a', '_recursive-build-b')]
+    two_layers, a, b = recipes
+    assert build._recipe_dependency_graph(recipes, testing_config) == {
+        two_layers: {a}, a: {b}, b: set()}
+    assert not build._has_cycle({two_layers: {a}, a: {b}, b: set()})
+    assert build._has_cycle({two_layers: {a}, a: {b}, b: {two_layers}})
+
+
+def test_queued_packages_are_renamed_into_output_folder(testing_workdir, testing_config, mocker):
+    def create(prefix, files, fn, out_folder, **kw):
+        with open(os.path.join(out_folder, fn), 'w') as f:
+            f.write('\n'.join(files))
+    create = mocker.patch('conda_package_handling.api.create', side_effect=create)
+    register_package = mocker.patch.object(build, 'register_package')
+    testing_config.package_jobs = 2
+    testing_config.verify = False
+    staging = os.path.join(testing_workdir, '_h_env_packaging')
+    prefix = os.path.join(staging, 'prefix')
+    os.makedirs(prefix)
+    final_output = os.path.join(testing_workdir, 'output', 'noarch', 'pkg-1.0-0.conda')
+
+    build._queue_package('pkg', 2, prefix, ['info/index.json'], final_output, testing_config,
+                         [], staging)
+    assert build._is_queued(testing_config.build_id, final_output)
+    assert build.wait_for_packages(testing_config.build_id, {'other-pkg'}) == []
+    assert build.wait_for_packages('another-build') == []
+    assert build.wait_for_packages(testing_config.build_id, {'pkg'}) == [final_output]
+    register_package.assert_called_once_with(final_output, verbose=testing_config.debug)
+    assert not build._is_queued(testing_config.build_id, final_output)
+    assert set(create.call_args[1]) & {'compression_tuple', 'compressor'}
+    # no partial archives are left next to the package, and the staged prefix goes away
+    assert os.listdir(os.path.dirname(final_output)) == ['pkg-1.0-0.conda']
+    utils.wait_for_background_deletions()
+    assert not os.path.exists(staging)
+
+
+def test_conda_compression_kwargs(testing_config, mocker):
+    mocker.patch.object(build, '_cph_major_version', 1)
+    # compression_tuple is left alone unless the zstd settings ask for something else
+    testing_config.compression_tuple = ('.tar.zst', 'zstd', 'zstd:compression-level=19')
+    testing_config.zstd_compression_threads = 1
+    assert build._conda_compression_kwargs(testing_config) == {
+        'compression_tuple': ('.tar.zst', 'zstd', 'zstd:compression-level=19')}
+    testing_config.zstd_compression_level = 3
+    testing_config.zstd_compression_threads = 2
+    assert build._conda_compression_kwargs(testing_config) == {
+        'compression_tuple': ('.tar.zst', 'zstd', 'zstd:compression-level=3,zstd:threads=2')}
+    testing_config.zstd_compression_threads = 1
+    assert build._conda_compression_kwargs(testing_config) == {
+        'compression_tuple': ('.tar.zst', 'zstd', 'zstd:compression-level=3')}
+
+
+def test_conda_compression_kwargs_cph2_level_from_compression_tuple(testing_config, mocker):
+    mocker.patch.object(build, '_cph_major_version', 2)
+    zstandard = mocker.MagicMock()
+    mocker.patch.dict(sys.modules, {'zstandard': zstandard})
+    testing_config.compression_tuple = ('.tar.zst', 'zstd', 'zstd:compression-level=19')
+    testing_config.zstd_compression_threads = 2
+    build._conda_compression_kwargs(testing_config)['compressor']()
+    zstandard.ZstdCompressor.assert_called_with(level=19, threads=2)
+    testing_config.zstd_compression_level = 3
+    build._conda_compression_kwargs(testing_config)['compressor']()
+    zstandard.ZstdCompressor.assert_called_with(level=3, threads=2)
+
+
+def test_failed_build_does_not_leave_queued_packages(testing_workdir, testing_config, mocker):
+    def create(prefix, files, fn, out_folder, **kw):
+        raise ValueError("compression failed")
+    mocker.patch('conda_package_handling.api.create', side_effect=create)
+    testing_config.verify = False
+    prefix = os.path.join(testing_workdir, 'prefix')
+    os.makedirs(prefix)
+    final_output = os.path.join(testing_workdir, 'output', 'noarch', 'pkg-1.0-0.conda')
+
+    with pytest.raises(RuntimeError):
+        with build._packages_queued_by(testing_config.build_id):
+            build._queue_package('pkg', 2, prefix, [], final_output, testing_config, [], None)
+            raise RuntimeError("output script failed")
+    # the packaging error was logged rather than left for the next build
+    assert testing_config.build_id not in build._pending_packages
+    assert build.wait_for_packages(testing_config.build_id) == []
@@ -6,6 +6,7 @@ from glob import glob
 import json
 import os
 import re
+import subprocess
 import sys
 import yaml
 
@@ -33,6 +34,19 @@ import conda_build.cli.main_inspect as main_inspect
 import conda_build.cli.main_index as main_index
 
 
+# modules that only some code paths need, and that are slow enough to import that the CLI
+#    shouldn't load them just to parse arguments
+DEFERRED_MODULES = ('conda_build.build', 'conda_build.post', 'conda_build.source',
+                    'conda_build.os_utils.liefldd', 'lief', 'bs4', 'jinja2')
+
+
+@pytest.mark.parametrize('module', ['conda_build.cli.main_build', 'conda_build.cli.main_render'])
+def test_cli_startup_defers_heavy_imports(module):
+    code = ("import sys; import {}; "
+            "print(' '.join(m for m in {!r} if m in sys.modules))".format(module, DEFERRED_MODULES))
+    assert not subprocess.check_output([sys.executable, '-c', code]).decode('utf-8').split()
+
+
 @pytest.mark.sanity
 def test_build():
     args = ['--no-anaconda-upload', os.path.join(metadata_dir, "empty_sections"), '--no-activate',
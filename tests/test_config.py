@@ -91,3 +91,23 @@ def test_get_or_create_config_does_not_change_passed_in_config(config):
     newconfig = get_or_merge_config(config, dirty=True)
     assert newconfig.dirty is True
     assert config.dirty is False
+
+
+def test_copy_leaves_the_variant_alone(config):
+    config.variant = {'python': '3.6', 'zip_keys': [['python', 'numpy']]}
+    config.variants = [config.variant, {'python': '2.7'}]
+    variant, variants = config.variant, list(config.variants)
+    for _ in range(2):
+        new = config.copy()
+        assert config.variant is variant
+        assert all(a is b for a, b in zip(config.variants, variants))
+        assert new.variant is new.variants[0]
+
+        new.variant['zip_keys'][0].append('perl')
+        new.variants[1]['python'] = '3.7'
+        assert config.variant['zip_keys'] == [['python', 'numpy']]
+        assert config.variants[1] == {'python': '2.7'}
+        # copies of copies share values without leaking changes back either
+        newer = new.copy()
+        newer.variant['zip_keys'][0].append('r')
+        assert new.variant['zip_keys'] == [['python', 'numpy', 'perl']]
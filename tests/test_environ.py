@@ -1,6 +1,10 @@
 import os
+import subprocess
+
+import pytest
 
 from conda_build import environ
+from conda_build.utils import on_win
 
 
 def test_environment_creation_preserves_PATH(testing_workdir, testing_config):
@@ -8,3 +12,56 @@ def test_environment_creation_preserves_PATH(testing_workdir, testing_config):
     environ.create_env(testing_workdir, ['python'], env='host', config=testing_config,
                        subdir=testing_config.build_subdir)
     assert os.environ['PATH'] == ref_path
+
+
+def test_binary_replace_keeps_length():
+    data = b'abc/old/prefix/lib\x00xyz/old/prefix\x00'
+    new = environ._binary_replace(data, b'/old/prefix', b'/new')
+    assert len(new) == len(data)
+    assert new.startswith(b'abc/new/lib\x00')
+
+
+@pytest.mark.skipif(on_win, reason="environment templates are not used on Windows")
+def test_env_template_round_trip(testing_workdir, testing_config):
+    old_prefix = os.path.join(testing_workdir, 'old_prefix')
+    new_prefix = os.path.join(testing_workdir, 'new_prefix')
+    os.makedirs(os.path.join(old_prefix, 'bin'))
+    with open(os.path.join(old_prefix, 'bin', 'script'), 'w') as f:
+        f.write('#!{}/bin/python\n'.format(old_prefix))
+    with open(os.path.join(old_prefix, 'plain'), 'w') as f:
+        f.write('no prefix in here')
+    os.symlink(os.path.join(old_prefix, 'plain'), os.path.join(old_prefix, 'bin', 'link'))
+
+    environ.save_env_template('abc', old_prefix, testing_config)
+    assert environ.materialize_env_template('abc', new_prefix, testing_config)
+    with open(os.path.join(new_prefix, 'bin', 'script')) as f:
+        assert f.read() == '#!{}/bin/python\n'.format(new_prefix)
+    assert os.readlink(os.path.join(new_prefix, 'bin', 'link')) == os.path.join(new_prefix, 'plain')
+    assert not environ.materialize_env_template('missing', new_prefix, testing_config)
+
+
+def test_git_vars_reused_until_repo_changes(testing_workdir):
+    def git(*args):
+        subprocess.check_call(['git', '-c', 'user.name=a', '-c', 'user.email=a@b.c'] + list(args),
+                              cwd=testing_workdir)
+    git('init', '-q')
+    with open('file', 'w') as f:
+        f.write('1')
+    git('add', 'file')
+    git('commit', '-qm', 'one')
+    git_dir = os.path.join(testing_workdir, '.git')
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'GIT_FULL_HASH': str(len(calls))}
+
+    first = environ._cached_vcs_vars(git_dir, environ._git_state(git_dir), compute)
+    assert environ._cached_vcs_vars(git_dir, environ._git_state(git_dir), compute) == first
+    assert len(calls) == 1
+    git('commit', '-q', '--allow-empty', '-m', 'two')
+    environ._cached_vcs_vars(git_dir, environ._git_state(git_dir), compute)
+    git('tag', 'v1.0')
+    environ._cached_vcs_vars(git_dir, environ._git_state(git_dir), compute)
+    assert len(calls) == 3
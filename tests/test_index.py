@@ -1118,3 +1118,60 @@ def test_index_invalid_packages():
     with open(os.path.join(pkg_dir, 'channeldata.json')) as f:
         repodata = json.load(f)
     assert len(repodata['packages']) == 0
+
+
+def test_build_index_cache_keeps_subdirs_apart(testing_workdir, mocker):
+    conda_build.index.clear_build_index_cache()
+    load = mocker.patch.object(conda_build.index, '_load_build_index',
+                               side_effect=lambda sd, *args, **kw: {'subdir': sd})
+    for sd in ('noarch', 'linux-64', 'win-64'):
+        os.makedirs(os.path.join(testing_workdir, sd))
+        with open(os.path.join(testing_workdir, sd, 'repodata.json'), 'w') as f:
+            f.write('{}')
+
+    for _ in range(3):
+        for sd in ('linux-64', 'win-64'):
+            index, _, _ = conda_build.index.get_build_index(sd, testing_workdir,
+                                                            output_folder=testing_workdir)
+            assert index == {'subdir': sd}
+    assert load.call_count == 2
+
+    # newer local repodata invalidates only the affected entries
+    future = os.path.getmtime(os.path.join(testing_workdir, 'win-64', 'repodata.json')) + 10
+    os.utime(os.path.join(testing_workdir, 'win-64', 'repodata.json'), (future, future))
+    conda_build.index.get_build_index('linux-64', testing_workdir, output_folder=testing_workdir)
+    assert load.call_count == 2
+    conda_build.index.get_build_index('win-64', testing_workdir, output_folder=testing_workdir)
+    assert load.call_count == 3
+    conda_build.index.clear_build_index_cache()
+
+
+def test_register_package_without_reindex(testing_workdir, mocker):
+    pkg_dir = os.path.join(os.path.dirname(__file__), 'index_data', 'packages')
+    copy_into(os.path.join(pkg_dir, 'osx-64', 'dummy-package-1.0-0.tar.bz2'),
+              os.path.join(testing_workdir, 'osx-64', 'dummy-package-1.0-0.tar.bz2'))
+    conda_build.index.update_index(testing_workdir)
+    assert conda_build.index._local_subdir_is_consistent(testing_workdir, 'osx-64')
+
+    new_pkg = os.path.join(testing_workdir, 'osx-64', 'dummy-package-2.0-0.tar.bz2')
+    copy_into(os.path.join(pkg_dir, 'osx-64', 'dummy-package-2.0-0.tar.bz2'), new_pkg)
+    assert not conda_build.index._local_subdir_is_consistent(testing_workdir, 'osx-64')
+
+    full_index = mocker.spy(conda_build.index, 'update_index')
+    conda_build.index.register_package(new_pkg)
+    assert full_index.call_count == 0
+    assert conda_build.index._local_subdir_is_consistent(testing_workdir, 'osx-64')
+    with open(os.path.join(testing_workdir, 'osx-64', 'repodata.json')) as f:
+        repodata = json.load(f)
+    assert set(repodata['packages']) == {'dummy-package-1.0-0.tar.bz2',
+                                         'dummy-package-2.0-0.tar.bz2'}
+
+
+def test_register_package_falls_back_to_full_index(testing_workdir, mocker):
+    pkg_dir = os.path.join(os.path.dirname(__file__), 'index_data', 'packages')
+    new_pkg = os.path.join(testing_workdir, 'osx-64', 'dummy-package-1.0-0.tar.bz2')
+    copy_into(os.path.join(pkg_dir, 'osx-64', 'dummy-package-1.0-0.tar.bz2'), new_pkg)
+    full_index = mocker.spy(conda_build.index, 'update_index')
+    conda_build.index.register_package(new_pkg)
+    assert full_index.call_count == 1
+    assert conda_build.index._local_subdir_is_consistent(testing_workdir, 'osx-64')
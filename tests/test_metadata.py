@@ -2,6 +2,7 @@ import os
 import subprocess
 import sys
 
+import mock
 import pytest
 
 from conda_build.metadata import select_lines, MetaData
@@ -233,3 +234,126 @@ def test_config_member_decoupling(testing_metadata):
     b = testing_metadata.copy()
     b.config.some_member = '123'
     assert b.config.some_member != testing_metadata.config.some_member
+
+
+def test_jinja_environment_reused_with_selector_filtered_source(testing_workdir, testing_config):
+    from conda_build import metadata
+    recipe = os.path.join(testing_workdir, 'recipe')
+    os.makedirs(recipe)
+    with open(os.path.join(recipe, 'meta.yaml'), 'w') as f:
+        f.write('{% set flavor = "lin" %}  # [linux]\n'
+                '{% set flavor = "win" %}  # [win]\n'
+                '{% set flavor = "mac" %}  # [osx]\n'
+                'package:\n'
+                '  name: jinja-cache-{{ flavor }}\n'
+                '  version: 1.0\n')
+    names = []
+    for platform, arch in (('linux', '64'), ('win', '64'), ('linux', '64')):
+        config = testing_config.copy()
+        config.platform = platform
+        config.arch = arch
+        names.append(MetaData(recipe, config=config).name())
+    assert names == ['jinja-cache-lin', 'jinja-cache-win', 'jinja-cache-lin']
+    assert len([key for key in metadata.jinja_env_cache if key[0] == recipe]) == 2
+
+
+def test_jinja_environment_cache_is_bounded(testing_workdir, testing_config, mocker):
+    from conda_build import metadata
+    mocker.patch.object(metadata, 'JINJA_ENV_CACHE_SIZE', 2)
+    recipes = []
+    for i in range(3):
+        recipe = os.path.join(testing_workdir, 'recipe%d' % i)
+        os.makedirs(recipe)
+        with open(os.path.join(recipe, 'meta.yaml'), 'w') as f:
+            f.write('package:\n  name: pkg{{ 1 + %d }}\n  version: 1.0\n' % i)
+        recipes.append(recipe)
+        MetaData(recipe, config=testing_config.copy())
+    assert len(metadata.jinja_env_cache) <= 2
+    assert not [key for key in metadata.jinja_env_cache if key[0] == recipes[0]]
+    assert [key for key in metadata.jinja_env_cache if key[0] == recipes[2]]
+
+
+def test_select_lines_unknown_names_and_cached_results():
+    text = ("a  # [py >= 35 and not win]\n"
+            "b  # [unknown_var]\n"
+            "c  # [not unknown_var and int('3') == 3]\n")
+    calls = []
+
+    def namespace(py):
+        def _ns():
+            calls.append(py)
+            return {'py': py, 'win': False}
+        return _ns
+
+    assert select_lines(text, namespace(36), variants_in_place=True) == "a\nc\n"
+    assert select_lines(text, namespace(27), variants_in_place=True) == "c\n"
+    assert select_lines(text, namespace(36), variants_in_place=True) == "a\nc\n"
+    # the namespace is only built for text that has selectors
+    assert select_lines("no selectors here\n", namespace(0), variants_in_place=True) == \
+        "no selectors here\n"
+    assert calls == [36, 27, 36]
+
+
+def test_metadata_copy_is_independent(testing_metadata):
+    testing_metadata.config.variant['pin_run_as_build'] = {'python': {'max_pin': 'x.x'}}
+    testing_metadata.config.variants = [testing_metadata.config.variant]
+    b = testing_metadata.copy()
+    b.meta['requirements']['run'].append('numpy')
+    b.meta['about']['summary'] = 'changed'
+    b.config.variant['pin_run_as_build']['numpy'] = {'max_pin': 'x.x'}
+    b.config.variants[0]['pin_run_as_build']['zlib'] = {'max_pin': 'x'}
+    assert 'numpy' not in testing_metadata.meta['requirements']['run']
+    assert testing_metadata.meta['about']['summary'] == 'a test package'
+    assert testing_metadata.config.variant['pin_run_as_build'] == {'python': {'max_pin': 'x.x'}}
+    assert testing_metadata.config.variants[0] is testing_metadata.config.variant
+    assert b.config.variants[0] is b.config.variant
+
+
+
+def test_reduced_variant_set_keeps_only_used_axes(testing_metadata):
+    from conda_build.variants import explode_variants
+    testing_metadata.config.variants = explode_variants({
+        'python': ['2.7', '3.7'],
+        'zip_keys': [['cuda', 'cudnn']],
+        'cuda': ['9.2', '10.0'],
+        'cudnn': ['7.2', '7.6'],
+        'mpi': ['openmpi', 'mpich'],
+    })
+    testing_metadata.config.variant = testing_metadata.config.variants[0]
+    reduced = testing_metadata.get_reduced_variant_set(['python', 'cudnn'])
+    assert len(reduced) == 4
+    assert {(v['python'], v['cuda'], v['cudnn']) for v in reduced} == {
+        (py, cuda, cudnn) for py in ('2.7', '3.7') for cuda, cudnn in (('9.2', '7.2'),
+                                                                       ('10.0', '7.6'))}
+    assert len({v['mpi'] for v in reduced}) == 1
+
+
+
+def test_used_vars_cache_ignores_unrelated_variant_values(testing_workdir, testing_config):
+    from conda_build import metadata
+    recipe = os.path.join(testing_workdir, 'recipe')
+    os.makedirs(recipe)
+    with open(os.path.join(recipe, 'meta.yaml'), 'w') as f:
+        f.write('package:\n'
+                '  name: used-vars-cache\n'
+                '  version: 1.0\n'
+                'requirements:\n'
+                '  host:\n'
+                '    - zlib {{ zlib }}\n')
+    cache = metadata.UsedVarsCache()
+    used, misses = [], []
+    with mock.patch.object(metadata, 'used_vars_cache', cache):
+        for zlib, unrelated in (('1.2', 'a'), ('1.2', 'b'), ('1.3', 'a')):
+            config = testing_config.copy()
+            config.variant = {'zlib': zlib, 'unrelated': unrelated}
+            used.append(MetaData(recipe, config=config).get_used_vars())
+            misses.append(cache.misses)
+    assert used == [{'zlib'}] * 3
+    # a different value for a key the recipe doesn't mention is a hit; a new zlib isn't
+    assert misses[0] == misses[1] < misses[2]
+    assert cache.hits and cache.info()['size'] == misses[2]
+
+    cache = metadata.UsedVarsCache(maxsize=2)
+    for key in 'abc':
+        cache.put(key, {key})
+    assert cache.get('a') is None and cache.get('c') == {'c'} and len(cache) == 2
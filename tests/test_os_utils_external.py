@@ -53,3 +53,25 @@ def test_find_executable(testing_workdir, monkeypatch):
         find = find_executable('target_name')
 
         assert find == target_path, "Expected to find 'target_name' in '%s', but found it in '%s'" % (target_path, find)
+
+
+def test_find_executable_cache_follows_prefix_bin(testing_workdir, monkeypatch):
+    from conda_build.os_utils import external
+    monkeypatch.setenv('PATH', '')
+    prefix = os.path.join(testing_workdir, 'prefix')
+    bin_dir = os.path.join(prefix, 'Library', 'bin') if sys.platform == 'win32' else \
+        os.path.join(prefix, 'bin')
+    os.makedirs(bin_dir)
+    tool = os.path.join(bin_dir, 'some-tool' + ('.bat' if sys.platform == 'win32' else ''))
+
+    assert not external.prefetch_executables(['some-tool'], prefix)['some-tool']
+    with open(tool, 'w') as f:
+        f.write('')
+    os.chmod(tool, 0o755)
+    # make sure the folder's mtime moves on, even on coarse-grained filesystems
+    st = os.stat(bin_dir)
+    os.utime(bin_dir, (st.st_atime, st.st_mtime + 10))
+    assert find_executable('some-tool', prefix) == tool
+
+    os.remove(tool)
+    assert not find_executable('some-tool', prefix)
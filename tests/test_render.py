@@ -1,6 +1,12 @@
+import collections
+import json
 import os
 
+import mock
+import pytest
+
 from conda_build import api
+from conda_build import exceptions
 from conda_build import render
 
 
@@ -40,3 +46,81 @@ def test_pin_run_as_build_preserve_string(testing_metadata):
         {'pkg': '1.2.3 somestring_h1234'}
     )
     assert dep == 'pkg >=1.2.3,<1.3.0a0 somestring*'
+
+
+def _fake_extracted_package(pkgs_dir, dist, run_exports):
+    info = os.path.join(pkgs_dir, dist, 'info')
+    os.makedirs(info)
+    with open(os.path.join(info, 'run_exports.json'), 'w') as f:
+        json.dump(run_exports, f)
+
+
+def test_cached_run_exports_from_package_cache(testing_metadata, testing_workdir):
+    pkgs_dir = os.path.join(testing_workdir, 'pkgs')
+    _fake_extracted_package(pkgs_dir, 'libfoo-1.2.0-h1234567_0',
+                            {'weak': ['libfoo >=1.2.0,<1.3.0a0']})
+    _fake_extracted_package(pkgs_dir, 'libfoo-1.2.1-h1234567_0',
+                            {'weak': ['libfoo >=1.2.1,<1.3.0a0']})
+    _fake_extracted_package(pkgs_dir, 'libfoo-2.0.0-h1234567_0',
+                            {'weak': ['libfoo >=2.0.0,<3.0a0', 'libbar']})
+    with mock.patch.object(render, 'pkgs_dirs', [pkgs_dir]):
+        # names agree across 1.2.x, so the newest build stands in for whatever a solve picks
+        assert (render.get_cached_run_exports(testing_metadata, 'libfoo 1.2') ==
+                {'weak': ['libfoo >=1.2.1,<1.3.0a0']})
+        with pytest.raises(exceptions.RunExportsUnavailableError):
+            render.get_cached_run_exports(testing_metadata, 'libfoo')
+        with pytest.raises(exceptions.RunExportsUnavailableError):
+            render.get_cached_run_exports(testing_metadata, 'libbaz')
+
+
+def test_finalize_without_solve_falls_back_to_solving(testing_metadata):
+    testing_metadata.config.render_without_solve = True
+    testing_metadata.meta['requirements']['build'] = ['not_a_local_package']
+    with mock.patch.object(render, '_finalize_metadata',
+                           side_effect=[exceptions.RunExportsUnavailableError('x', 'y'),
+                                        testing_metadata]) as finalize:
+        assert render.finalize_metadata(testing_metadata) is testing_metadata
+    assert [call[1].get('solve', True) for call in finalize.call_args_list] == [False, True]
+
+
+def test_run_exports_index_looks_up_environment_at_once(testing_metadata, testing_workdir):
+    Record = collections.namedtuple('Record', 'name version channel subdir fn dist_name url md5')
+
+    def record(name):
+        dist = name + '-1.0-0'
+        return Record(name, '1.0', 'defaults', 'linux-64', dist + '.tar.bz2', dist,
+                      'https://example.com/linux-64/' + dist + '.tar.bz2', 'abc')
+
+    extracted, indexed, downloaded_1, downloaded_2 = [record(name) for name in
+                                                      ('extracted', 'indexed', 'dl1', 'dl2')]
+    pkgs_dir = os.path.join(testing_workdir, 'pkgs')
+    _fake_extracted_package(pkgs_dir, extracted.dist_name, {'weak': ['extracted']})
+    _fake_extracted_package(pkgs_dir, 'downloads/dl1-1.0-0', {'weak': ['dl1']})
+    _fake_extracted_package(pkgs_dir, 'downloads/dl2-1.0-0', {'strong': ['dl2']})
+    cache = os.path.join(testing_metadata.config.output_folder, 'linux-64', '.cache')
+    for folder, data in (('index', {'md5': 'abc'}), ('run_exports', {'weak': ['indexed']})):
+        os.makedirs(os.path.join(cache, folder))
+        with open(os.path.join(cache, folder, indexed.fn + '.json'), 'w') as f:
+            json.dump(data, f)
+
+    downloads = {pkg: (os.path.join(pkgs_dir, 'downloads', pkg.dist_name), pkg.dist_name)
+                 for pkg in (downloaded_1, downloaded_2)}
+    index = render.RunExportsIndex()
+    packages = [extracted, indexed, downloaded_1, downloaded_2]
+    with mock.patch.object(render, 'pkgs_dirs', [pkgs_dir]), \
+            mock.patch.object(render, 'execute_download_actions',
+                              return_value=downloads) as download:
+        run_exports = index.get(testing_metadata, {'LINK': packages}, 'host', packages)
+        assert index.get(testing_metadata, {'LINK': packages}, 'host', packages) == run_exports
+    assert run_exports == {extracted: {'weak': ['extracted']}, indexed: {'weak': ['indexed']},
+                           downloaded_1: {'weak': ['dl1']}, downloaded_2: {'strong': ['dl2']}}
+    assert download.call_count == 1
+    assert download.call_args[1]['package_subset'] == [downloaded_1, downloaded_2]
+
+    # a package rebuilt into the local channel keeps its url, but not its md5
+    for folder, data in (('index', {'md5': 'def'}), ('run_exports', {'weak': ['rebuilt']})):
+        with open(os.path.join(cache, folder, indexed.fn + '.json'), 'w') as f:
+            json.dump(data, f)
+    rebuilt = indexed._replace(md5='def')
+    assert index.get(testing_metadata, {'LINK': [rebuilt]}, 'host', [rebuilt]) == {
+        rebuilt: {'weak': ['rebuilt']}}
@@ -1,13 +1,15 @@
+import logging
 import os
 import subprocess
 import tarfile
+import threading
 
 import pytest
 
 from conda_build import source
 from conda_build.conda_interface import hashsum_file, TemporaryDirectory
 from conda_build.source import download_to_cache
-from conda_build.utils import reset_deduplicator
+from conda_build.utils import LoggingContext, reset_deduplicator, rm_rf
 from .utils import thisdir
 
 
@@ -160,3 +162,137 @@ def test_append_hash_to_fn(testing_metadata, caplog):
     #     serial suite.  Some residual state, somehow.  I suspect the deduplicator logic with the logger,
     #     but attempts to reset it have not been successful.
     # assert any("No hash (md5, sha1, sha256) provided." in rec.message for rec in caplog.records)
+
+
+def test_git_tree_checkout_mode_reuses_tree(testing_workdir):
+    env = os.environ.copy()
+    env.update({'GIT_AUTHOR_NAME': 'conda', 'GIT_AUTHOR_EMAIL': 'conda@example.com',
+                'GIT_COMMITTER_NAME': 'conda', 'GIT_COMMITTER_EMAIL': 'conda@example.com'})
+    repo = os.path.join(testing_workdir, 'repo')
+    os.makedirs(repo)
+    subprocess.check_call(['git', 'init', '-q'], cwd=repo, env=env)
+    with open(os.path.join(repo, 'a.txt'), 'w') as f:
+        f.write('a')
+    subprocess.check_call(['git', 'add', 'a.txt'], cwd=repo, env=env)
+    subprocess.check_call(['git', 'commit', '-qm', 'a'], cwd=repo, env=env)
+    git_cache = os.path.join(testing_workdir, 'git_cache')
+    os.makedirs(git_cache)
+
+    work_dirs = [os.path.join(testing_workdir, 'work%d' % i) for i in range(2)]
+    for work_dir in work_dirs:
+        source.git_source({'git_url': repo}, git_cache, work_dir, verbose=False,
+                          checkout_mode='tree')
+        head = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=work_dir)
+        assert head == subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=repo)
+        assert os.path.isfile(os.path.join(work_dir, '.git', 'objects', 'info', 'alternates'))
+        assert not subprocess.check_output(['git', 'status', '--porcelain'], cwd=work_dir)
+
+    # one exported tree, shared by both work dirs
+    trees = os.listdir(os.path.join(git_cache, '_conda_trees'))
+    assert len(trees) == 1
+    assert os.listdir(os.path.join(git_cache, '_conda_trees', trees[0])) == [head.decode().strip()]
+    tree = os.path.join(git_cache, '_conda_trees', trees[0], head.decode().strip(), 'tree')
+    # shared files can't be written to in place, and git metadata isn't shared at all
+    assert not os.stat(os.path.join(tree, 'a.txt')).st_mode & 0o222
+    for work_dir in work_dirs:
+        assert (os.stat(os.path.join(work_dir, '.git', 'index')).st_ino !=
+                os.stat(os.path.join(tree, '.git', 'index')).st_ino)
+        subprocess.check_call(['git', 'config', 'user.name', 'someone'], cwd=work_dir)
+    assert b'someone' not in subprocess.check_output(['git', 'config', '--list'], cwd=tree)
+
+
+def test_source_tree_cache_reuses_extracted_tree(testing_metadata):
+    testing_metadata.config.source_tree_cache = True
+    testing_metadata.meta['source'] = {
+        'url': os.path.join(thisdir, 'archives', 'subfolder.tar.bz2')}
+    source.provide(testing_metadata)
+    work_dir = testing_metadata.config.work_dir
+    assert os.path.exists(os.path.join(work_dir, 'abc'))
+
+    cached = [entry for entry in os.listdir(testing_metadata.config.src_tree_cache)
+              if not entry.startswith('.')]
+    assert len(cached) == 1
+    tree = os.path.join(testing_metadata.config.src_tree_cache, cached[0], 'tree')
+    tree_inode = os.stat(tree).st_ino
+
+    # a second work dir is cloned from the same tree rather than extracted again
+    rm_rf(work_dir)
+    source.provide(testing_metadata)
+    assert os.path.exists(os.path.join(work_dir, 'abc'))
+    assert os.stat(tree).st_ino == tree_inode
+    assert sorted(os.listdir(tree)) == sorted(os.listdir(work_dir))
+    # files shared with work dirs can't be written to in place
+    assert not os.stat(os.path.join(tree, 'abc')).st_mode & 0o222
+
+
+def test_multiple_url_sources_in_parallel(testing_metadata):
+    testing_metadata.config.source_jobs = 4
+    testing_metadata.meta['source'] = [
+        {'folder': 'f1', 'url': os.path.join(thisdir, 'archives', 'a.tar.bz2')},
+        {'folder': 'f2', 'url': os.path.join(thisdir, 'archives', 'b.tar.bz2')},
+        {'folder': 'f3', 'url': os.path.join(thisdir, 'archives', 'subfolder.tar.bz2')}]
+    source.provide(testing_metadata)
+    assert os.path.exists(os.path.join(testing_metadata.config.work_dir, 'f1', 'a'))
+    assert os.path.exists(os.path.join(testing_metadata.config.work_dir, 'f2', 'b'))
+    assert os.path.exists(os.path.join(testing_metadata.config.work_dir, 'f3', 'abc'))
+
+
+def test_parallel_download_reports_first_failing_source(testing_metadata):
+    testing_metadata.config.source_jobs = 4
+    testing_metadata.meta['source'] = [
+        {'folder': 'f1', 'url': os.path.join(thisdir, 'archives', 'a.tar.bz2')},
+        {'folder': 'f2', 'url': os.path.join(thisdir, 'archives', 'missing1.tar.bz2')},
+        {'folder': 'f3', 'url': os.path.join(thisdir, 'archives', 'missing2.tar.bz2')}]
+    with pytest.raises(RuntimeError) as exc:
+        source.provide(testing_metadata)
+    assert 'missing1.tar.bz2' in str(exc.value)
+
+
+
+def test_parallel_downloads_restore_logger_levels(testing_metadata, mocker):
+    # A enters, B enters, A exits, B exits: B restores the level A had set
+    entered, a_exited = threading.Event(), threading.Event()
+
+    def download(cache_folder, recipe_path, source_dict, verbose=False):
+        with LoggingContext():
+            if source_dict['folder'] == 'a':
+                entered.wait(5)
+            else:
+                entered.set()
+                a_exited.wait(5)
+        if source_dict['folder'] == 'a':
+            a_exited.set()
+        return source_dict['url'], source_dict['url']
+    mocker.patch.object(source, 'download_to_cache', side_effect=download)
+    testing_metadata.config.source_jobs = 2
+    logger = logging.getLogger('conda_build')
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        downloads = source._download_url_sources([{'folder': 'a', 'url': 'a.tar.bz2'},
+                                                  {'folder': 'b', 'url': 'b.tar.bz2'}],
+                                                 testing_metadata)
+        assert sorted(downloads) == [0, 1]
+        assert logger.level == logging.INFO
+    finally:
+        logger.setLevel(level)
+
+
+
+def test_download_records_digests_for_cache_hits(testing_workdir, mocker):
+    tarball = os.path.join(thisdir, 'archives', 'a.tar.bz2')
+    source_dict = {'url': tarball, 'sha256': hashsum_file(tarball, 'sha256')}
+    cache = os.path.join(testing_workdir, 'cache')
+    path, _ = download_to_cache(cache, '', source_dict)
+    assert os.path.isfile(path + '.digests')
+    assert not [fn for fn in os.listdir(cache) if '.partial-' in fn]
+
+    # the digest computed while downloading is reused instead of hashing the file again
+    hashsum = mocker.patch.object(source, 'hashsum_file')
+    assert download_to_cache(cache, '', source_dict)[0] == path
+    assert not hashsum.called
+
+    source_dict['sha256'] = '0' * 64
+    with pytest.raises(RuntimeError):
+        download_to_cache(os.path.join(testing_workdir, 'other_cache'), '', source_dict)
+    assert not os.listdir(os.path.join(testing_workdir, 'other_cache'))
@@ -1,4 +1,5 @@
 import contextlib
+import copy
 import filelock
 import os
 import subprocess
@@ -461,3 +462,149 @@ def test_find_recipe_multipe_bad():
         # too many in base
         with pytest.raises(IOError):
             utils.find_recipe(tmp)
+
+
+@pytest.mark.skipif(utils.on_win, reason="symlinks need extra privileges on Windows")
+def test_clone_tree(testing_workdir):
+    src = os.path.join(testing_workdir, 'src')
+    dst = os.path.join(testing_workdir, 'dst')
+    makefile(os.path.join(src, 'a', 'file'), 'content')
+    makefile(os.path.join(src, 'skipped'), 'content')
+    os.symlink('file', os.path.join(src, 'a', 'link'))
+    utils.clone_tree(src, dst, exclude=('skipped', ))
+    with open(os.path.join(dst, 'a', 'file')) as f:
+        assert f.read() == 'content'
+    assert os.readlink(os.path.join(dst, 'a', 'link')) == 'file'
+    assert not os.path.exists(os.path.join(dst, 'skipped'))
+
+
+@pytest.mark.skipif(utils.on_win or os.geteuid() == 0,
+                    reason="read-only files are writable for root, and can't be deleted on Windows")
+def test_read_only_tree_protects_hardlinked_files(testing_workdir):
+    src = os.path.join(testing_workdir, 'src')
+    makefile(os.path.join(src, 'a', 'file'), 'content')
+    makefile(os.path.join(src, '.git', 'index'), 'index')
+    modes = utils.make_tree_read_only(src, exclude=('.git', ))
+    assert set(modes) == {'a/file'}
+    assert os.access(os.path.join(src, '.git', 'index'), os.W_OK)
+
+    linked = os.path.join(testing_workdir, 'linked')
+    utils.clone_tree(src, linked, modes=modes)
+    linked_file = os.path.join(linked, 'a', 'file')
+    if os.stat(linked_file).st_ino == os.stat(os.path.join(src, 'a', 'file')).st_ino:
+        with pytest.raises((IOError, OSError)):
+            with open(linked_file, 'a') as f:
+                f.write('changed')
+    else:
+        # reflinked: a copy of its own
+        assert os.access(linked_file, os.W_OK)
+    # replacing the file, as sed -i does, still works
+    os.rename(os.path.join(linked, '.git', 'index'), os.path.join(linked, 'a', 'file'))
+
+    copied = os.path.join(testing_workdir, 'copied')
+    utils.clone_tree(src, copied, hardlink=False, modes=modes)
+    with open(os.path.join(copied, 'a', 'file'), 'a') as f:
+        f.write('changed')
+    with open(os.path.join(src, 'a', 'file')) as f:
+        assert f.read() == 'content'
+
+
+def test_copy_on_write_dict_forks_share_until_touched():
+    meta = {'package': {'name': 'abc'}, 'requirements': {'run': ['python']}}
+    # a plain dict's values are still the caller's, so they are copied
+    own = utils.CopyOnWriteDict.fork(meta)
+    assert dict.__getitem__(own, 'requirements') is not meta['requirements']
+
+    new = utils.CopyOnWriteDict.fork(own)
+    if sys.version_info[0] >= 3:
+        assert dict.__getitem__(own, 'requirements') is dict.__getitem__(new, 'requirements')
+
+    new['requirements']['run'].append('numpy')
+    assert own['requirements'] == {'run': ['python']}
+    assert new['requirements'] == {'run': ['python', 'numpy']}
+
+    new.get('package')['name'] = 'def'
+    assert own['package']['name'] == 'abc'
+
+    # plain dict copies and deep copies don't leak shared values either
+    new = utils.CopyOnWriteDict.fork(own)
+    dict(new)['package']['name'] = 'ghi'
+    copy.deepcopy(new)['requirements']['run'].append('zlib')
+    assert own == {'package': {'name': 'abc'}, 'requirements': {'run': ['python']}}
+
+
+def test_copy_on_write_dict_fork_copies_values_read_before():
+    own = utils.CopyOnWriteDict.fork({'requirements': {'run': ['python']}, 'about': {}})
+    run = own['requirements']['run']
+    own['about'] = about = {'summary': 'abc'}
+    new = utils.CopyOnWriteDict.fork(own)
+    run.append('numpy')
+    about['summary'] = 'def'
+    assert new == {'requirements': {'run': ['python']}, 'about': {'summary': 'abc'}}
+    assert own['requirements']['run'] == ['python', 'numpy']
+
+
+def test_rm_rf_background(testing_workdir):
+    prefix = os.path.join(testing_workdir, 'prefix')
+    for i in range(5):
+        makefile(os.path.join(prefix, 'lib%d' % i, 'file'))
+    makefile(os.path.join(prefix, 'file'))
+
+    utils.rm_rf_background(prefix)
+    # the folder is gone at once and can be recreated while its old contents are deleted
+    assert not os.path.exists(prefix)
+    makefile(os.path.join(prefix, 'new'))
+
+    utils.wait_for_background_deletions()
+    assert os.listdir(testing_workdir) == ['prefix']
+    assert os.listdir(prefix) == ['new']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+def test_stream_rewriter_handles_chunk_boundaries(chunk_size):
+    env = {'PREFIX': '/bld/_h_env_placehold', 'BUILD_PREFIX': '/bld/_build_env',
+           'SRC_DIR': '/bld/work'}
+    data = (b'-I/bld/_h_env_placehold/include -I/bld/_build_env/include\n'
+            b'\xff\xfe not utf-8 /bld/work/src.c /bld/_h_env /bld/_build_envs\n'
+            b'ends in /bld/_h_env_placehold')
+    rewriter = utils.StreamRewriter(env, template='${}')
+    out = [rewriter.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+    out.append(rewriter.flush())
+    assert b''.join(out) == (b'-I$PREFIX/include -I$BUILD_PREFIX/include\n'
+                             b'\xff\xfe not utf-8 $SRC_DIR/src.c /bld/_h_env $BUILD_PREFIXs\n'
+                             b'ends in $PREFIX')
+
+
+def test_stream_rewriter_holds_back_only_possible_matches():
+    rewriter = utils.StreamRewriter({'PREFIX': '/bld/_h_env'}, template='${}')
+    assert rewriter.feed(b'compiling /bld/_h_env/a.c\n') == b'compiling $PREFIX/a.c\n'
+    assert rewriter.feed(b'waiting on /bld/_h') == b'waiting on '
+    assert rewriter.flush() == b'/bld/_h'
+
+
+def test_tar_xf_from_several_threads(testing_workdir):
+    from concurrent.futures import ThreadPoolExecutor
+    import tarfile
+
+    def make_archive(i):
+        src = os.path.join(testing_workdir, 'src%d' % i)
+        for j in range(20):
+            makefile(os.path.join(src, 'dir%d' % j, 'file%d-%d' % (i, j)), str(i))
+        tarball = os.path.join(testing_workdir, 'src%d.tar.gz' % i)
+        with tarfile.open(tarball, 'w:gz') as tar:
+            tar.add(src, arcname='.')
+        return tarball
+
+    tarballs = [make_archive(i) for i in range(8)]
+    dests = [os.path.join(testing_workdir, 'dest%d' % i) for i in range(8)]
+    for dest in dests:
+        os.makedirs(dest)
+    cwd = os.getcwd()
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(utils.tar_xf, tarballs, dests))
+    assert os.getcwd() == cwd
+    for i, dest in enumerate(dests):
+        extracted = set(os.path.join(root, fn)[len(dest) + 1:]
+                        for root, _, files in os.walk(dest) for fn in files)
+        assert extracted == set(os.path.join('dir%d' % j, 'file%d-%d' % (i, j))
+                                for j in range(20))
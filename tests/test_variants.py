@@ -516,3 +516,57 @@ def test_variant_subkeys_retained(testing_config):
     m.final = False
     outputs = m.get_output_metadata_set(permit_unsatisfiable_variants=False)
     get_all_replacements(outputs[0][1].config.variant)
+
+
+def test_find_used_variables_in_text_index():
+    recipe_text = "\n".join([
+        "{% set build = 0 %}",
+        "{% if mpi != 'nompi' %}",
+        "package:",
+        "  name: test-{{ python_impl }}",
+        "requirements:",
+        "  build:",
+        "    - {{ compiler('c') }}",
+        "    - zlib  # [unix]",
+        "  host:",
+        "    - r-base",
+        "    - {{ pin_compatible('numpy') }}",
+        "    - openssl >=1.1  # [not win]",
+        "{% endif %}",
+    ])
+    keys = ('c_compiler', 'c_compiler_version', 'cxx_compiler', 'CONDA_BUILD_SYSROOT', 'mpi',
+            'numpy', 'openssl', 'python', 'python_impl', 'r_base', 'unix', 'win', 'zlib',
+            'foo.bar')
+    assert variants.find_used_variables_in_text(keys, recipe_text) == {
+        'c_compiler', 'c_compiler_version', 'CONDA_BUILD_SYSROOT', 'mpi', 'python',
+        'python_impl', 'r_base', 'zlib'}
+    assert variants.find_used_variables_in_text(keys, recipe_text, selectors_only=True) == {
+        'unix', 'win'}
+
+
+def test_variant_matrix_filters_without_exploding():
+    spec = {
+        'python': ['2.7', '3.7', '3.8'],
+        'zip_keys': [['cuda', 'cudnn']],
+        'cuda': ['9.2', '10.0', '10.1'],
+        'cudnn': ['7.2', '7.3', '7.6'],
+        'mpi': ['openmpi', 'mpich'],
+        'extend_keys': ['corge'],
+        'corge': 42,
+    }
+    matrix = variants.VariantMatrix(spec)
+    assert len(matrix) == 18
+    assert matrix.to_list() == variants.explode_variants(spec)
+
+    filtered = variants.filter_by_key_value(matrix, 'cudnn', ['7.3', '7.6'], 'test')
+    filtered = variants.filter_by_key_value(filtered, 'python', '3.8', 'test')
+    assert len(filtered) == 4
+    assert filtered.to_list() == [v for v in variants.explode_variants(spec)
+                                  if v['cudnn'] in ('7.3', '7.6') and v['python'] == '3.8']
+    assert not variants.filter_by_key_value(matrix, 'mpi', ['nompi'], 'test')
+    assert not variants.filter_by_key_value(matrix, 'missing_key', ['1'], 'test')
+
+    projected = matrix.project(['cuda'])
+    assert len(projected) == 3
+    assert {v['cuda'] for v in projected} == {'9.2', '10.0', '10.1'}
+    assert all(v['corge'] == 42 for v in projected)